@@ -2,7 +2,16 @@ pythonFiles = [
 'playgroundPlugins/Testing/Testing.py',
 'playgroundPlugins/Testing/__init__.py',
 'Probe.py',
+'Launcher.py',
+'JobServer.py',
+'Aggregation.py',
+'Campaign.py',
+'DataFile.py',
+'ImportTime.py',
+'Executor.py',
 'MemCheck.py',
+'ReferenceStore.py',
+'Replication.py',
 'TableParser.py',
 'WNSUnit.py',
 '__init__.py',
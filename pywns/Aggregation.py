@@ -0,0 +1,528 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Streaming statistics over the entries of LogEval and TimeSeries probes
+
+All functions read the (x, y) columns of the data file chunk by chunk
+into arrays, so no LogEvalEntry objects are created and the memory
+needed does not depend on the length of the series. Every function
+accepts a LogEvalProbe, a TimeSeriesProbe or the name of a data file.
+
+Example:
+
+  import pywns.Probe
+  import pywns.Aggregation
+
+  probe = pywns.Probe.LogEvalProbe("output/delay_Log.dat")
+  windows = pywns.Aggregation.windowed(probe, 1.0)
+  print windows.start, windows.mean
+
+  sketch = pywns.Aggregation.quantiles(probe)
+  print sketch.getQuantile(0.999)
+
+  level = probe.preview(500)
+  print level.start, level.minimum, level.maximum
+"""
+
+import array
+import marshal
+import os
+
+import pywns.DataFile
+
+defaultChunkSize = 1 << 20
+""" bytes read at once """
+
+def getDataFilename(source):
+    """ The data file of a probe (or source itself if it is a filename)
+    """
+    if isinstance(source, str):
+        return source
+    # LogEvalProbe keeps its entries in a separate file
+    filename = getattr(source, "filenameEntries", None)
+    if filename != None:
+        return filename
+    return source.filename
+
+def readColumns(source, chunkSize = defaultChunkSize):
+    """ Iterator of (x, y) chunks of the data file. x and y are arrays
+    of doubles. Comment lines (starting with '#') are skipped.
+    """
+    return ColumnReader(getDataFilename(source), chunkSize)
+
+
+class ColumnReader(object):
+    """ Iterator of (x, y) chunks of a data file (see readColumns)
+
+    The file is closed when the end is reached, on errors, by close()
+    or when the reader is dropped before the end.
+    """
+
+    def __init__(self, filename, chunkSize = defaultChunkSize):
+        super(ColumnReader, self).__init__()
+        self.file = None
+        self.file = pywns.DataFile.openDataFile(filename)
+        self.chunkSize = chunkSize
+        self.columns = None
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while self.file != None:
+            try:
+                lines = self.file.readlines(self.chunkSize)
+                if len(lines) == 0:
+                    self.close()
+                    break
+                lines = [line for line in lines if not line.startswith("#")]
+                if len(lines) == 0:
+                    continue
+                if self.columns == None:
+                    self.columns = len(lines[0].split())
+                values = array.array('d', map(float, "".join(lines).split()))
+            except:
+                self.close()
+                raise
+            return values[0::self.columns], values[1::self.columns]
+        raise StopIteration
+
+    def close(self):
+        if self.file != None:
+            self.file.close()
+            self.file = None
+
+    def __del__(self):
+        self.close()
+
+
+class WindowStatistics(object):
+    """ Statistics of y in consecutive windows of x (e.g. time) of equal
+    size. Only windows with samples are listed. All attributes are
+    arrays of the same length: start (of the window), count, sum,
+    minimum, maximum and mean.
+    """
+
+    def __init__(self, start, count, sum, minimum, maximum):
+        super(WindowStatistics, self).__init__()
+        self.start = start
+        self.count = count
+        self.sum = sum
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = array.array('d', [sum[ii] / count[ii] for ii in xrange(len(count))])
+
+    def getRate(self, windowSize):
+        """ Samples per unit of x in each window """
+        return array.array('d', [count / windowSize for count in self.count])
+
+
+def windowed(source, windowSize, origin = 0.0, chunkSize = defaultChunkSize):
+    """ Count, sum, minimum, maximum and mean of y for windows
+    [origin + k * windowSize, origin + (k + 1) * windowSize)
+    """
+    windows = {}
+    for xs, ys in readColumns(source, chunkSize):
+        for ii in xrange(len(xs)):
+            y = ys[ii]
+            key = int((xs[ii] - origin) // windowSize)
+            stats = windows.get(key)
+            if stats == None:
+                windows[key] = [1, y, y, y]
+            else:
+                stats[0] += 1
+                stats[1] += y
+                if y < stats[2]:
+                    stats[2] = y
+                if y > stats[3]:
+                    stats[3] = y
+    keys = windows.keys()
+    keys.sort()
+    return WindowStatistics(array.array('d', [origin + key * windowSize for key in keys]),
+                            array.array('d', [windows[key][0] for key in keys]),
+                            array.array('d', [windows[key][1] for key in keys]),
+                            array.array('d', [windows[key][2] for key in keys]),
+                            array.array('d', [windows[key][3] for key in keys]))
+
+def ewma(source, alpha, chunkSize = defaultChunkSize):
+    """ Exponentially weighted moving average of y (weight alpha for
+    the newest sample). Returns (x, average) as arrays.
+    """
+    resultX = array.array('d')
+    resultY = array.array('d')
+    average = None
+    for xs, ys in readColumns(source, chunkSize):
+        averages = array.array('d', ys)
+        ii = 0
+        if average == None and len(ys) > 0:
+            average = ys[0]
+            ii = 1
+        for ii in xrange(ii, len(ys)):
+            average += alpha * (ys[ii] - average)
+            averages[ii] = average
+        resultX.extend(xs)
+        resultY.extend(averages)
+    return resultX, resultY
+
+def resample(source, interval, start = None, end = None, chunkSize = defaultChunkSize):
+    """ Sample-and-hold resampling to the grid start, start + interval,
+    ... <= end: the value at each grid point is y of the last sample
+    at or before that point (grid points before the first sample are
+    skipped). start and end default to the first and last x.
+    Returns (x, y) as arrays.
+    """
+    resultX = array.array('d')
+    resultY = array.array('d')
+    next = start
+    last = None
+    lastX = None
+    for xs, ys in readColumns(source, chunkSize):
+        for ii in xrange(len(xs)):
+            x = xs[ii]
+            if next == None:
+                next = x
+            while next < x and (end == None or next <= end):
+                if last != None:
+                    resultX.append(next)
+                    resultY.append(last)
+                next += interval
+            last = ys[ii]
+            lastX = x
+    if last != None:
+        if end == None:
+            end = lastX
+        while next <= end:
+            resultX.append(next)
+            resultY.append(last)
+            next += interval
+    return resultX, resultY
+
+
+class QuantileSketch(object):
+    """ Approximate quantiles of a stream of values (a merging t-digest)
+
+    The values are summarized by a few times 'compression' weighted
+    centroids, which are small in the tails. So extreme quantiles
+    (e.g. 0.999) are more accurate than the median. Sketches can be
+    merged (e.g. to get quantiles over several probes or runs).
+    """
+
+    def __init__(self, compression = 100):
+        super(QuantileSketch, self).__init__()
+        self.compression = compression
+        self.means = array.array('d')
+        self.weights = array.array('d')
+        self.count = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.__buffer = array.array('d')
+
+    def add(self, value):
+        self.__buffer.append(value)
+        if len(self.__buffer) >= 10 * self.compression:
+            self.__compress()
+
+    def extend(self, values):
+        self.__buffer.extend(values)
+        if len(self.__buffer) >= 10 * self.compression:
+            self.__compress()
+
+    def merge(self, other):
+        other.__compress()
+        self.__compress()
+        self.__compress(zip(other.means, other.weights))
+        for value in [other.minimum, other.maximum]:
+            if value != None:
+                self.__updateRange(value, value)
+
+    def getQuantile(self, p):
+        self.__compress()
+        if self.count == 0:
+            raise ValueError("No values")
+        if len(self.means) == 1 or p <= 0:
+            if p <= 0:
+                return self.minimum
+            return self.means[0]
+        if p >= 1:
+            return self.maximum
+        # centroid ii covers the weights up to cumulated[ii] and has
+        # its mean in the middle of its weight
+        target = p * self.count
+        cumulated = 0.0
+        previousCenter = 0.0
+        previousMean = self.minimum
+        for ii in xrange(len(self.means)):
+            center = cumulated + self.weights[ii] / 2.0
+            if target < center:
+                if center == previousCenter:
+                    return self.means[ii]
+                fraction = (target - previousCenter) / (center - previousCenter)
+                return previousMean + fraction * (self.means[ii] - previousMean)
+            cumulated += self.weights[ii]
+            previousCenter = center
+            previousMean = self.means[ii]
+        # between the last center and the maximum
+        fraction = (target - previousCenter) / (self.count - previousCenter)
+        return previousMean + fraction * (self.maximum - previousMean)
+
+    def getQuantiles(self, listOfP):
+        return [self.getQuantile(p) for p in listOfP]
+
+    # private stuff
+
+    def __updateRange(self, minimum, maximum):
+        if self.minimum == None or minimum < self.minimum:
+            self.minimum = minimum
+        if self.maximum == None or maximum > self.maximum:
+            self.maximum = maximum
+
+    def __compress(self, centroids = []):
+        if len(self.__buffer) == 0 and len(centroids) == 0:
+            return
+        if len(self.__buffer) > 0:
+            self.__updateRange(min(self.__buffer), max(self.__buffer))
+        points = zip(self.means, self.weights) + centroids + [(value, 1.0) for value in self.__buffer]
+        points.sort()
+        self.__buffer = array.array('d')
+        self.count = 0.0
+        for mean, weight in points:
+            self.count += weight
+
+        means = array.array('d')
+        weights = array.array('d')
+        cumulated = 0.0
+        limit = self.__getWeightLimit(0.0)
+        mean, weight = points[0]
+        for nextMean, nextWeight in points[1:]:
+            if cumulated + weight + nextWeight <= limit:
+                mean = (mean * weight + nextMean * nextWeight) / (weight + nextWeight)
+                weight += nextWeight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                cumulated += weight
+                limit = cumulated + self.__getWeightLimit(cumulated / self.count)
+                mean, weight = nextMean, nextWeight
+        means.append(mean)
+        weights.append(weight)
+        self.means = means
+        self.weights = weights
+
+    def __getWeightLimit(self, q):
+        # centroids are kept small in the tails: ~ q * (1 - q)
+        return max(1.0, 4.0 * self.count * q * (1.0 - q) / self.compression)
+
+
+def quantiles(source, compression = 100, chunkSize = defaultChunkSize):
+    """ QuantileSketch of all y values of source
+    """
+    sketch = QuantileSketch(compression)
+    for xs, ys in readColumns(source, chunkSize):
+        sketch.extend(ys)
+    return sketch
+
+
+class PreviewLevel(object):
+    """ One level of a PreviewPyramid. Each bucket summarizes
+    consecutive samples. All attributes are arrays of the same length:
+    start and end (x of the first and the last sample), count,
+    minimum, maximum and mean (of y).
+    """
+
+    names = ["start", "end", "count", "minimum", "maximum", "mean"]
+
+    def __init__(self):
+        super(PreviewLevel, self).__init__()
+        for name in self.names:
+            setattr(self, name, array.array('d'))
+
+    def __len__(self):
+        return len(self.count)
+
+    def append(self, start, end, count, minimum, maximum, mean):
+        self.start.append(start)
+        self.end.append(end)
+        self.count.append(count)
+        self.minimum.append(minimum)
+        self.maximum.append(maximum)
+        self.mean.append(mean)
+
+    def coarsen(self, fanout):
+        """ The next level: fanout buckets of this level form one bucket
+        """
+        level = PreviewLevel()
+        for first in xrange(0, len(self), fanout):
+            last = min(first + fanout, len(self))
+            count = sum(self.count[first:last])
+            total = 0.0
+            for ii in xrange(first, last):
+                total += self.mean[ii] * self.count[ii]
+            level.append(self.start[first], self.end[last - 1], count,
+                         min(self.minimum[first:last]), max(self.maximum[first:last]),
+                         total / count)
+        return level
+
+    def toString(self):
+        return [getattr(self, name).tostring() for name in self.names]
+
+    # @staticmethod (this syntax works only for python >= 2.4)
+    def fromString(strings):
+        level = PreviewLevel()
+        for name, string in zip(PreviewLevel.names, strings):
+            getattr(level, name).fromstring(string)
+        return level
+    fromString = staticmethod(fromString)
+
+
+class PreviewPyramid(object):
+    """ Multi-resolution summary of a series for quick plotting
+
+    Level 0 summarizes 'bucketSize' consecutive samples per bucket,
+    each further level 'fanout' buckets of the level below, up to a
+    level with a single bucket. If persistent, the pyramid is stored in
+    the cache directory (see DataFile.getCacheFilename), keyed by the
+    stamp of the data file, and rebuilt when the data file changes.
+    """
+
+    version = 1
+
+    def __init__(self, source, bucketSize = 64, fanout = 4, persistent = True):
+        super(PreviewPyramid, self).__init__()
+        self.filename = getDataFilename(source)
+        self.previewFilename = pywns.DataFile.getCacheFilename(self.filename, ".preview")
+        self.bucketSize = bucketSize
+        self.fanout = fanout
+        self.samples = 0
+        self.levels = []
+        self.stamp = self.__getStamp()
+        self.__resampled = {}
+        if not persistent or not self.__read():
+            self.__build()
+            if persistent:
+                self.__write()
+
+    def isUpToDate(self):
+        """ True if the data file did not change since the pyramid was
+        built
+        """
+        try:
+            return self.__getStamp() == self.stamp
+        except OSError:
+            return False
+
+    def preview(self, resolution):
+        """ The finest level with at most 'resolution' buckets. If the
+        series has less than bucketSize * resolution samples (level 0
+        would have less buckets than asked for), the buckets are built
+        from the samples themselves (one sample per bucket if there are
+        no more than 'resolution' samples).
+        """
+        if self.samples < self.bucketSize * resolution:
+            bucketSize = max(1, (self.samples + resolution - 1) / resolution)
+            if not self.__resampled.has_key(bucketSize):
+                self.__resampled[bucketSize] = self.__buildLevel(bucketSize)
+            return self.__resampled[bucketSize]
+        for level in self.levels:
+            if len(level) <= resolution:
+                return level
+        return self.levels[-1]
+
+    # private stuff
+
+    def __getStamp(self):
+        return pywns.DataFile.getStamp(pywns.DataFile.findFile(self.filename)) + (self.bucketSize, self.fanout)
+
+    def __read(self):
+        try:
+            f = file(self.previewFilename, "rb")
+            try:
+                version, stamp, samples, levels = marshal.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return False
+        if version != self.version or stamp != self.stamp:
+            return False
+        self.samples = samples
+        self.levels = [PreviewLevel.fromString(level) for level in levels]
+        return True
+
+    def __write(self):
+        data = (self.version, self.stamp, self.samples,
+                [level.toString() for level in self.levels])
+        try:
+            dirname = os.path.dirname(self.previewFilename)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            f = file(self.previewFilename, "wb")
+            try:
+                marshal.dump(data, f)
+            finally:
+                f.close()
+        except (IOError, OSError):
+            # e.g. a read-only cache directory: just don't cache
+            pass
+
+    def __build(self):
+        level = self.__buildLevel(self.bucketSize)
+        self.samples = int(sum(level.count))
+        self.levels = [level]
+        while len(level) > 1:
+            level = level.coarsen(self.fanout)
+            self.levels.append(level)
+
+    def __buildLevel(self, bucketSize):
+        level = PreviewLevel()
+        count = 0
+        for xs, ys in readColumns(self.filename):
+            for ii in xrange(len(xs)):
+                x = xs[ii]
+                y = ys[ii]
+                if count == 0:
+                    start = x
+                    minimum = y
+                    maximum = y
+                    total = 0.0
+                elif y < minimum:
+                    minimum = y
+                elif y > maximum:
+                    maximum = y
+                total += y
+                count += 1
+                if count == bucketSize:
+                    level.append(start, x, count, minimum, maximum, total / count)
+                    count = 0
+        if count > 0:
+            level.append(start, x, count, minimum, maximum, total / count)
+        return level
+
+
+def preview(source, resolution = 1000):
+    """ At most 'resolution' buckets (min, max, mean and count of y)
+    covering the whole series (see PreviewPyramid)
+    """
+    return PreviewPyramid(source).preview(resolution)
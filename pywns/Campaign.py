@@ -0,0 +1,239 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Load the same probes from the output directories of a parameter sweep
+
+Example:
+
+  import pywns.Campaign
+
+  table, errors = pywns.Campaign.load("sweep/*/output", "*delay*_Moments.dat")
+  for row in table.where(load = 0.5).rows():
+      print row["directory"], row["mean"]
+  print table.getColumn("mean")
+  for dirname, error in errors.items():
+      print "not read:", dirname, error
+
+Only the headers of the selected probes are parsed (see
+Probe.ProbeIndex), the directories are read by several threads.
+"""
+
+import os
+import sys
+import glob
+import re
+
+import pywns.Probe
+import pywns.Executor
+
+def parametersFromDirname(dirname):
+    """ Default parameters of an output directory: every 'key=value'
+    in its path (separated by '/', '_' or ','), e.g. for
+    'sweep/load=0.5_seed=3/output' {'load': 0.5, 'seed': 3}
+    """
+    parameters = {}
+    for token in re.split(r"[/_,]", os.path.normpath(dirname)):
+        if "=" in token:
+            key, value = token.split("=", 1)
+            parameters[key] = convertValue(value)
+    return parameters
+
+def convertValue(value):
+    # like Probe.getValue: try int, float, string (in this order)
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+class CampaignTable(object):
+    """ One row per directory and probe, stored column by column
+
+    The columns are 'directory', 'probe' (filename), 'name' (of the
+    probe), the parameters of the directories and the statistics
+    (valueNames) of the probes. Missing values are None.
+    """
+
+    def __init__(self, columnNames = []):
+        super(CampaignTable, self).__init__()
+        self.columnNames = []
+        self.columns = {}
+        self.length = 0
+        for name in columnNames:
+            self.addColumn(name)
+
+    def __len__(self):
+        return self.length
+
+    def addColumn(self, name):
+        if not self.columns.has_key(name):
+            self.columnNames.append(name)
+            self.columns[name] = [None] * self.length
+
+    def append(self, row):
+        """ Append a row (dict column name -> value) """
+        for name in row.keys():
+            self.addColumn(name)
+        for name in self.columnNames:
+            self.columns[name].append(row.get(name))
+        self.length += 1
+
+    def getColumn(self, name):
+        return self.columns[name]
+
+    def getRow(self, index):
+        row = {}
+        for name in self.columnNames:
+            row[name] = self.columns[name][index]
+        return row
+
+    def rows(self):
+        for index in xrange(self.length):
+            yield self.getRow(index)
+
+    def where(self, predicate = None, **values):
+        """ The rows for which all columns have the given values (and
+        predicate(row) is True) as new CampaignTable
+        """
+        result = CampaignTable(self.columnNames)
+        for index in xrange(self.length):
+            matches = True
+            for name, value in values.items():
+                if not self.columns.has_key(name) or self.columns[name][index] != value:
+                    matches = False
+                    break
+            if matches:
+                row = self.getRow(index)
+                if predicate == None or predicate(row):
+                    result.append(row)
+        return result
+
+    def write(self, stream = sys.stdout, separator = "\t"):
+        """ Write the table as text, one line per row (with a header line)
+        """
+        stream.write(separator.join(self.columnNames) + "\n")
+        for index in xrange(self.length):
+            values = []
+            for name in self.columnNames:
+                value = self.columns[name][index]
+                if value == None:
+                    value = ""
+                values.append(str(value))
+            stream.write(separator.join(values) + "\n")
+
+
+class CampaignLoader(object):
+    """ Reads the probes matching a pattern from many output directories
+
+    directories: list of directories or a glob (e.g. 'sweep/*/output')
+
+    pattern: glob selecting the probes (on 'key': 'filename', 'name'
+    or 'altName'); probeTypes optionally restricts the probe types
+
+    parameters: callable returning the parameters (a dict) of a
+    directory (default: parametersFromDirname)
+
+    threads: number of directories read at the same time
+    """
+
+    def __init__(self, directories, pattern = "*", key = "filename", probeTypes = None,
+                 parameters = parametersFromDirname, threads = 8):
+        super(CampaignLoader, self).__init__()
+        if isinstance(directories, str):
+            directories = glob.glob(directories)
+            directories.sort()
+        self.directories = directories
+        self.pattern = pattern
+        self.key = key
+        self.probeTypes = probeTypes
+        self.parameters = parameters
+        self.threads = threads
+        self.errors = {}
+
+    def load(self):
+        """ Returns the CampaignTable. Directories that could not be
+        read are skipped and listed in self.errors (directory ->
+        exception).
+        """
+        self.errors = {}
+        results = pywns.Executor.runConcurrently(self.__readDirectory, self.directories, self.threads)
+
+        # keep the order of the directories
+        table = CampaignTable(["directory", "probe", "name"])
+        for result in results:
+            if result != None:
+                columnNames, rows = result
+                for name in columnNames:
+                    table.addColumn(name)
+                for row in rows:
+                    table.append(row)
+        return table
+
+    # private stuff
+
+    def __readDirectory(self, dirname):
+        try:
+            return self.__readProbes(dirname)
+        except Exception, e:
+            self.errors[dirname] = e
+            return None
+
+    def __readProbes(self, dirname):
+        index = pywns.Probe.ProbeIndex(dirname, readNames = (self.key == "name"))
+        probes = index.load(pattern = self.pattern, key = self.key, probeTypes = self.probeTypes)
+        parameters = self.parameters(dirname)
+        filenames = probes.keys()
+        filenames.sort()
+        parameterNames = parameters.keys()
+        parameterNames.sort()
+        columnNames = parameterNames[:]
+        rows = []
+        for filename in filenames:
+            probe = probes[filename]
+            row = {"directory": dirname,
+                   "probe": filename,
+                   "name": getattr(probe, "name", None)}
+            row.update(parameters)
+            for valueName in probe.valueNames:
+                row[valueName] = getattr(probe, valueName, None)
+                if valueName not in columnNames:
+                    columnNames.append(valueName)
+            rows.append(row)
+        return columnNames, rows
+
+
+def load(directories, pattern = "*", **loaderArgs):
+    """ Load the probes matching pattern from directories (see
+    CampaignLoader) and return (CampaignTable, errors). errors maps
+    each directory that could not be read to the exception.
+    """
+    loader = CampaignLoader(directories, pattern, **loaderArgs)
+    table = loader.load()
+    return table, loader.errors
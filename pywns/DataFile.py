@@ -0,0 +1,395 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Reading probe output that is compressed or packed in an archive
+
+openDataFile() reads 'x.dat' transparently if it is stored as 'x.dat.gz',
+'x.dat.bz2' or 'x.dat.xz' (xz by the xz program). All are decompressed
+while being read.
+
+A probe directory may also be packed in a tar (optionally compressed)
+or zip archive. The archive then takes the place of the directory:
+'reference.tar.gz/x_PDF.dat' is the member 'x_PDF.dat' (or a member
+'<dir>/x_PDF.dat' if all members are in one top directory) of
+'reference.tar.gz'. The members of each archive are indexed once. The
+members of an uncompressed tar are read directly at their offset,
+those of zip archives are decompressed one by one.
+
+A reference directory may be replaced by its manifest (see module
+ReferenceStore): the files of 'referenceOutput_x' are then read from
+the blobs listed in 'referenceOutput_x.manifest'.
+
+listDirectory(), isFile() and getStamp() work on directories, archives
+and manifests.
+
+Caches derived from data files are kept in cacheDirectory (see
+getCacheFilename()), not beside the files.
+"""
+
+import os
+import gzip
+import bz2
+import tarfile
+import zipfile
+import StringIO
+import subprocess
+import threading
+
+import pywns.ReferenceStore
+
+compressionSuffixes = [".gz", ".bz2", ".xz"]
+
+archiveSuffixes = [".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".zip"]
+
+def stripCompressionSuffix(filename):
+    """ 'x.dat.gz' -> 'x.dat' """
+    for suffix in compressionSuffixes:
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+def isArchive(filename):
+    for suffix in archiveSuffixes:
+        if filename.endswith(suffix):
+            return os.path.isfile(filename)
+    return False
+
+
+class XZFile(object):
+    """ Reads an xz compressed file (python has no lzma module, the
+    xz program decompresses)
+    """
+
+    def __init__(self, filename):
+        super(XZFile, self).__init__()
+        self.process = subprocess.Popen(["xz", "-dc", filename], stdout = subprocess.PIPE)
+        self.stdout = self.process.stdout
+
+    def __iter__(self):
+        return iter(self.stdout)
+
+    def read(self, *args):
+        return self.stdout.read(*args)
+
+    def readline(self, *args):
+        return self.stdout.readline(*args)
+
+    def readlines(self, *args):
+        return self.stdout.readlines(*args)
+
+    def close(self):
+        self.stdout.close()
+        self.process.wait()
+
+
+class ArchiveIndex(object):
+    """ The members of a tar or zip archive, indexed by name
+    """
+
+    def __init__(self, filename):
+        super(ArchiveIndex, self).__init__()
+        self.filename = filename
+        self.stamp = getFileStamp(filename)
+        self.isZip = filename.endswith(".zip")
+        # member name -> (mtime, size, offset of the data or None)
+        self.members = {}
+        self.prefix = ""
+        self.__lock = threading.Lock()
+        if self.isZip:
+            self.__archive = zipfile.ZipFile(filename)
+            for info in self.__archive.infolist():
+                if not info.filename.endswith("/"):
+                    self.members[info.filename] = (0, info.file_size, None)
+        else:
+            self.__archive = tarfile.open(filename)
+            plain = filename.endswith(".tar")
+            for info in self.__archive.getmembers():
+                if info.isfile():
+                    offset = None
+                    if plain:
+                        offset = info.offset_data
+                    self.members[info.name] = (int(info.mtime), info.size, offset)
+        # an archive of a directory has the directory as top level
+        tops = dict([(name.split("/", 1)[0], None) for name in self.members.keys()])
+        if len(tops) == 1 and "/" in self.members.keys()[0]:
+            self.prefix = tops.keys()[0] + "/"
+
+    def getMember(self, path):
+        """ The member name for a path relative to the archive (or None)
+        """
+        if path == "":
+            return None
+        for name in [self.prefix + path, path]:
+            if self.members.has_key(name):
+                return name
+        return None
+
+    def listDirectory(self, path):
+        """ Names of the files in directory path of the archive
+        """
+        directory = self.prefix
+        if path != "":
+            directory += path.rstrip("/") + "/"
+        result = []
+        for name in self.members.keys():
+            if name.startswith(directory) and "/" not in name[len(directory):]:
+                result.append(name[len(directory):])
+        result.sort()
+        return result
+
+    def open(self, member):
+        mtime, size, offset = self.members[member]
+        if offset != None:
+            f = file(self.filename, "rb")
+            try:
+                f.seek(offset)
+                return StringIO.StringIO(f.read(size))
+            finally:
+                f.close()
+        self.__lock.acquire()
+        try:
+            if self.isZip:
+                return StringIO.StringIO(self.__archive.read(member))
+            return StringIO.StringIO(self.__archive.extractfile(member).read())
+        finally:
+            self.__lock.release()
+
+
+__archives = {}
+__archivesLock = threading.Lock()
+
+def getArchiveIndex(filename):
+    """ The (cached) ArchiveIndex of an archive """
+    filename = os.path.abspath(filename)
+    __archivesLock.acquire()
+    try:
+        index = __archives.get(filename)
+        if index == None or index.stamp != getFileStamp(filename):
+            index = ArchiveIndex(filename)
+            __archives[filename] = index
+        return index
+    finally:
+        __archivesLock.release()
+
+def splitArchivePath(path):
+    """ (archive, path within the archive) if path is in an archive,
+    (None, path) otherwise
+    """
+    if os.path.exists(path):
+        if isArchive(path):
+            return path, ""
+        return None, path
+    head = os.path.abspath(path)
+    tail = ""
+    while True:
+        head, name = os.path.split(head)
+        if name == "":
+            return None, path
+        if tail == "":
+            tail = name
+        else:
+            tail = name + "/" + tail
+        if isArchive(head):
+            return head, tail
+        if os.path.exists(head):
+            return None, path
+
+class ManifestDirectory(object):
+    """ A directory given by its manifest (see module ReferenceStore)
+    """
+
+    def __init__(self, filename):
+        super(ManifestDirectory, self).__init__()
+        self.filename = filename
+        self.stamp = getFileStamp(filename)
+        self.manifest = pywns.ReferenceStore.Manifest.read(filename)
+        self.store = pywns.ReferenceStore.findStore(filename[:-len(pywns.ReferenceStore.manifestSuffix)])
+
+    def getBlobFilename(self, path):
+        """ The blob holding the file path of the directory (or None) """
+        digest = self.manifest.getDigest(path)
+        if digest == None:
+            return None
+        return self.store.getBlobFilename(digest)
+
+
+__manifests = {}
+__manifestsLock = threading.Lock()
+
+def getManifestDirectory(filename):
+    """ The (cached) ManifestDirectory of a manifest """
+    filename = os.path.abspath(filename)
+    __manifestsLock.acquire()
+    try:
+        directory = __manifests.get(filename)
+        if directory == None or directory.stamp != getFileStamp(filename):
+            directory = ManifestDirectory(filename)
+            __manifests[filename] = directory
+        return directory
+    finally:
+        __manifestsLock.release()
+
+def splitManifestPath(path):
+    """ (manifest, path within the directory) if path is in a directory
+    given by a manifest, (None, path) otherwise
+    """
+    if os.path.exists(path):
+        return None, path
+    head = os.path.abspath(path)
+    tail = ""
+    while True:
+        if os.path.isfile(head + pywns.ReferenceStore.manifestSuffix):
+            return head + pywns.ReferenceStore.manifestSuffix, tail
+        head, name = os.path.split(head)
+        if name == "":
+            return None, path
+        if tail == "":
+            tail = name
+        else:
+            tail = name + "/" + tail
+        if os.path.exists(head):
+            return None, path
+
+def getBlobFilename(path):
+    """ The blob holding path if path is in a directory given by a
+    manifest (None otherwise)
+    """
+    manifest, member = splitManifestPath(path)
+    if manifest == None:
+        return None
+    return getManifestDirectory(manifest).getBlobFilename(member)
+
+def findFile(filename):
+    """ The stored variant of filename: filename itself or filename
+    with a compression suffix (None if there is none)
+    """
+    for candidate in [filename] + [filename + suffix for suffix in compressionSuffixes]:
+        if isFile(candidate):
+            return candidate
+    return None
+
+def isFile(path):
+    if os.path.isfile(path):
+        return True
+    archive, member = splitArchivePath(path)
+    if archive != None:
+        return getArchiveIndex(archive).getMember(member) != None
+    return getBlobFilename(path) != None
+
+def isDirectory(dirname):
+    """ True for directories, archives and directories given by a
+    manifest
+    """
+    return os.path.isdir(dirname) or isArchive(dirname) or splitManifestPath(dirname)[0] != None
+
+def exists(filename):
+    """ True if filename is stored (compressed or not) """
+    return findFile(filename) != None
+
+def listDirectory(dirname):
+    """ os.listdir for directories and archives (only files are listed
+    for archives)
+    """
+    archive, path = splitArchivePath(dirname)
+    if archive != None:
+        return getArchiveIndex(archive).listDirectory(path)
+    manifest, path = splitManifestPath(dirname)
+    if manifest != None:
+        return getManifestDirectory(manifest).manifest.listDirectory(path)
+    return os.listdir(dirname)
+
+def getFileStamp(filename):
+    """ (modification time, size, inode) of a file
+
+    The modification time is kept at full precision and the inode is
+    included, so that a file replaced within the same second (e.g. a
+    manifest written again by a rebaseline) gets another stamp.
+    """
+    status = os.stat(filename)
+    return (status.st_mtime, status.st_size, status.st_ino)
+
+def getStamp(filename):
+    """ (modification time, size, inode) of a file (or an archive
+    member: inode of the archive; or a file of a manifest: inode of the
+    blob holding it)
+    """
+    if os.path.exists(filename):
+        return getFileStamp(filename)
+    archive, path = splitArchivePath(filename)
+    if archive != None:
+        index = getArchiveIndex(archive)
+        member = index.getMember(path)
+        if member != None:
+            mtime, size, offset = index.members[member]
+            return (max(mtime, index.stamp[0]), size, index.stamp[2])
+    manifest, path = splitManifestPath(filename)
+    if manifest != None:
+        directory = getManifestDirectory(manifest)
+        blobFilename = directory.getBlobFilename(path)
+        if blobFilename != None:
+            mtime, size, inode = getFileStamp(blobFilename)
+            return (max(mtime, directory.stamp[0]), size, inode)
+    raise OSError(2, "No such file", filename)
+
+def openDataFile(filename):
+    """ Open filename for reading (see module documentation) """
+    found = findFile(filename)
+    if found == None:
+        raise IOError(2, "No such file", filename)
+    archive, path = splitArchivePath(found)
+    if archive != None:
+        index = getArchiveIndex(archive)
+        f = index.open(index.getMember(path))
+        if path.endswith(".gz"):
+            return gzip.GzipFile(fileobj = f)
+        elif path.endswith(".bz2"):
+            return StringIO.StringIO(bz2.decompress(f.read()))
+        elif path.endswith(".xz"):
+            raise IOError("Cannot read xz compressed archive members: " + found)
+        return f
+    stored = found
+    if not os.path.exists(found):
+        stored = getBlobFilename(found)
+    if found.endswith(".gz"):
+        return gzip.GzipFile(stored)
+    elif found.endswith(".bz2"):
+        return bz2.BZ2File(stored)
+    elif found.endswith(".xz"):
+        return XZFile(stored)
+    return file(stored)
+
+cacheDirectory = os.path.join("~", ".openwns", "cache")
+""" where caches derived from files (e.g. preview pyramids) and the
+histories of test runs are kept (not beside the files themselves) """
+
+def getCacheFilename(path, suffix):
+    """ The file in cacheDirectory belonging to path (named after its
+    basename and a digest of its absolute path)
+    """
+    path = os.path.abspath(path)
+    digest = pywns.ReferenceStore.newDigest(path).hexdigest()[:16]
+    return os.path.join(os.path.expanduser(cacheDirectory), os.path.basename(path) + "." + digest + suffix)
@@ -0,0 +1,511 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Executors run system test suites, locally or on worker hosts
+
+A Task names a system test (its directory, the suite config and the
+sandbox to use). An executor runs a list of tasks and returns a
+TaskResult per task: the (mergeable) WNSUnit.TestResults and the output
+directories of the simulations.
+
+LocalExecutor runs each suite in a subprocess of its own on this host.
+RemoteExecutor sends the tasks to workers (started with
+'python Executor.py worker --host <address> --port <port>' on each
+host, in a checkout with the same layout). A worker runs the tasks with
+a LocalExecutor. Workers listen on 127.0.0.1 unless told otherwise and
+only run tasks inside their root directory.
+
+Protocol: one request and one reply per TCP connection. Both are
+marshalled dicts (plain data only), preceded by their length as 10
+decimal digits. Requests are {'command': 'ping'} (reply: {'status':
+'ok', 'jobs': <number of tasks run at the same time>}) and
+{'command': 'run', 'task': <Task.toDict()>} (reply:
+TaskResult.toDict()). There is no authentication: only start workers
+on trusted networks.
+"""
+
+import os
+import sys
+import marshal
+import socket
+import tempfile
+import threading
+import subprocess
+import Queue
+
+class Task(object):
+    """ A system test to run
+
+    dirname: directory of the system test (for workers: relative to
+    their root directory or absolute, but inside the root directory)
+
+    sandboxPath: sandbox with the openwns binaries (None: as
+    configured by the suite)
+    """
+
+    def __init__(self, dirname, suiteConfig = "systemTest.py", suiteName = "testSuite",
+                 sandboxPath = None):
+        super(Task, self).__init__()
+        self.dirname = dirname
+        self.suiteConfig = suiteConfig
+        self.suiteName = suiteName
+        self.sandboxPath = sandboxPath
+
+    def toDict(self):
+        return {"dirname": self.dirname,
+                "suiteConfig": self.suiteConfig,
+                "suiteName": self.suiteName,
+                "sandboxPath": self.sandboxPath}
+
+    # @staticmethod (this syntax works only for python >= 2.4)
+    def fromDict(data):
+        return Task(data["dirname"], data["suiteConfig"], data["suiteName"], data["sandboxPath"])
+    fromDict = staticmethod(fromDict)
+
+
+class TaskResult(object):
+    """ What running a Task gave
+
+    results: WNSUnit.TestResults (timings keyed by the task's dirname)
+    outputDirs: output directories of the simulations (on the host
+    that ran the task)
+    error: None, or why the task could not be run at all
+    """
+
+    def __init__(self, task, results = None, outputDirs = [], error = None, host = "localhost"):
+        super(TaskResult, self).__init__()
+        self.task = task
+        self.results = results
+        self.outputDirs = outputDirs
+        self.error = error
+        self.host = host
+
+    def wasSuccessful(self):
+        return self.error == None and self.results.wasSuccessful()
+
+    def toDict(self):
+        results = None
+        if self.results != None:
+            results = self.results.__dict__
+        return {"task": self.task.toDict(),
+                "results": results,
+                "outputDirs": self.outputDirs,
+                "error": self.error,
+                "host": self.host}
+
+    # @staticmethod (this syntax works only for python >= 2.4)
+    def fromDict(data):
+        import pywns.WNSUnit
+        results = None
+        if data["results"] != None:
+            results = pywns.WNSUnit.TestResults()
+            results.__dict__.update(data["results"])
+        return TaskResult(Task.fromDict(data["task"]), results, data["outputDirs"],
+                          data["error"], data["host"])
+    fromDict = staticmethod(fromDict)
+
+    def getTestResults(self):
+        """ The TestResults, with an error entry if the task failed to run
+        """
+        import pywns.WNSUnit
+        if self.error == None:
+            return self.results
+        results = pywns.WNSUnit.TestResults()
+        results.errors.append((self.task.dirname + " (on " + self.host + ")", self.error))
+        return results
+
+
+class Executor(object):
+    """ Runs tasks (base class of all executors)
+    """
+
+    def run(self, tasks):
+        """ Run all tasks, return the list of TaskResults (same order)
+        """
+        raise NotImplementedError
+
+
+class LocalExecutor(Executor):
+    """ Runs each task in a python subprocess of its own, up to 'jobs'
+    at the same time (the simulations inside share the job server of
+    this process, see module JobServer)
+
+    root: directory relative task directories are resolved against
+    """
+
+    def __init__(self, jobs = 1, root = None, python = sys.executable):
+        super(LocalExecutor, self).__init__()
+        self.jobs = jobs
+        if root == None:
+            root = os.getcwd()
+        self.root = os.path.abspath(root)
+        self.python = python
+
+    def run(self, tasks):
+        return runConcurrently(self.runTask, tasks, self.jobs)
+
+    def runTask(self, task):
+        handle, resultFilename = tempfile.mkstemp(".result")
+        os.close(handle)
+        try:
+            dirname = os.path.join(self.root, task.dirname)
+            args = [self.python, os.path.abspath(__file__).replace(".pyc", ".py"), "run",
+                    resultFilename, dirname, task.suiteConfig, task.suiteName, task.sandboxPath or ""]
+            env = os.environ.copy()
+            env["PYTHONPATH"] = os.pathsep.join([getPackageRoot()] + [ii for ii in
+                                                 [env.get("PYTHONPATH")] if ii])
+            process = subprocess.Popen(args, env = env, stdout = subprocess.PIPE,
+                                       stderr = subprocess.STDOUT)
+            log = process.communicate()[0]
+            try:
+                f = file(resultFilename, "rb")
+                try:
+                    data = marshal.load(f)
+                finally:
+                    f.close()
+            except (IOError, EOFError, ValueError):
+                return TaskResult(task, error = "Running the suite failed (status " +
+                                  str(process.returncode) + "):\n" + log[-10000:],
+                                  host = socket.gethostname())
+            result = TaskResult.fromDict(data)
+            result.task = task
+            if result.results != None:
+                # key the timings by the directory as given in the task
+                timings = {}
+                for durations in result.results.timings.values():
+                    timings[os.path.normpath(task.dirname)] = durations
+                result.results.timings = timings
+                result.results.testTimings = [(os.path.normpath(task.dirname),) + tuple(entry[1:])
+                                              for entry in result.results.testTimings]
+                launcherSummaries = {}
+                for summaries in getattr(result.results, "launcherSummaries", {}).values():
+                    launcherSummaries[os.path.normpath(task.dirname)] = summaries
+                result.results.launcherSummaries = launcherSummaries
+            return result
+        finally:
+            os.remove(resultFilename)
+
+
+class RemoteExecutor(Executor):
+    """ Runs the tasks on workers
+
+    workers: list of 'host:port'. Each worker gets as many tasks at
+    the same time as it announces. A task of a worker that cannot be
+    reached is given to another worker; if no worker is left the
+    remaining tasks fail.
+    """
+
+    def __init__(self, workers, timeout = None):
+        super(RemoteExecutor, self).__init__()
+        self.workers = [parseAddress(worker) for worker in workers]
+        self.timeout = timeout
+
+    def run(self, tasks):
+        queue = Queue.Queue()
+        for index in xrange(len(tasks)):
+            queue.put(index)
+        results = [None] * len(tasks)
+        available = []
+        for address in self.workers:
+            try:
+                jobs = request(address, {"command": "ping"}, 30.0)["jobs"]
+            except (socket.error, EOFError, ValueError, KeyError), e:
+                sys.stderr.write("Warning: worker %s:%d not available: %s\n" % (address + (e,)))
+                continue
+            available += [address] * max(1, jobs)
+        # threads keep waiting for tasks until every task has a result,
+        # a task given back by a failed worker is taken by another one
+        state = {"alive": len(available), "outstanding": len(tasks)}
+        lock = threading.Lock()
+        threads = []
+        for address in available:
+            thread = threading.Thread(target = self.__work,
+                                      args = (address, tasks, queue, results, state, lock))
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            while thread.isAlive():
+                thread.join(0.5)
+        for index in xrange(len(tasks)):
+            if results[index] == None:
+                results[index] = TaskResult(tasks[index], error = "No worker available")
+        return results
+
+    # private stuff
+
+    def __work(self, address, tasks, queue, results, state, lock):
+        while True:
+            try:
+                index = queue.get(True, 0.5)
+            except Queue.Empty:
+                lock.acquire()
+                try:
+                    if state["outstanding"] == 0:
+                        return
+                finally:
+                    lock.release()
+                continue
+            try:
+                reply = request(address, {"command": "run", "task": tasks[index].toDict()}, self.timeout)
+            except (socket.error, EOFError, ValueError), e:
+                # give the task to another worker and retire, the last
+                # worker fails the task and all remaining ones
+                lock.acquire()
+                try:
+                    state["alive"] -= 1
+                    if state["alive"] > 0:
+                        queue.put(index)
+                        return
+                    lost = [index]
+                    while True:
+                        try:
+                            lost.append(queue.get_nowait())
+                        except Queue.Empty:
+                            break
+                    for index in lost:
+                        results[index] = TaskResult(tasks[index], error = "Worker %s:%d failed: %s" %
+                                                    (address + (e,)), host = address[0])
+                    state["outstanding"] -= len(lost)
+                finally:
+                    lock.release()
+                return
+            result = TaskResult.fromDict(reply)
+            result.task = tasks[index]
+            results[index] = result
+            lock.acquire()
+            try:
+                state["outstanding"] -= 1
+            finally:
+                lock.release()
+
+
+class Worker(object):
+    """ Serves 'run' requests of RemoteExecutors with a LocalExecutor
+
+    host: address to listen on (default: loopback only, give the
+    address of the host or "" to accept other hosts)
+
+    Tasks whose directory is not inside the root directory are refused.
+    """
+
+    def __init__(self, port, host = "127.0.0.1", jobs = 1, root = None):
+        super(Worker, self).__init__()
+        self.executor = LocalExecutor(jobs, root)
+        self.semaphore = threading.Semaphore(jobs)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.listen(5)
+        self.port = self.socket.getsockname()[1]
+        self.closed = False
+
+    def serveForever(self):
+        """ Serve requests until the worker is closed """
+        while True:
+            try:
+                connection, address = self.socket.accept()
+            except socket.error:
+                if self.closed:
+                    return
+                raise
+            thread = threading.Thread(target = self.handle, args = (connection,))
+            thread.setDaemon(True)
+            thread.start()
+
+    def handle(self, connection):
+        try:
+            try:
+                message = receiveMessage(connection)
+                if message.get("command") == "ping":
+                    reply = {"status": "ok", "jobs": self.executor.jobs}
+                elif message.get("command") == "run":
+                    task = Task.fromDict(message["task"])
+                    if self.isInsideRoot(task.dirname):
+                        self.semaphore.acquire()
+                        try:
+                            result = self.executor.runTask(task)
+                        finally:
+                            self.semaphore.release()
+                    else:
+                        result = TaskResult(task, error = task.dirname + " is not inside " +
+                                            self.executor.root, host = socket.gethostname())
+                    reply = result.toDict()
+                else:
+                    reply = {"status": "error", "error": "Unknown command"}
+                sendMessage(connection, reply)
+            except (socket.error, EOFError, ValueError), e:
+                sys.stderr.write("Worker: " + str(e) + "\n")
+        finally:
+            connection.close()
+
+    def isInsideRoot(self, dirname):
+        root = os.path.realpath(self.executor.root)
+        path = os.path.realpath(os.path.join(root, dirname))
+        return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+    def close(self):
+        self.closed = True
+        self.socket.close()
+
+
+def getPackageRoot():
+    """ The directory containing the pywns package """
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def parseAddress(address):
+    host, port = address.rsplit(":", 1)
+    return (host, int(port))
+
+def sendMessage(connection, data):
+    payload = marshal.dumps(data)
+    connection.sendall("%010d" % len(payload) + payload)
+
+def receiveMessage(connection):
+    length = int(receiveAll(connection, 10))
+    return marshal.loads(receiveAll(connection, length))
+
+def receiveAll(connection, length):
+    chunks = []
+    while length > 0:
+        chunk = connection.recv(min(length, 65536))
+        if chunk == "":
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        length -= len(chunk)
+    return "".join(chunks)
+
+def request(address, data, timeout = None):
+    """ Send a request to a worker and return its reply """
+    connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(timeout)
+        connection.connect(address)
+        sendMessage(connection, data)
+        return receiveMessage(connection)
+    finally:
+        connection.close()
+
+def runConcurrently(function, tasks, jobs):
+    """ [function(task) for task in tasks], with up to 'jobs' threads
+
+    function should handle its own errors: the result of a task whose
+    function raises stays None.
+    """
+    queue = Queue.Queue()
+    for index in xrange(len(tasks)):
+        queue.put(index)
+    results = [None] * len(tasks)
+    def work():
+        while True:
+            try:
+                index = queue.get_nowait()
+            except Queue.Empty:
+                return
+            results[index] = function(tasks[index])
+    threads = []
+    for ii in xrange(max(1, min(jobs, len(tasks)))):
+        thread = threading.Thread(target = work)
+        thread.setDaemon(True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        # join with timeout, otherwise KeyboardInterrupt is not delivered
+        while thread.isAlive():
+            thread.join(0.5)
+    return results
+
+def runSuite(task):
+    """ Run the suite of task in this process and return the TaskResult
+    """
+    import pywns.WNSUnit
+    loader = pywns.WNSUnit.SuiteDefinitionLoader(task.suiteConfig, task.suiteName)
+    if not loader.hasSuiteConfig(task.dirname):
+        return TaskResult(task, error = "No " + task.suiteConfig + " in " + task.dirname,
+                          host = socket.gethostname())
+    suite = loader.load(task.dirname)
+    if suite == None:
+        return TaskResult(task, error = "No " + task.suiteName + " in " +
+                          os.path.join(task.dirname, task.suiteConfig), host = socket.gethostname())
+    systemTestSuites = pywns.WNSUnit.getSystemTestSuites(suite)
+    if task.sandboxPath:
+        for systemTestSuite in systemTestSuites:
+            systemTestSuite.sandboxPath = os.path.abspath(task.sandboxPath)
+    runner = pywns.WNSUnit.TextTestRunner(verbosity = 1)
+    results = pywns.WNSUnit.TestResults(runner.run(suite),
+                                        [(os.path.normpath(task.dirname), systemTestSuite)
+                                         for systemTestSuite in systemTestSuites])
+    durations = pywns.WNSUnit.getSuiteDurations(suite)
+    if len(durations) > 0:
+        results.timings[os.path.normpath(task.dirname)] = durations
+    outputDirs = []
+    for systemTestSuite in systemTestSuites:
+        for outputDir in [systemTestSuite.dbgOutputDir, systemTestSuite.optOutputDir]:
+            outputDir = os.path.join(systemTestSuite.workingDir, outputDir)
+            if os.path.isdir(outputDir):
+                outputDirs.append(outputDir)
+    return TaskResult(task, results, outputDirs, host = socket.gethostname())
+
+
+def main(args):
+    usage = "Usage: Executor.py worker [--host <address>] [--port <port>] [--jobs <n>] [--root <dir>]\n" \
+            "       Executor.py run <result file> <dir> <suite config> <suite name> [<sandbox>]\n"
+    if len(args) > 0 and args[0] == "run" and len(args) in [5, 6]:
+        resultFilename, dirname, suiteConfig, suiteName = args[1:5]
+        sandboxPath = None
+        if len(args) == 6 and args[5] != "":
+            sandboxPath = args[5]
+        result = runSuite(Task(dirname, suiteConfig, suiteName, sandboxPath))
+        f = file(resultFilename, "wb")
+        marshal.dump(result.toDict(), f)
+        f.close()
+        return 0
+    if len(args) > 0 and args[0] == "worker":
+        options = {"--host": "127.0.0.1", "--port": "0", "--jobs": "1", "--root": None}
+        rest = args[1:]
+        while len(rest) >= 2 and options.has_key(rest[0]):
+            options[rest[0]] = rest[1]
+            rest = rest[2:]
+        if len(rest) > 0:
+            sys.stderr.write(usage)
+            return 1
+        worker = Worker(int(options["--port"]), options["--host"], int(options["--jobs"]),
+                        options["--root"])
+        print "Worker listening on port", worker.port
+        sys.stdout.flush()
+        try:
+            worker.serveForever()
+        except KeyboardInterrupt:
+            worker.close()
+        return 0
+    sys.stderr.write(usage)
+    return 1
+
+if __name__ == "__main__":
+    if getPackageRoot() not in sys.path:
+        sys.path.insert(0, getPackageRoot())
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,174 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Measure how long importing a module takes and check it against a budget
+
+Each measurement imports the module in a fresh interpreter. The import
+statement is hooked to time every import (like 'python -X importtime'
+of newer pythons). The interpreter marshals its result to a file of its
+own, so whatever the imported modules print does not matter. The
+fastest of several runs is reported.
+
+Usage (the playground command 'importtime' does this for the Testing
+plugin):
+
+  python pywns/ImportTime.py --budget 0.05 --path <plugins dir> \\
+      --forbid pywns.WNSUnit,pywns.MemCheck Testing
+
+exits with 1 if the import takes longer than the budget (seconds) or
+loads one of the forbidden modules.
+"""
+
+import os
+import sys
+import marshal
+import tempfile
+import subprocess
+
+defaultBudget = 0.1
+""" seconds """
+
+childCode = """
+import sys
+import time
+import marshal
+import __builtin__
+realImport = __builtin__.__import__
+imports = []
+depth = [0]
+def timedImport(name, *args):
+    before = len(sys.modules)
+    start = time.time()
+    depth[0] += 1
+    try:
+        return realImport(name, *args)
+    finally:
+        depth[0] -= 1
+        if len(sys.modules) > before:
+            imports.append((depth[0], name, time.time() - start))
+__builtin__.__import__ = timedImport
+start = time.time()
+__import__(%(module)r)
+total = time.time() - start
+__builtin__.__import__ = realImport
+f = open(%(resultFilename)r, "wb")
+marshal.dump((total, imports, sys.modules.keys()), f)
+f.close()
+"""
+
+class ImportTime(object):
+    """ Result of measuring the import of a module
+
+    total: seconds the import took
+    imports: list of (depth, name, seconds) of the modules loaded, in
+    the order their import finished
+    modules: names of all modules loaded afterwards
+    """
+
+    def __init__(self, module, total, imports, modules):
+        super(ImportTime, self).__init__()
+        self.module = module
+        self.total = total
+        self.imports = imports
+        self.modules = modules
+
+    def getSlowest(self, number = 10):
+        """ The top level imports (depth 0 and 1) taking longest """
+        slowest = [(seconds, name) for depth, name, seconds in self.imports if depth <= 1]
+        slowest.sort()
+        slowest.reverse()
+        return slowest[:number]
+
+    def writeSummary(self, stream, number = 10):
+        stream.write("import %s: %.1f ms\n" % (self.module, 1000.0 * self.total))
+        for seconds, name in self.getSlowest(number):
+            stream.write("  %8.1f ms  %s\n" % (1000.0 * seconds, name))
+
+
+def measure(module, repeat = 5, python = sys.executable, path = []):
+    """ Import module 'repeat' times in a fresh interpreter and return
+    the ImportTime of the fastest run
+    """
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(path + [ii for ii in [env.get("PYTHONPATH")] if ii])
+    best = None
+    handle, resultFilename = tempfile.mkstemp(".importTime")
+    os.close(handle)
+    try:
+        for ii in xrange(repeat):
+            code = childCode % {"module": module, "resultFilename": resultFilename}
+            process = subprocess.Popen([python, "-c", code], env = env,
+                                       stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+            # the output of the imported modules is not of interest
+            error = process.communicate()[1]
+            if process.returncode != 0:
+                raise ImportError("Importing " + module + " failed:\n" + error.rstrip())
+            f = file(resultFilename, "rb")
+            try:
+                total, imports, modules = marshal.load(f)
+            finally:
+                f.close()
+            if best == None or total < best.total:
+                best = ImportTime(module, total, imports, modules)
+    finally:
+        os.remove(resultFilename)
+    return best
+
+def check(importTime, budget = defaultBudget, forbidden = []):
+    """ List of violations of the budget (empty if there is none)
+    """
+    violations = []
+    if importTime.total > budget:
+        violations.append("import %s takes %.1f ms, budget is %.1f ms" %
+                          (importTime.module, 1000.0 * importTime.total, 1000.0 * budget))
+    for module in forbidden:
+        if module in importTime.modules:
+            violations.append("import %s loads %s" % (importTime.module, module))
+    return violations
+
+def main(args):
+    usage = "Usage: ImportTime.py [--budget <seconds>] [--forbid <module>,...] [--repeat <n>] [--path <dir>,...] <module>\n"
+    options = {"--budget": str(defaultBudget), "--forbid": "", "--repeat": "5", "--path": ""}
+    while len(args) >= 2 and options.has_key(args[0]):
+        options[args[0]] = args[1]
+        args = args[2:]
+    if len(args) != 1:
+        sys.stderr.write(usage)
+        return 1
+    path = [os.path.abspath(ii) for ii in options["--path"].split(",") if ii != ""]
+    forbidden = [ii.strip() for ii in options["--forbid"].split(",") if ii.strip() != ""]
+    importTime = measure(args[0], int(options["--repeat"]), path = path)
+    importTime.writeSummary(sys.stdout)
+    violations = check(importTime, float(options["--budget"]), forbidden)
+    for violation in violations:
+        print "Error! " + violation
+    if len(violations) > 0:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
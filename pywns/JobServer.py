@@ -0,0 +1,271 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" A job slot manager shared by everything that starts subprocesses
+(simulations, external programs, valgrind)
+
+Every launcher acquires a Job from the JobServer before it starts a
+subprocess and releases it afterwards. The server limits the number of
+jobs and (optionally) the sum of the memory the jobs announced.
+
+The job slots are handed out like GNU make does: the first job uses an
+implicit slot, every further job needs a token read from a pipe. If
+this process runs below a make (MAKEFLAGS contains --jobserver-fds or
+--jobserver-auth) the tokens of that make are used. Otherwise the
+server creates its own pipe and exports it in MAKEFLAGS, so nested
+tools (make, scons -j, another playground) share the same budget.
+
+Jobs can be pinned to a CPU of their own (via taskset, if installed).
+
+Use getJobServer() to get the server of this process and configure()
+to change it.
+"""
+
+import os
+import re
+import errno
+import fcntl
+import threading
+
+def getNumberOfCPUs():
+    try:
+        return max(1, int(os.sysconf("SC_NPROCESSORS_ONLN")))
+    except (ValueError, OSError, AttributeError):
+        return 1
+
+def findExecutable(name):
+    for path in os.environ.get("PATH", "").split(os.pathsep):
+        candidate = os.path.join(path, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+class Job(object):
+    """ A job slot acquired from a JobServer
+    """
+
+    taskset = findExecutable("taskset")
+
+    def __init__(self, cpu, memory, token):
+        super(Job, self).__init__()
+        self.cpu = cpu
+        self.memory = memory
+        self.token = token
+
+    def getCommandPrefix(self):
+        """ Prefix for a shell command line that pins the command to
+        the CPU of this job ("" if not pinned)
+        """
+        if self.cpu == None:
+            return ""
+        return self.taskset + " -c " + str(self.cpu) + " "
+
+    def getArgsPrefix(self):
+        """ Like getCommandPrefix, but as list of arguments
+        """
+        if self.cpu == None:
+            return []
+        return [self.taskset, "-c", str(self.cpu)]
+
+
+class JobServer(object):
+    """ Hands out job slots
+
+    jobs: maximum number of jobs at the same time (when running below
+    a make, the make decides)
+
+    memory: memory budget in MB (None: unlimited). A job announcing
+    more memory than the budget is only started when no other job
+    runs.
+
+    pinCPUs: pin each job to a CPU of its own (if taskset is available)
+    """
+
+    makeflagsPattern = re.compile(r"--jobserver-(?:fds|auth)=(\d+),(\d+)")
+
+    def __init__(self, jobs = 1, memory = None, pinCPUs = True):
+        super(JobServer, self).__init__()
+        self.jobs = jobs
+        self.memory = memory
+        self.__condition = threading.Condition()
+        self.__running = 0
+        self.__memoryUsed = 0
+        self.__freeCPUs = range(getNumberOfCPUs())
+        self.__ownPipe = False
+        self.__fds = self.__getInheritedFds()
+        if self.__fds == None and jobs > 1:
+            self.__createPipe(jobs - 1)
+        self.__reader = None
+        if self.__fds != None:
+            self.__reader = self.__openReader()
+        # pinning a single job to one CPU would only hurt
+        self.pinCPUs = pinCPUs and Job.taskset != None and self.isParallel()
+
+    def isParallel(self):
+        """ True if more than one job may run at the same time
+        """
+        return self.__fds != None or self.jobs > 1
+
+    def acquire(self, memory = 0, block = True):
+        """ Acquire a job slot for a job that needs 'memory' MB. Waits
+        until a slot is free if block == True, otherwise returns None if
+        no slot is free.
+        """
+        self.__condition.acquire()
+        try:
+            while True:
+                token = None
+                if self.__memoryAvailable(memory):
+                    if self.__running == 0:
+                        # the implicit slot
+                        break
+                    if self.__fds == None:
+                        if self.__running < self.jobs:
+                            break
+                    else:
+                        token = self.__readToken()
+                        if token != None:
+                            break
+                if not block:
+                    return None
+                self.__condition.wait(0.2)
+
+            cpu = None
+            if self.pinCPUs and len(self.__freeCPUs) > 0:
+                cpu = self.__freeCPUs.pop(0)
+            self.__running += 1
+            self.__memoryUsed += memory
+            return Job(cpu, memory, token)
+        finally:
+            self.__condition.release()
+
+    def release(self, job):
+        self.__condition.acquire()
+        try:
+            if job.token != None:
+                os.write(self.__fds[1], job.token)
+            if job.cpu != None:
+                self.__freeCPUs.append(job.cpu)
+                self.__freeCPUs.sort()
+            self.__running -= 1
+            self.__memoryUsed -= job.memory
+            self.__condition.notifyAll()
+        finally:
+            self.__condition.release()
+
+    def close(self):
+        """ Close the pipe created by this server (if any)
+        """
+        if self.__reader != None and self.__reader != self.__fds[0]:
+            os.close(self.__reader)
+        self.__reader = None
+        if self.__ownPipe:
+            os.close(self.__fds[0])
+            os.close(self.__fds[1])
+            self.__fds = None
+            self.__ownPipe = False
+            if self.__oldMakeflags == None:
+                del os.environ["MAKEFLAGS"]
+            else:
+                os.environ["MAKEFLAGS"] = self.__oldMakeflags
+
+    # private stuff
+
+    def __memoryAvailable(self, memory):
+        if self.memory == None or self.__running == 0:
+            return True
+        return self.__memoryUsed + memory <= self.memory
+
+    def __readToken(self):
+        # never blocks (the condition is held): another process may
+        # take the token we have seen
+        try:
+            token = os.read(self.__reader, 1)
+        except OSError, e:
+            if e.errno in [errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR]:
+                return None
+            raise
+        if token == "":
+            return None
+        return token
+
+    def __openReader(self):
+        # O_NONBLOCK belongs to the open pipe, which is shared with make
+        # and the nested tools. If possible, open a private one.
+        try:
+            reader = os.open("/proc/self/fd/%d" % self.__fds[0], os.O_RDONLY | os.O_NONBLOCK)
+        except OSError:
+            reader = self.__fds[0]
+        fcntl.fcntl(reader, fcntl.F_SETFL, fcntl.fcntl(reader, fcntl.F_GETFL) | os.O_NONBLOCK)
+        if reader != self.__fds[0]:
+            fcntl.fcntl(reader, fcntl.F_SETFD, fcntl.fcntl(reader, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        return reader
+
+    def __getInheritedFds(self):
+        match = self.makeflagsPattern.search(os.environ.get("MAKEFLAGS", ""))
+        if match == None:
+            return None
+        fds = (int(match.group(1)), int(match.group(2)))
+        try:
+            # make closes the pipe for commands not marked as recursive
+            os.fstat(fds[0])
+            os.fstat(fds[1])
+        except OSError:
+            return None
+        return fds
+
+    def __createPipe(self, tokens):
+        self.__fds = os.pipe()
+        self.__ownPipe = True
+        os.write(self.__fds[1], "+" * tokens)
+        self.__oldMakeflags = os.environ.get("MAKEFLAGS")
+        makeflags = self.makeflagsPattern.sub("", os.environ.get("MAKEFLAGS", ""))
+        makeflags += " -j --jobserver-fds=%d,%d" % self.__fds
+        os.environ["MAKEFLAGS"] = makeflags.strip()
+
+
+__jobServer = None
+
+def getJobServer():
+    """ The job server of this process (created on first use with one
+    job slot, unless running below a make)
+    """
+    global __jobServer
+    if __jobServer == None:
+        __jobServer = JobServer()
+    return __jobServer
+
+def configure(jobs = 1, memory = None, pinCPUs = True):
+    """ Replace the job server of this process. Must not be called
+    while jobs are running.
+    """
+    global __jobServer
+    if __jobServer != None:
+        __jobServer.close()
+    __jobServer = JobServer(jobs, memory, pinCPUs)
+    return __jobServer
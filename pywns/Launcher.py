@@ -0,0 +1,219 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Launchers wrap the command line of a simulation
+
+A launcher prefixes the simulator command (e.g. with valgrind, perf
+stat or /usr/bin/time) and summarizes what the wrapping tool measured
+after the simulation has finished. Use them with WNSUnit.Simulation and
+WNSUnit.SystemTestSuite (parameter 'launcher').
+
+Each simulation run by a launcher is identified by a tag (the output
+directory of the simulation). The files of the tool are named after
+this tag and are placed in the working directory of the simulation
+(given to getCommand and getSummary, None means the current directory).
+Launchers only build absolute paths from it and never change the
+current directory, as several simulations are started from threads.
+"""
+
+import os
+import StringIO
+
+import pywns.MemCheck
+
+def shellQuote(arg):
+    return "'" + arg.replace("'", "'\\''") + "'"
+
+def getToolFilename(workingDir, tag, suffix):
+    """ Absolute name of the file 'tag.suffix' of a tool in workingDir
+    (None: the current directory)
+    """
+    if workingDir == None:
+        workingDir = os.getcwd()
+    return os.path.abspath(os.path.join(workingDir, tag + "." + suffix))
+
+class Launcher(object):
+    """ Launches the simulator directly (and is the base class of all
+    launchers)
+    """
+
+    name = "direct"
+
+    def getCommand(self, command, tag, workingDir = None):
+        """ Return the (shell) command line to launch command in
+        workingDir
+        """
+        return command
+
+    def getSummary(self, tag, workingDir = None):
+        """ Return a textual summary of what has been measured while
+        running the simulation with this tag in workingDir
+        """
+        return ""
+
+
+class ValgrindLauncher(Launcher):
+    """ Runs the simulator under a valgrind tool
+
+    The arguments of valgrind are built by pywns.MemCheck.Runner (so
+    the openWNS suppressions are used for memcheck). For memcheck the
+    summary is built from valgrind's XML output, for massif and
+    callgrind/cachegrind from the profile.
+    """
+
+    def __init__(self, tool = "memcheck", **runnerArgs):
+        super(ValgrindLauncher, self).__init__()
+        self.name = "valgrind:" + tool
+        self.tool = tool
+        self.runnerArgs = runnerArgs
+
+    def getCommand(self, command, tag, workingDir = None):
+        if self.tool == "memcheck":
+            runner = pywns.MemCheck.Runner(tool = self.tool,
+                                           logFile = self.__getFilename(workingDir, tag, "log"),
+                                           xmlFile = self.__getFilename(workingDir, tag, "xml"),
+                                           **self.runnerArgs)
+        else:
+            runner = pywns.MemCheck.Runner(tool = self.tool,
+                                           logFile = self.__getFilename(workingDir, tag, "log"),
+                                           outFile = self.__getFilename(workingDir, tag, "out"),
+                                           **self.runnerArgs)
+        return " ".join([shellQuote(arg) for arg in runner.args] + [command])
+
+    def getSummary(self, tag, workingDir = None):
+        stream = StringIO.StringIO()
+        if self.tool == "memcheck":
+            report = pywns.MemCheck.XMLReport()
+            report.parse(self.__getFilename(workingDir, tag, "xml"))
+            report.writeSummary(stream)
+        elif not os.path.exists(self.__getFilename(workingDir, tag, "out")):
+            return ""
+        elif self.tool == "massif":
+            pywns.MemCheck.MassifProfile(self.__getFilename(workingDir, tag, "out")).writeSummary(stream)
+        else:
+            pywns.MemCheck.CallgrindProfile(self.__getFilename(workingDir, tag, "out")).writeSummary(stream)
+        return stream.getvalue()
+
+    # private stuff
+
+    def __getFilename(self, workingDir, tag, extension):
+        return getToolFilename(workingDir, tag, self.tool + "." + extension)
+
+
+class PerfStatLauncher(Launcher):
+    """ Counts hardware events with 'perf stat'
+
+    events: list of perf events (e.g. ['cycles', 'instructions']),
+    empty for the default set of perf
+    """
+
+    name = "perf"
+
+    def __init__(self, events = [], perf = "perf"):
+        super(PerfStatLauncher, self).__init__()
+        self.events = events
+        self.perf = perf
+
+    def getCommand(self, command, tag, workingDir = None):
+        args = [self.perf, "stat", "-x", ",", "-o", getToolFilename(workingDir, tag, "perf.csv")]
+        for event in self.events:
+            args += ["-e", event]
+        return " ".join([shellQuote(arg) for arg in args] + ["--", command])
+
+    def getSummary(self, tag, workingDir = None):
+        """ perf stat CSV output: value,unit,event,...
+        """
+        filename = getToolFilename(workingDir, tag, "perf.csv")
+        if not os.path.exists(filename):
+            return ""
+        summary = ""
+        for line in file(filename):
+            fields = line.strip().split(",")
+            if line.startswith("#") or len(fields) < 3:
+                continue
+            value, unit, event = fields[:3]
+            summary += "  %-30s %20s %s\n" % (event, value, unit)
+        return summary
+
+
+class TimeLauncher(Launcher):
+    """ Measures run time and memory with '/usr/bin/time -v'
+    """
+
+    name = "time"
+
+    # prefixes of the lines reported (GNU time appends the format to
+    # some keys, e.g. 'Elapsed (wall clock) time (h:mm:ss or m:ss):')
+    summaryKeys = ["Elapsed (wall clock) time",
+                   "User time (seconds)",
+                   "System time (seconds)",
+                   "Maximum resident set size (kbytes)",
+                   "Major (requiring I/O) page faults",
+                   "Voluntary context switches",
+                   "Involuntary context switches"]
+
+    def __init__(self, time = "/usr/bin/time"):
+        super(TimeLauncher, self).__init__()
+        self.time = time
+
+    def getCommand(self, command, tag, workingDir = None):
+        args = [self.time, "-v", "-o", getToolFilename(workingDir, tag, "time.txt")]
+        return " ".join([shellQuote(arg) for arg in args] + [command])
+
+    def getSummary(self, tag, workingDir = None):
+        filename = getToolFilename(workingDir, tag, "time.txt")
+        if not os.path.exists(filename):
+            return ""
+        summary = ""
+        for line in file(filename):
+            for key in self.summaryKeys:
+                if line.strip().startswith(key):
+                    summary += "  " + line.strip() + "\n"
+        return summary
+
+
+def createLauncher(spec):
+    """ Create a launcher from a short specification:
+
+    'direct'                                      -> Launcher
+    'valgrind' or 'valgrind:<tool>'               -> ValgrindLauncher
+    'perf' or 'perf:<event>,<event>,...'          -> PerfStatLauncher
+    'time'                                        -> TimeLauncher
+    """
+    name = spec.split(":", 1)[0]
+    argument = spec[len(name) + 1:]
+    if name == "direct":
+        return Launcher()
+    elif name == "valgrind":
+        if argument == "":
+            argument = "memcheck"
+        return ValgrindLauncher(tool = argument)
+    elif name == "perf":
+        return PerfStatLauncher(events = [ii for ii in argument.split(",") if ii != ""])
+    elif name == "time":
+        return TimeLauncher()
+    raise ValueError("Unknown launcher: " + spec)
@@ -5,6 +5,16 @@ import os
 import sys
 import signal
 import glob
+import time
+import re
+
+import pywns.JobServer
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    # python < 2.5
+    import cElementTree as ElementTree
 
 def searchPathToSDK(path):
     rootSign = ".thisIsTheRootOfWNS"
@@ -27,6 +37,20 @@ class SignalHandler:
         sys.exit(returncode)
 
 class Runner:
+    """ Runs a program under valgrind
+
+    tool is one of 'memcheck' (default), 'massif', 'callgrind' or
+    'cachegrind'. For the profiling tools, outFile names the file the
+    profile is written to (see MassifProfile and CallgrindProfile).
+    Leak checking options and suppressions only apply to memcheck.
+    """
+
+    outFileOptions = {
+        "massif" : "--massif-out-file=",
+        "callgrind" : "--callgrind-out-file=",
+        "cachegrind" : "--cachegrind-out-file=",
+        }
+
     def __init__(self,
                  # use args (list of str) to provide program and arguments for memcheck
                  args=[],
@@ -36,19 +60,34 @@ class Runner:
                  leak_resolution='low',
                  errorExitCode="192",
                  suppressions=[],
-                 useOpenWNSSuppressions = True):
+                 useOpenWNSSuppressions = True,
+                 logFile=None,
+                 xmlFile=None,
+                 tool='memcheck',
+                 outFile=None):
         self.env = os.environ
         self.env['GLIBCPP_FORCE_NEW']='1'
         self.env['GLIBCXX_FORCE_NEW']='1'
         self.cwd = cwd
         self.executable = 'valgrind'
+        self.errorExitCode = int(errorExitCode)
+        self.logFile = logFile
+        self.tool = tool
+        self.outFile = outFile
+        # the first argument is the name of the program itself
         self.args = [
-            '--tool=memcheck',
+            self.executable,
+            '--tool='+tool,
             '--num-callers='+str(num_callers),
-            '--leak-check='+leak_check,
-            '--leak-resolution='+leak_resolution,
             '--error-exitcode='+errorExitCode
         ]
+        if tool == 'memcheck':
+            self.args += [
+                '--leak-check='+leak_check,
+                '--leak-resolution='+leak_resolution
+            ]
+        elif outFile != None:
+            self.args.append(self.outFileOptions[tool]+outFile)
 
         pathToSDK = searchPathToSDK(os.path.abspath(os.path.dirname(sys.argv[0])))
 
@@ -56,14 +95,42 @@ class Runner:
             print "Error! You are note within an openWNS-SDK. Giving up"
             exit(1)
 
+        if tool != 'memcheck':
+            suppressions = []
+            useOpenWNSSuppressions = False
         if useOpenWNSSuppressions:
             self.args.append('--suppressions='+os.path.join(pathToSDK, "config", "valgrind.supp"))
         for suppressionsFile in suppressions:
             self.args.append('--suppressions='+suppressionsFile)
+        if logFile != None:
+            self.args.append('--log-file='+logFile)
+        if xmlFile != None:
+            self.args += ['--xml=yes', '--xml-file='+xmlFile]
         self.args += args
 
+    def start(self, job=None):
+        """ Start valgrind and return the subprocess.Popen object
+
+        job: the slot acquired from the job server (see module
+        JobServer) to run valgrind in
+        """
+        prefix = []
+        if job != None:
+            prefix = job.getArgsPrefix()
+        return subprocess.Popen(prefix + self.args, bufsize=0, env=self.env, cwd=self.cwd)
+
     def run(self):
-        sp = subprocess.Popen(self.args, bufsize=0, executable=self.executable, env=self.env, cwd=self.cwd)
+        jobServer = pywns.JobServer.getJobServer()
+        job = jobServer.acquire()
+        try:
+            return self.__run(job)
+        finally:
+            jobServer.release(job)
+
+    # private stuff
+
+    def __run(self, job):
+        sp = self.start(job)
         # save old signal handler for SIGINT
         oldSigIntHandler = signal.getsignal(signal.SIGINT)
         # install new signal handler for SIGINT
@@ -74,6 +141,520 @@ class Runner:
         signal.signal(signal.SIGINT, oldSigIntHandler)
         return returncode
 
+class LogSummary:
+    """ The findings of memcheck as reported in the summary at the end
+    of a valgrind log file
+    """
+
+    errorSummary = re.compile(r"ERROR SUMMARY: ([0-9,]+) errors")
+    leakSummary = re.compile(r"(definitely|indirectly|possibly) lost: ([0-9,]+) bytes")
+
+    def __init__(self, logFile):
+        self.logFile = logFile
+        self.errors = 0
+        self.lost = {"definitely" : 0, "indirectly" : 0, "possibly" : 0}
+        if not os.path.exists(logFile):
+            return
+        for line in file(logFile):
+            match = self.errorSummary.search(line)
+            if match:
+                self.errors += int(match.group(1).replace(",", ""))
+            match = self.leakSummary.search(line)
+            if match:
+                self.lost[match.group(1)] += int(match.group(2).replace(",", ""))
+
+class Finding:
+    """ One memcheck error or leak record, possibly reported several
+    times (count) from the same stack
+    """
+
+    def __init__(self, kind, what, frames):
+        self.kind = kind
+        self.what = what
+        self.frames = frames
+        self.count = 0
+        self.bytes = 0
+
+    def getSignature(self):
+        return self.kind + "\t" + " | ".join(self.frames)
+
+    def isLeak(self):
+        return self.kind.startswith("Leak_")
+
+class XMLReport:
+    """ Findings of memcheck read from valgrind's XML output (--xml=yes)
+
+    The XML files are parsed incrementally so that huge reports can be
+    read. Findings with the same kind and stack (function and file of
+    each frame, line numbers are ignored so that the signature survives
+    unrelated code changes) are merged.
+
+    A baseline is a file with one signature per line. Findings not in
+    the baseline are new (see getNewFindings).
+    """
+
+    allocators = ["malloc", "calloc", "realloc", "memalign", "operator new", "operator delete", "free"]
+
+    def __init__(self):
+        # signature -> Finding
+        self.findings = {}
+
+    def parse(self, xmlFile):
+        if not os.path.exists(xmlFile) or os.path.getsize(xmlFile) == 0:
+            return
+        root = None
+        try:
+            for event, element in ElementTree.iterparse(xmlFile, events=("start", "end")):
+                if root == None:
+                    root = element
+                if event == "end" and element.tag == "error":
+                    self.__addError(element)
+                    root.clear()
+        except SyntaxError:
+            # valgrind was killed (e.g. timeout): keep what was read so far
+            pass
+
+    def getFindings(self):
+        findings = self.findings.values()
+        findings.sort(lambda a, b: cmp(b.bytes, a.bytes) or cmp(b.count, a.count) or cmp(a.getSignature(), b.getSignature()))
+        return findings
+
+    def getCallSite(self, finding):
+        """ The first frame that is not part of an allocator
+        """
+        for frame in finding.frames:
+            isAllocator = False
+            for allocator in self.allocators:
+                if frame.startswith(allocator):
+                    isAllocator = True
+            if not isAllocator:
+                return frame
+        return "???"
+
+    def getBytesLostPerCallSite(self):
+        """ Return a list of (bytes, callSite) sorted by bytes (largest first)
+        """
+        lost = {}
+        for finding in self.findings.values():
+            if finding.isLeak():
+                callSite = self.getCallSite(finding)
+                lost[callSite] = lost.get(callSite, 0) + finding.bytes
+        result = [(bytes, callSite) for callSite, bytes in lost.items()]
+        result.sort(lambda a, b: cmp(b, a))
+        return result
+
+    def readBaseline(filename):
+        signatures = set()
+        for line in file(filename):
+            line = line.rstrip("\n")
+            if line != "" and not line.startswith("#"):
+                signatures.add(line)
+        return signatures
+    readBaseline = staticmethod(readBaseline)
+
+    def writeBaseline(self, filename):
+        signatures = self.findings.keys()
+        signatures.sort()
+        f = file(filename, "w")
+        f.write("# memcheck baseline: kind<TAB>stack (one finding per line)\n")
+        for signature in signatures:
+            f.write(signature + "\n")
+        f.close()
+
+    def getNewFindings(self, baseline):
+        """ Findings whose signature is not in baseline (set of signatures)
+        """
+        return [finding for finding in self.getFindings() if finding.getSignature() not in baseline]
+
+    def writeSummary(self, stream, baseline=None, maxEntries=20):
+        findings = self.getFindings()
+        stream.write("\n%d distinct memcheck findings\n" % len(findings))
+        for finding in findings[:maxEntries]:
+            new = ""
+            if baseline != None and finding.getSignature() not in baseline:
+                new = "NEW "
+            stream.write("  %s%s (%dx, %d bytes): %s\n" % (new, finding.kind, finding.count, finding.bytes, finding.what))
+            for frame in finding.frames[:5]:
+                stream.write("      " + frame + "\n")
+        lost = self.getBytesLostPerCallSite()
+        if len(lost) > 0:
+            stream.write("\nBytes lost per call site:\n")
+            for bytes, callSite in lost[:maxEntries]:
+                stream.write("  %10d  %s\n" % (bytes, callSite))
+        if baseline != None:
+            stream.write("\n%d findings not in baseline\n" % len(self.getNewFindings(baseline)))
+
+    # private stuff
+
+    def __addError(self, element):
+        kind = element.findtext("kind", "")
+        what = element.findtext("what")
+        xwhat = element.find("xwhat")
+        if what == None and xwhat != None:
+            what = xwhat.findtext("text", "")
+        frames = []
+        stack = element.find("stack")
+        if stack != None:
+            for frame in stack.findall("frame"):
+                frames.append(self.__formatFrame(frame))
+        finding = Finding(kind, what, frames)
+        finding = self.findings.setdefault(finding.getSignature(), finding)
+        finding.count += 1
+        if xwhat != None:
+            finding.bytes += int(xwhat.findtext("leakedbytes", "0"))
+
+    def __formatFrame(self, frame):
+        fn = frame.findtext("fn", "???")
+        location = frame.findtext("file")
+        if location == None:
+            # the path of the object may differ from machine to machine
+            location = os.path.basename(frame.findtext("obj", "???"))
+        return fn + " (" + location + ")"
+
+class MassifProfile:
+    """ Heap profile written by massif (--massif-out-file)
+
+    peakHeap is the largest heap size (useful heap plus allocator
+    overhead) of all snapshots in bytes, peakSites lists
+    (bytes, function) of the allocation sites directly below the root
+    of the detailed snapshot nearest to the peak (largest first).
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.peakHeap = 0
+        self.peakTime = 0
+        self.peakSites = []
+        self.snapshots = 0
+        snapshot = {}
+        sites = []
+        detailedPeakHeap = -1
+        for line in file(filename):
+            if line.startswith("snapshot="):
+                self.__closeSnapshot(snapshot)
+                snapshot = {}
+                sites = []
+                self.snapshots += 1
+            elif line.startswith("heap_tree="):
+                snapshot["tree"] = line.strip().split("=", 1)[1]
+            elif "=" in line and not line.startswith(" ") and not line.startswith("n"):
+                key, value = line.strip().split("=", 1)
+                snapshot[key] = value
+            elif line.startswith(" n"):
+                # first level below the root of a detailed snapshot
+                count, rest = line.strip()[1:].split(":", 1)
+                bytes, function = rest.strip().split(" ", 1)
+                sites.append((int(bytes), self.__stripAddress(function)))
+                heap = self.__getHeap(snapshot)
+                if heap > detailedPeakHeap:
+                    detailedPeakHeap = heap
+                    self.peakSites = sites
+        self.__closeSnapshot(snapshot)
+        self.peakSites.sort(lambda a, b: cmp(b, a))
+
+    def compare(self, baseline):
+        """ Relative change of the peak heap with respect to baseline
+        (another MassifProfile)
+        """
+        if baseline.peakHeap == 0:
+            return 0.0
+        return float(self.peakHeap - baseline.peakHeap) / baseline.peakHeap
+
+    def writeSummary(self, stream, maxEntries=10):
+        stream.write("\nPeak heap: %d bytes at time %s (%d snapshots in %s)\n" %
+                     (self.peakHeap, self.peakTime, self.snapshots, self.filename))
+        for bytes, function in self.peakSites[:maxEntries]:
+            stream.write("  %12d  %s\n" % (bytes, function))
+
+    # private stuff
+
+    def __getHeap(self, snapshot):
+        return int(snapshot.get("mem_heap_B", 0)) + int(snapshot.get("mem_heap_extra_B", 0))
+
+    def __closeSnapshot(self, snapshot):
+        heap = self.__getHeap(snapshot)
+        if heap > self.peakHeap:
+            self.peakHeap = heap
+            self.peakTime = snapshot.get("time", 0)
+
+    def __stripAddress(self, function):
+        # '0x4C2B: foo (bar.cpp:12)' -> 'foo (bar.cpp:12)'
+        if function.startswith("0x") and ": " in function:
+            return function.split(": ", 1)[1]
+        return function
+
+class CallgrindProfile:
+    """ Function costs written by callgrind or cachegrind
+
+    Both formats are read: for each function the exclusive (self) cost
+    of every event (e.g. 'Ir') is summed up. Costs of calls (lines
+    following 'calls=') are inclusive costs of the callee and are not
+    counted for the caller.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.events = []
+        self.totals = []
+        # function -> list of costs (one per event)
+        self.costs = {}
+        positions = 1
+        names = {}
+        function = None
+        skipNext = False
+        for line in file(filename):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            first = line[0]
+            if first.isdigit() or first in "+-*":
+                if skipNext:
+                    skipNext = False
+                    continue
+                values = line.split()[positions:]
+                cost = self.costs.setdefault(function, [0] * len(self.events))
+                for ii in range(len(values)):
+                    cost[ii] += int(values[ii])
+            elif line.startswith("calls="):
+                skipNext = True
+            elif line.startswith("fn="):
+                function = self.__getName(names, line[3:])
+            elif line.startswith("cfn="):
+                # defines a compressed name as well
+                self.__getName(names, line[4:])
+            elif line.startswith("events:"):
+                self.events = line.split(":", 1)[1].split()
+            elif line.startswith("positions:"):
+                positions = len(line.split(":", 1)[1].split())
+            elif line.startswith("summary:") or line.startswith("totals:"):
+                self.totals = [int(ii) for ii in line.split(":", 1)[1].split()]
+        if len(self.totals) == 0:
+            self.totals = [0] * len(self.events)
+            for cost in self.costs.values():
+                for ii in range(len(cost)):
+                    self.totals[ii] += cost[ii]
+
+    def getTotal(self, event="Ir"):
+        return self.totals[self.events.index(event)]
+
+    def getTop(self, n=20, event="Ir"):
+        """ Return the n most expensive functions as list of (cost, function)
+        """
+        index = self.events.index(event)
+        top = [(cost[index], function) for function, cost in self.costs.items() if len(cost) > index]
+        top.sort(lambda a, b: cmp(b, a))
+        return top[:n]
+
+    def compare(self, baseline, n=20, event="Ir"):
+        """ Return the relative change of the total cost and a list of
+        (relative change, cost, baseline cost, function) for the top n
+        functions of this profile with respect to baseline (another
+        CallgrindProfile)
+        """
+        index = baseline.events.index(event)
+        changes = []
+        for cost, function in self.getTop(n, event):
+            baselineCost = baseline.costs.get(function, [0] * len(baseline.events))[index]
+            if baselineCost == 0:
+                change = float("inf")
+            else:
+                change = float(cost - baselineCost) / baselineCost
+            changes.append((change, cost, baselineCost, function))
+        total = float(self.getTotal(event) - baseline.getTotal(event)) / max(baseline.getTotal(event), 1)
+        return total, changes
+
+    def writeSummary(self, stream, n=20, event="Ir"):
+        total = self.getTotal(event)
+        stream.write("\nTotal %s: %d (%s)\n" % (event, total, self.filename))
+        for cost, function in self.getTop(n, event):
+            stream.write("  %14d %6.2f%%  %s\n" % (cost, 100.0 * cost / max(total, 1), function))
+
+    # private stuff
+
+    def __getName(self, names, name):
+        # name compression: '(id) name' defines, '(id)' references
+        if name.startswith("("):
+            id, rest = name[1:].split(")", 1)
+            rest = rest.strip()
+            if rest != "":
+                names[id] = rest
+            return names.get(id, name)
+        return name
+
+class ParallelRunner:
+    """ Runs each C++ unit test suite in a valgrind process of its own
+
+    At most 'jobs' valgrind processes run at the same time. A process
+    running longer than 'timeout' seconds (None: no limit) is killed.
+    Each process writes to its own log file in 'logDir'.
+
+    The job slots are taken from the job server of this process (see
+    module JobServer), which the caller configures for parallel jobs.
+
+    The suites to run are either given or listed by calling the
+    executable with 'listArgs' (one suite name per line of output).
+    For each suite the executable is called with 'suiteArgs' where
+    '%(suite)s' is replaced by the suite name.
+
+    run() returns errorExitCode if memcheck found errors in any suite,
+    1 if any suite failed otherwise (or timed out) and 0 if everything
+    was fine. So the exit status means the same as for a single Runner.
+
+    If xml == True, valgrind additionally writes XML files which are
+    merged into self.report (see XMLReport). Given a baseline (a set
+    of signatures, see XMLReport.readBaseline) only findings not in the
+    baseline count as errors.
+    """
+
+    def __init__(self,
+                 executable,
+                 cwd=None,
+                 suites=None,
+                 listArgs=["-t", "--list-tests"],
+                 suiteArgs=["-t", "-v", "-T", "%(suite)s"],
+                 jobs=2,
+                 timeout=None,
+                 logDir="memcheck",
+                 errorExitCode="192",
+                 xml=False,
+                 baseline=None,
+                 **runnerArgs):
+        self.executable = executable
+        self.cwd = cwd
+        self.listArgs = listArgs
+        self.suiteArgs = suiteArgs
+        self.jobs = jobs
+        self.timeout = timeout
+        self.logDir = logDir
+        self.errorExitCode = int(errorExitCode)
+        self.xml = xml or baseline != None
+        self.baseline = baseline
+        self.report = XMLReport()
+        self.runnerArgs = runnerArgs
+        self.runnerArgs["errorExitCode"] = errorExitCode
+        if suites == None:
+            suites = self.listSuites()
+        self.suites = suites
+        # suite -> (returncode, LogSummary), filled by run()
+        self.results = {}
+        self.timedOut = []
+        self.__running = []
+        self.jobServer = pywns.JobServer.getJobServer()
+
+    def listSuites(self):
+        sp = subprocess.Popen([self.executable] + self.listArgs, stdout=subprocess.PIPE, cwd=self.cwd)
+        stdout = sp.communicate()[0]
+        if sp.returncode != 0:
+            raise Exception("Listing the unit test suites by '" + " ".join([self.executable] + self.listArgs) + "' failed")
+        return [line.strip() for line in stdout.splitlines() if line.strip() != ""]
+
+    def run(self):
+        logDir = self.logDir
+        if self.cwd != None:
+            logDir = os.path.join(self.cwd, logDir)
+        if not os.path.exists(logDir):
+            os.makedirs(logDir)
+
+        oldSigIntHandler = signal.getsignal(signal.SIGINT)
+        signal.signal(signal.SIGINT, self.__interrupt)
+        try:
+            queue = self.suites[:]
+            while len(queue) > 0 or len(self.__running) > 0:
+                while len(queue) > 0 and len(self.__running) < self.jobs:
+                    job = self.jobServer.acquire(block=False)
+                    if job == None:
+                        break
+                    self.__start(queue.pop(0), logDir, job)
+                self.__poll()
+                time.sleep(0.2)
+        finally:
+            signal.signal(signal.SIGINT, oldSigIntHandler)
+
+        self.writeReport(sys.stdout)
+        if self.xml:
+            self.report.writeSummary(sys.stdout, self.baseline)
+        return self.getReturnCode()
+
+    def getReturnCode(self):
+        returncodes = [returncode for returncode, summary in self.results.values()]
+        if self.baseline != None:
+            if len(self.report.getNewFindings(self.baseline)) > 0:
+                return self.errorExitCode
+            # known findings only
+            returncodes = [returncode for returncode in returncodes if returncode != self.errorExitCode]
+        elif self.errorExitCode in returncodes:
+            return self.errorExitCode
+        for returncode in returncodes:
+            if returncode != 0:
+                return 1
+        return 0
+
+    def writeReport(self, stream):
+        suites = self.results.keys()
+        suites.sort()
+        stream.write("\nmemcheck results (%d suites):\n" % len(suites))
+        for suite in suites:
+            returncode, summary = self.results[suite]
+            if suite in self.timedOut:
+                status = "TIMEOUT"
+            elif returncode == self.errorExitCode or summary.errors > 0:
+                status = "ERRORS"
+            elif returncode != 0:
+                status = "FAILED"
+            else:
+                status = "OK"
+            stream.write("  %-8s %6d errors %10d bytes definitely lost  %s (%s)\n" %
+                         (status, summary.errors, summary.lost["definitely"], suite, summary.logFile))
+
+    # private stuff
+
+    def __start(self, suite, logDir, job):
+        logFile = os.path.join(os.path.abspath(logDir), self.__getLogName(suite))
+        xmlFile = None
+        if self.xml:
+            xmlFile = os.path.splitext(logFile)[0] + ".xml"
+        runner = Runner(args=[self.executable] + [arg % {"suite" : suite} for arg in self.suiteArgs],
+                        cwd=self.cwd,
+                        logFile=logFile,
+                        xmlFile=xmlFile,
+                        **self.runnerArgs)
+        print "Starting memcheck of " + suite
+        try:
+            sp = runner.start(job)
+        except:
+            self.jobServer.release(job)
+            raise
+        self.__running.append((suite, logFile, sp, time.time(), job))
+
+    def __poll(self):
+        for entry in self.__running[:]:
+            suite, logFile, sp, start, job = entry
+            returncode = sp.poll()
+            if returncode == None and self.timeout != None and time.time() - start > self.timeout:
+                print "Timeout: killing memcheck of " + suite
+                os.kill(sp.pid, signal.SIGKILL)
+                returncode = sp.wait()
+                self.timedOut.append(suite)
+            if returncode != None:
+                self.__running.remove(entry)
+                self.jobServer.release(job)
+                self.results[suite] = (returncode, LogSummary(logFile))
+                if self.xml:
+                    self.report.parse(os.path.splitext(logFile)[0] + ".xml")
+
+    def __interrupt(self, signum, frame):
+        # forward the signal to all running valgrind processes ...
+        for suite, logFile, sp, start, job in self.__running:
+            os.kill(sp.pid, signum)
+        # ... and wait for them to terminate
+        for suite, logFile, sp, start, job in self.__running:
+            sp.wait()
+            self.jobServer.release(job)
+        sys.exit(1)
+
+    def __getLogName(self, suite):
+        return re.sub("[^A-Za-z0-9_.-]", "_", suite) + ".log"
+
 if __name__ == "__main__":
     r = Runner(sys.argv[1:])
     returncode = r.run()
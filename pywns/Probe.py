@@ -1,7 +1,14 @@
 #!/usr/bin/env python
 
 import os
+import re
+import array
+import bisect
+import marshal
+import fnmatch
 import pywns.TableParser
+import pywns.DataFile
+import pywns.Aggregation
 
 class ProbeTypeError(Exception):
     """
@@ -30,6 +37,8 @@ class Probe(object):
         self.__items = self.parseFile(self.absFilename)
 
         self.dirname, self.filenameWithoutDir = os.path.split(self.filename)
+        # x_PDF.dat.gz is the probe x_PDF.dat
+        self.filenameWithoutDir = pywns.DataFile.stripCompressionSuffix(self.filenameWithoutDir)
         if self.dirname == "":
             self.dirname = "./"
 
@@ -74,7 +83,8 @@ class Probe(object):
         the found keys and values
         """
         items = {}
-        for line in file(fileName):
+        f = pywns.DataFile.openDataFile(fileName)
+        for line in f:
             # strip spaces and newlines
             line = line.strip()
             if line.startswith("#"):
@@ -92,6 +102,7 @@ class Probe(object):
             else:
                 # when no "#" is found, we can stop parsing
                 break
+        f.close()
         return items
     parseFile = staticmethod(parseFile)
 
@@ -113,11 +124,19 @@ class Probe(object):
 
     # @staticmethod (this syntax works only for python >= 2.4)
     def readProbes(probeType, probeClass, dirname):
+        """ Read the probes of probeClass with the suffix probeType (or
+        one of the suffixes, if probeType is a list) in dirname
+        """
+        if isinstance(probeType, str):
+            suffixes = [probeType]
+        else:
+            suffixes = probeType
         result = {}
-        for ff in os.listdir(dirname):
+        for ff in pywns.DataFile.listDirectory(dirname):
             filename = os.path.join(dirname, ff)
-            if os.path.isfile(filename):
-                if filename.endswith(probeType):
+            if pywns.DataFile.isFile(filename):
+                name = pywns.DataFile.stripCompressionSuffix(filename)
+                if True in [name.endswith(suffix) for suffix in suffixes]:
                     try:
                         probe = probeClass(filename)
                         result[probe.filenameWithoutDir] = probe
@@ -155,6 +174,43 @@ class PDFHistogramEntry(object):
         self.pdf = float(listOfValues[3])
 
 
+class CumulativeDistribution(object):
+    """ Piecewise linear cdf given at the borders of histogram bins
+
+    x and cdf are arrays of the same length. cdf[0] is the fraction of
+    values below x[0] (underflows), 1 - cdf[-1] the fraction above x[-1]
+    (overflows). Quantiles within the underflows are reported as x[0],
+    those within the overflows as x[-1].
+    """
+
+    def __init__(self, x, cdf):
+        super(CumulativeDistribution, self).__init__()
+        self.x = x
+        self.cdf = cdf
+
+    def getQuantile(self, p):
+        """ The p-quantile (0 <= p <= 1) interpolated linearly between
+        the bin borders
+        """
+        x = self.x
+        cdf = self.cdf
+        if p <= cdf[0]:
+            return x[0]
+        if p > cdf[-1]:
+            return x[-1]
+        ii = bisect.bisect_left(cdf, p)
+        if cdf[ii] == cdf[ii - 1]:
+            return x[ii]
+        return x[ii - 1] + (p - cdf[ii - 1]) / (cdf[ii] - cdf[ii - 1]) * (x[ii] - x[ii - 1])
+
+    def getQuantiles(self, listOfP):
+        return [self.getQuantile(p) for p in listOfP]
+
+    def getPercentile(self, percent):
+        """ e.g. getPercentile(99.9) """
+        return self.getQuantile(percent / 100.0)
+
+
 class PDFProbe(Probe):
 
     fileNameSig = "_PDF.dat"
@@ -182,13 +238,16 @@ class PDFProbe(Probe):
 
         self.__histogram = []
         self.__histogramRead = False
+        self.__distribution = None
 
     def __getHistogram(self):
         if self.__histogramRead == False:
             self.__histogram = []
-            for line in file(self.absFilename):
+            f = pywns.DataFile.openDataFile(self.absFilename)
+            for line in f:
                 if not line.startswith('#'):
                     self.__histogram.append(PDFHistogramEntry(line.split()))
+            f.close()
             self.__histogramRead = True
         return self.__histogram
 
@@ -203,7 +262,7 @@ class PDFProbe(Probe):
         # actually there is one bin more than stated in numberOfBins
         if len(self.histogram) == self.numberOfBins + 3:
             # underflows and overflows
-            return self.histogram[1:self.numberOfBins + 1]
+            return self.histogram[1:self.numberOfBins + 2]
         elif len(self.histogram) == self.numberOfBins + 2:
             # underflows or overflows
             if self.overflows > 0:
@@ -220,6 +279,58 @@ class PDFProbe(Probe):
 
     pureHistogram = property(__getPureHistogram)
 
+    def __getDistribution(self):
+        if self.__distribution == None:
+            pure = self.pureHistogram
+            self.__distribution = CumulativeDistribution(array.array('d', [entry.x for entry in pure]),
+                                                         array.array('d', [entry.cdf for entry in pure]))
+        return self.__distribution
+
+    distribution = property(__getDistribution)
+    """ The cdf of the histogram (see CumulativeDistribution) """
+
+    def getQuantile(self, p):
+        """ Arbitrary quantile (0 <= p <= 1) interpolated from the histogram
+        """
+        return self.distribution.getQuantile(p)
+
+    def getQuantiles(self, listOfP):
+        return self.distribution.getQuantiles(listOfP)
+
+    def getPercentile(self, percent):
+        """ e.g. getPercentile(99.9) """
+        return self.distribution.getPercentile(percent)
+
+    def hasSameBinning(self, other):
+        return (self.minX, self.maxX, self.numberOfBins) == (other.minX, other.maxX, other.numberOfBins)
+
+    # @staticmethod (this syntax works only for python >= 2.4)
+    def merge(probes):
+        """ The distribution of the union of the values of several
+        PDFProbes (e.g. the same delay probe in all cells). All probes
+        must share minX, maxX and numberOfBins.
+        """
+        if len(probes) == 0:
+            raise ValueError("No probes to merge")
+        for probe in probes[1:]:
+            if not probe.hasSameBinning(probes[0]):
+                raise ValueError(probe.filename + " and " + probes[0].filename + " differ in binning")
+        x = probes[0].distribution.x
+        counts = array.array('d', [0.0] * len(x))
+        trials = 0
+        for probe in probes:
+            cdf = probe.distribution.cdf
+            if len(cdf) != len(counts):
+                raise ValueError(probe.filename + " and " + probes[0].filename + " differ in binning")
+            for ii in xrange(len(cdf)):
+                counts[ii] += cdf[ii] * probe.trials
+            trials += probe.trials
+        if trials > 0:
+            for ii in xrange(len(counts)):
+                counts[ii] /= trials
+        return CumulativeDistribution(x, counts)
+    merge = staticmethod(merge)
+
 
 class TimeSeriesProbe(object):
     fileNameSig = "_TimeSeries.dat"
@@ -235,6 +346,8 @@ class TimeSeriesProbe(object):
     def __init__(self, filename):
         self.filename = filename
         self.dirname, self.filenameWithoutDir = os.path.split(self.filename)
+        # x_PDF.dat.gz is the probe x_PDF.dat
+        self.filenameWithoutDir = pywns.DataFile.stripCompressionSuffix(self.filenameWithoutDir)
         if self.dirname == "":
             self.dirname = "./"
 
@@ -244,11 +357,30 @@ class TimeSeriesProbe(object):
         self.altName            = self.filenameWithoutDir.rsplit('_', 1)[0]
         self.name               = items["Name"]
         self.description        = items["Description"]
-        
-        self.entries = []
-        for line in file(self.filename):
-            if not line.startswith('#'):
-                self.entries.append(LogEvalEntry(line.split()))
+
+        self.__entries = None
+        self.__pyramid = None
+
+    def __getEntries(self):
+        # read on first access, preview() does not need the entries
+        if self.__entries == None:
+            self.__entries = []
+            f = pywns.DataFile.openDataFile(self.filename)
+            for line in f:
+                if not line.startswith('#'):
+                    self.__entries.append(LogEvalEntry(line.split()))
+            f.close()
+        return self.__entries
+
+    entries = property(__getEntries)
+
+    def preview(self, resolution = 1000):
+        """ At most 'resolution' buckets summarizing the series (see
+        pywns.Aggregation.PreviewPyramid, kept until the file changes)
+        """
+        if self.__pyramid == None or not self.__pyramid.isUpToDate():
+            self.__pyramid = pywns.Aggregation.PreviewPyramid(self)
+        return self.__pyramid.preview(resolution)
 
     # @staticmethod (this syntax works only for python >= 2.4)
     def readProbes(dirname):
@@ -280,17 +412,18 @@ class LogEvalProbe(Probe):
     def __init__(self, filename):
         super(LogEvalProbe, self).__init__("LogEval", filename)
 
-        splitFilename = filename.split(".")
+        splitFilename = pywns.DataFile.stripCompressionSuffix(filename).split(".")
         splitFilename[-2] += ".log"
         self.filenameEntries = str(".").join(splitFilename)
 
         # In the renovated LogEval Probe, the header and the data are in one and the same file
         # TODO: fileNameEntries can be removed when PDataBase/SortingCriterion are abandoned
-        if not os.path.exists(self.filenameEntries):
+        if not pywns.DataFile.exists(self.filenameEntries):
             self.filenameEntries = filename
 
         self.__entries = []
         self.__entriesRead = False
+        self.__pyramid = None
 
     def __getEntries(self):
         if not self.readAllValues:
@@ -298,22 +431,104 @@ class LogEvalProbe(Probe):
 
         if self.__entriesRead == False:
             self.__entries = []
-            for line in file(self.filenameEntries):
+            f = pywns.DataFile.openDataFile(self.filenameEntries)
+            for line in f:
                 if not line.startswith('#'):
                     self.__entries.append(LogEvalEntry(line.split()))
+            f.close()
             self.__entriesRead = True
 	    
         return self.__entries
 
     entries = property(__getEntries)
 
+    def preview(self, resolution = 1000):
+        """ At most 'resolution' buckets summarizing the entries (see
+        pywns.Aggregation.PreviewPyramid, kept until the file changes)
+        """
+        if self.__pyramid == None or not self.__pyramid.isUpToDate():
+            self.__pyramid = pywns.Aggregation.PreviewPyramid(self)
+        return self.__pyramid.preview(resolution)
+
     # @staticmethod (this syntax works only for python >= 2.4)
     def readProbes(dirname):
         return Probe.readProbes(LogEvalProbe.fileNameSig, LogEvalProbe, dirname)
     readProbes = staticmethod(readProbes)
 
 
-class BatchMeansHistogramEntry:
+class HistogramColumns(object):
+    """ A histogram read column by column
+
+    Every numeric column is an array of doubles (attribute and key of
+    'columns'), where 'not_available' is mapped to NaN. Columns listed
+    in flagNames keep their text and are lists of strings. Columns
+    missing in the file (optional trailing columns) are filled with 0
+    (flags with 'not_available').
+    """
+
+    notAvailable = "not_available"
+    trueFlags = ["yes", "true", "1", "y", "t"]
+
+    def __init__(self, filename, names, flagNames = []):
+        super(HistogramColumns, self).__init__()
+        self.names = names
+        self.columns = {}
+        f = pywns.DataFile.openDataFile(filename)
+        lines = [line for line in f if not line.startswith("#") and line.strip() != ""]
+        f.close()
+        numberOfColumns = 0
+        if len(lines) > 0:
+            numberOfColumns = len(lines[0].split())
+        tokens = "".join(lines).split()
+        for index in xrange(len(names)):
+            name = names[index]
+            if index >= numberOfColumns and name in flagNames:
+                column = [self.notAvailable] * len(lines)
+            elif index >= numberOfColumns:
+                column = array.array('d', [0.0] * len(lines))
+            elif name in flagNames:
+                column = tokens[index::numberOfColumns]
+            else:
+                values = " ".join(tokens[index::numberOfColumns])
+                if self.notAvailable in values:
+                    values = values.replace(self.notAvailable, "nan")
+                column = array.array('d', map(float, values.split()))
+            self.columns[name] = column
+            setattr(self, name, column)
+        self.length = len(lines)
+
+    def __len__(self):
+        return self.length
+
+    def getIndicesExceeding(self, name, limit, notAvailableExceeds = True):
+        """ Indices of the rows with column 'name' > limit. Rows with
+        NaN ('not_available') are included if notAvailableExceeds.
+        """
+        column = self.columns[name]
+        if notAvailableExceeds:
+            return [ii for ii in xrange(self.length) if column[ii] > limit or column[ii] != column[ii]]
+        return [ii for ii in xrange(self.length) if column[ii] > limit]
+
+    def getIndicesBelow(self, name, limit, notAvailableIsBelow = True):
+        """ Indices of the rows with column 'name' < limit (see
+        getIndicesExceeding)
+        """
+        column = self.columns[name]
+        if notAvailableIsBelow:
+            return [ii for ii in xrange(self.length) if column[ii] < limit or column[ii] != column[ii]]
+        return [ii for ii in xrange(self.length) if column[ii] < limit]
+
+    def getIndicesNotFlagged(self, name):
+        """ Indices of the rows where the flag column 'name' is not true
+        (yes/true/1), including those where it is not available
+        """
+        column = self.columns[name]
+        return [ii for ii in xrange(self.length) if column[ii].lower() not in self.trueFlags]
+
+
+class BatchMeansHistogramEntry(object):
+
+    __slots__ = ["x", "cdf", "pdf", "relativeError", "confidence", "numberOfTrialsPerInterval"]
 
     def __init__(self, listOfValues):
         self.x = float(listOfValues[1])
@@ -336,6 +551,7 @@ class BatchMeansProbe(Probe):
                   "relativeErrorMean", "varianceBm", "confidenceOfVarianceAbsolute", "confidenceOfVariancePercent",
                   "relativeErrorVariance", "sigma", "firstOrderCorrelationCoefficient"] + Probe.valueNames
     histogram = None
+    histogramColumnNames = ["cdf", "x", "relativeError", "pdf", "confidence", "numberOfTrialsPerInterval"]
 
     probeType = "BatchMeans"
 
@@ -362,12 +578,39 @@ class BatchMeansProbe(Probe):
         self.sigma                            = self.getValue("sigma")
         self.firstOrderCorrelationCoefficient = self.getValue("1st order correlation coefficient")
 
+        self.__histogram = None
+        self.__histogramColumns = None
+
+    def __getHistogram(self):
         # read x, CDF, PDF, relative error, confidence, number of trials
-        self.histogram = []
-        for line in file(self.absFilename):
-            if not line.startswith("#"):
-                self.histogram.append(BatchMeansHistogramEntry(line.split()))
+        if self.__histogram == None:
+            self.__histogram = []
+            f = pywns.DataFile.openDataFile(self.absFilename)
+            for line in f:
+                if not line.startswith("#"):
+                    self.__histogram.append(BatchMeansHistogramEntry(line.split()))
+            f.close()
+        return self.__histogram
+
+    histogram = property(__getHistogram)
 
+    def __getHistogramColumns(self):
+        if self.__histogramColumns == None:
+            self.__histogramColumns = HistogramColumns(self.absFilename, self.histogramColumnNames)
+        return self.__histogramColumns
+
+    histogramColumns = property(__getHistogramColumns)
+    """ The histogram as HistogramColumns """
+
+    def getIntervalsExceedingRelativeError(self, maximumRelativeError):
+        """ Indices of the intervals with a relative error above the limit
+        """
+        return self.histogramColumns.getIndicesExceeding("relativeError", maximumRelativeError)
+
+    def getIntervalsBelowConfidence(self, confidence):
+        """ Indices of the intervals with a confidence below 'confidence'
+        """
+        return self.histogramColumns.getIndicesBelow("confidence", confidence)
 
     # @staticmethod (this syntax works only for python >= 2.4)
     def readProbes(dirname):
@@ -377,6 +620,10 @@ class BatchMeansProbe(Probe):
 
 class LreHistogramEntry(object):
 
+    __slots__ = ["ordinate", "abscissa", "relativeError", "meanLocalCorrelationCoefficient",
+                 "deviationFromMeanLocalCC", "numberOfTrialsPerInterval",
+                 "numberOfTransitionsPerInterval", "relativeErrorWithinLimit"]
+
     def __init__(self, listOfValues):
         self.ordinate = float(listOfValues[0])
         self.abscissa = float(listOfValues[1])
@@ -400,7 +647,55 @@ class LreHistogramEntry(object):
         self.relativeErrorWithinLimit = listOfValues[7]
 
 
-class LreProbe(Probe):
+class LreHistogram(object):
+    """ The histogram of LRE and DLRE probes, read when first used
+    (base class of LreProbe and DlreProbe)
+    """
+
+    histogramEntryClass = LreHistogramEntry
+    histogramColumnNames = ["ordinate", "abscissa", "relativeError", "meanLocalCorrelationCoefficient",
+                            "deviationFromMeanLocalCC", "numberOfTrialsPerInterval",
+                            "numberOfTransitionsPerInterval", "relativeErrorWithinLimit"]
+
+    # set when first used
+    __histogram = None
+    __histogramColumns = None
+
+    def __getHistogram(self):
+        if self.__histogram == None:
+            self.__histogram = []
+            f = pywns.DataFile.openDataFile(self.absFilename)
+            for line in f:
+                if not line.startswith("#"):
+                    self.__histogram.append(self.histogramEntryClass(line.split()))
+            f.close()
+        return self.__histogram
+
+    histogram = property(__getHistogram)
+
+    def __getHistogramColumns(self):
+        if self.__histogramColumns == None:
+            self.__histogramColumns = HistogramColumns(self.absFilename, self.histogramColumnNames,
+                                                       ["relativeErrorWithinLimit"])
+        return self.__histogramColumns
+
+    histogramColumns = property(__getHistogramColumns)
+    """ The histogram as HistogramColumns ('not_available' is NaN) """
+
+    def getLevelsNotWithinLimit(self):
+        """ Indices of the levels whose relative error is not within the
+        limit (or whose flag is not available)
+        """
+        return self.histogramColumns.getIndicesNotFlagged("relativeErrorWithinLimit")
+
+    def getLevelsExceedingRelativeError(self, maximumRelativeError):
+        """ Indices of the levels with a relative error above the limit
+        (or not available)
+        """
+        return self.histogramColumns.getIndicesExceeding("relativeError", maximumRelativeError)
+
+
+class LreProbe(LreHistogram, Probe):
 
     fileNameSigs = ["_LREF.dat",
                     "_LREF_pf.dat",
@@ -419,8 +714,6 @@ class LreProbe(Probe):
                   "numberOfTransitionsPerIntervalMean", "numberOfTransitionsPerIntervalVariance",
                   "numberOfTransitionsPerIntervalStandardDeviation"] + Probe.valueNames
 
-    histogram = None
-
     probeType = "LRE"
 
     def __init__(self, filename):
@@ -464,28 +757,21 @@ class LreProbe(Probe):
         self.numberOfTransitionsPerIntervalVariance           = self.getValue("Number of transitions per interval (Variance)")
         self.numberOfTransitionsPerIntervalStandardDeviation  = self.getValue("Number of transitions per interval (Standard deviation)")
 
-        self.histogram = []
-        for line in file(self.absFilename):
-            if not line.startswith("#"):
-                self.histogram.append(LreHistogramEntry(line.split()))
-
-
     # @staticmethod (this syntax works only for python >= 2.4)
     def readProbes(dirname):
-        result = {}
-        for suffix in LreProbe.fileNameSigs:
-            result.update(Probe.readProbes(suffix, LreProbe, dirname))
-        return result
+        return Probe.readProbes(LreProbe.fileNameSigs, LreProbe, dirname)
     readProbes = staticmethod(readProbes)
 
 
 class DlreHistogramEntry(LreHistogramEntry):
 
+    __slots__ = []
+
     def __init__(self, listOfValues):
         super(DlreHistogramEntry, self).__init__(listOfValues)
 
 
-class DlreProbe(Probe):
+class DlreProbe(LreHistogram, Probe):
 
     fileNameSigs = ["_DLREF.dat",
                     "_DLREG.dat",
@@ -495,7 +781,7 @@ class DlreProbe(Probe):
                   "intervalSize", "maximumNumberOfSamples", "maximumRelativeErrorPercent",
                   "evaluatedLevels", "underflows", "overflows"] + Probe.valueNames
 
-    histogram = None
+    histogramEntryClass = DlreHistogramEntry
 
     probeType = "DLRE"
 
@@ -513,17 +799,9 @@ class DlreProbe(Probe):
         self.underflows                  = self.getValue("Underflows")
         self.overflows                   = self.getValue("Overflows")
 
-        self.histogram = []
-        for line in file(self.absFilename):
-            if not line.startswith("#"):
-                self.histogram.append(DlreHistogramEntry(line.split()))
-
     # @staticmethod (this syntax works only for python >= 2.4)
     def readProbes(dirname):
-        result = {}
-        for suffix in DlreProbe.fileNameSigs:
-            result.update(Probe.readProbes(suffix, DlreProbe, dirname))
-        return result
+        return Probe.readProbes(DlreProbe.fileNameSigs, DlreProbe, dirname)
     readProbes = staticmethod(readProbes)
 
 
@@ -546,6 +824,8 @@ class TableProbe:
     def __init__(self, filename):
         self.filename = filename
         self.dirname, self.filenameWithoutDir = os.path.split(self.filename)
+        # x_PDF.dat.gz is the probe x_PDF.dat
+        self.filenameWithoutDir = pywns.DataFile.stripCompressionSuffix(self.filenameWithoutDir)
         if self.dirname == "":
             self.dirname = "./"
 
@@ -569,32 +849,248 @@ class TableProbe:
 
     # @staticmethod (this syntax works only for python >= 2.4)
     def readProbes(dirname):
-        result = {}
-        for suffix in TableProbe.fileNameSigs:
-            result.update(Probe.readProbes(suffix, TableProbe, dirname))
-        return result
+        return Probe.readProbes(TableProbe.fileNameSigs, TableProbe, dirname)
     readProbes = staticmethod(readProbes)
 
 def readAllProbes(dirname):
-    result = {}
-    result = PDFProbe.readProbes(dirname)
-    result.update(LogEvalProbe.readProbes(dirname))
-    result.update(TimeSeriesProbe.readProbes(dirname))
-    result.update(MomentsProbe.readProbes(dirname))
-    result.update(TableProbe.readProbes(dirname))
-
     # @todo: update result dict with table probes when simcontrol can handle them
-    return result
+    return ProbeIndex(dirname, readNames = False).load(probeTypes = allProbeTypes)
+
+probeClasses = [MomentsProbe, PDFProbe, LogEvalProbe, TimeSeriesProbe, BatchMeansProbe,
+                LreProbe, DlreProbe, TableProbe]
+
+allProbeTypes = ["Moments", "PDF", "LogEval", "TimeSeries", "Table"]
+""" The probe types read by readAllProbes """
+
+probeClassBySuffix = {}
+for probeClass in probeClasses:
+    for suffix in getattr(probeClass, "fileNameSigs", [getattr(probeClass, "fileNameSig", None)]):
+        probeClassBySuffix[suffix] = probeClass
+del probeClass, suffix
 
 def getProbeType(filename):
     """This function identifies and returns the type of a probe file"""
-    for probeType in [ MomentsProbe, PDFProbe, LogEvalProbe, TimeSeriesProbe ]:
-        if probeType.fileNameSig in filename:
-            return probeType
-
-    for tableSuffix in TableProbe.fileNameSigs:
-        if tableSuffix in filename:
-            return TableProbe
+    # the suffix is "_<type>.dat" or (LRE) "_<type>_pf.dat", only
+    # compression suffixes may follow (caches like "x_Log.dat.preview"
+    # are no probes)
+    name = pywns.DataFile.stripCompressionSuffix(os.path.basename(filename))
+    if name.endswith(".dat"):
+        fields = name[:-len(".dat")].split("_")
+        suffixes = []
+        if len(fields) > 2 and fields[-1] == "pf":
+            suffixes.append("_" + fields[-2] + "_pf.dat")
+        if len(fields) > 1:
+            suffixes.append("_" + fields[-1] + ".dat")
+        for suffix in suffixes:
+            if probeClassBySuffix.has_key(suffix):
+                return probeClassBySuffix[suffix]
 
     # if nothing was found
-    raise TypeError("Could not identify probe type from filename: "+fileName)
+    raise TypeError("Could not identify probe type from filename: "+filename)
+
+
+class ProbeIndexEntry(object):
+    """ A probe file in a ProbeIndex
+    """
+
+    __slots__ = ["filename", "probeClass", "name", "altName", "stamp"]
+
+    def __init__(self, filename, probeClass, name, altName, stamp):
+        self.filename = filename
+        self.probeClass = probeClass
+        self.name = name
+        self.altName = altName
+        self.stamp = stamp
+
+    def __getProbeType(self):
+        return self.probeClass.probeType
+
+    probeType = property(__getProbeType)
+
+    def load(self):
+        return self.probeClass(self.filename)
+
+
+class ProbeIndex(object):
+    """ All probe files of a directory, found in one scan
+
+    Maps every probe file (without directory) to its probe type, the
+    'Name' of the probe (from the header, the altName for table
+    probes) and its altName. Select probes by filename, name, type,
+    glob or regular expression and parse only the selected ones with
+    load().
+
+    If persistent, the index is stored in the directory (.probeIndex)
+    and a file is only read again if its modification time or size
+    changed. readNames = False skips reading the headers (name is
+    None then).
+    """
+
+    indexFilename = ".probeIndex"
+    version = 1
+
+    def __init__(self, dirname, persistent = False, readNames = True):
+        super(ProbeIndex, self).__init__()
+        self.dirname = dirname
+        self.entries = {}
+        self.byName = {}
+        self.byAltName = {}
+        cached = {}
+        if persistent:
+            cached = self.__read()
+        changed = False
+        for stored in pywns.DataFile.listDirectory(dirname):
+            filename = os.path.join(dirname, stored)
+            # compressed probes are listed without the compression suffix
+            ff = pywns.DataFile.stripCompressionSuffix(stored)
+            try:
+                probeClass = getProbeType(ff)
+            except TypeError:
+                continue
+            if not pywns.DataFile.isFile(filename):
+                continue
+            try:
+                stamp = pywns.DataFile.getStamp(filename)
+            except OSError:
+                continue
+            entry = cached.get(ff)
+            if entry == None or entry.stamp != stamp or entry.probeClass != probeClass \
+                   or (readNames and entry.name == None):
+                entry = self.__createEntry(filename, probeClass, stamp, readNames)
+                changed = True
+            self.entries[ff] = entry
+            self.byName.setdefault(entry.name, []).append(ff)
+            self.byAltName.setdefault(entry.altName, []).append(ff)
+        if persistent and (changed or len(cached) != len(self.entries)):
+            self.__write()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, filename):
+        return self.entries.has_key(filename)
+
+    def __getitem__(self, filename):
+        """ The entry of filename (without directory) """
+        return self.entries[filename]
+
+    def getFilenames(self):
+        filenames = self.entries.keys()
+        filenames.sort()
+        return filenames
+
+    def findByName(self, name):
+        """ Filenames of the probes with this 'Name' """
+        return self.byName.get(name, [])
+
+    def findByAltName(self, altName):
+        return self.byAltName.get(altName, [])
+
+    def select(self, pattern = None, regex = None, probeTypes = None, key = "filename"):
+        """ Filenames of the probes matching all given criteria:
+
+        pattern: glob (e.g. '*delay*') on key
+        regex: regular expression (string or compiled) searched in key
+        probeTypes: list of probe types (e.g. ['PDF', 'Moments'])
+        key: 'filename', 'name' or 'altName'
+        """
+        if isinstance(regex, str):
+            regex = re.compile(regex)
+        result = []
+        for filename in self.getFilenames():
+            entry = self.entries[filename]
+            if probeTypes != None and entry.probeType not in probeTypes:
+                continue
+            if key == "filename":
+                value = filename
+            else:
+                value = getattr(entry, key)
+                if value == None:
+                    continue
+            if pattern != None and not fnmatch.fnmatchcase(value, pattern):
+                continue
+            if regex != None and regex.search(value) == None:
+                continue
+            result.append(filename)
+        return result
+
+    def load(self, filenames = None, **selection):
+        """ Parse the probes (all or the given filenames, or those found
+        by select(**selection)). Returns a dict filename -> probe, like
+        readProbes.
+        """
+        if filenames == None:
+            filenames = self.select(**selection)
+        result = {}
+        for filename in filenames:
+            try:
+                probe = self.entries[filename].load()
+                result[probe.filenameWithoutDir] = probe
+            except ProbeTypeError, e:
+                pass
+        return result
+
+    # private stuff
+
+    def __createEntry(self, filename, probeClass, stamp, readNames):
+        filenameWithoutDir = pywns.DataFile.stripCompressionSuffix(os.path.basename(filename))
+        if probeClass in [TimeSeriesProbe, TableProbe]:
+            altName = filenameWithoutDir.rsplit('_', 1)[0]
+        else:
+            altName = os.path.splitext(filenameWithoutDir)[0]
+        name = None
+        if readNames:
+            if probeClass == TableProbe:
+                name = altName
+            else:
+                name = self.__readName(filename)
+        return ProbeIndexEntry(filename, probeClass, name, altName, stamp)
+
+    def __readName(self, filename):
+        name = None
+        f = pywns.DataFile.openDataFile(filename)
+        for line in f:
+            if not line.startswith("#"):
+                break
+            line = line.lstrip("# ")
+            if line.startswith("Name:"):
+                name = line.split(":", 1)[1].strip()
+                break
+        f.close()
+        return name
+
+    def __getIndexFilename(self):
+        return os.path.join(self.dirname, self.indexFilename)
+
+    def __read(self):
+        cached = {}
+        try:
+            f = file(self.__getIndexFilename(), "rb")
+            try:
+                version, items = marshal.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return cached
+        if version != self.version:
+            return cached
+        classes = {}
+        for probeClass in probeClasses:
+            classes[probeClass.__name__] = probeClass
+        for filename, className, name, altName, stamp in items:
+            if classes.has_key(className):
+                cached[filename] = ProbeIndexEntry(os.path.join(self.dirname, filename),
+                                                   classes[className], name, altName, tuple(stamp))
+        return cached
+
+    def __write(self):
+        items = [(filename, entry.probeClass.__name__, entry.name, entry.altName, entry.stamp)
+                 for filename, entry in self.entries.items()]
+        try:
+            f = file(self.__getIndexFilename(), "wb")
+            try:
+                marshal.dump((self.version, items), f)
+            finally:
+                f.close()
+        except (IOError, OSError):
+            pass
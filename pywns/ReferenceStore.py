@@ -0,0 +1,502 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Content addressed store for reference outputs
+
+Many reference outputs ('referenceOutput_<config>') contain identical
+probe files. A ReferenceStore keeps each distinct file once, as a blob
+named by the SHA-1 of its content ('<store>/objects/ab/cdef...').
+
+A reference directory is described by a manifest
+('referenceOutput_<config>.manifest' next to it) listing the path,
+size and digest of each file. The directory itself may then be
+removed: the readers of module DataFile follow the manifest to the
+blobs. Or it is materialized from the manifest by hardlinking the
+blobs (files are copied if the store is on another filesystem). Blobs
+are read-only, so hardlinked reference files must not be edited in
+place (write a new manifest instead, see checkIn).
+
+The store used for a directory is '.referenceStore' in the root of the
+SDK containing the directory (see MemCheck.searchPathToSDK) or
+'~/.openwns/referenceStore' outside of an SDK.
+
+Usage:
+
+  python pywns/ReferenceStore.py checkin [--remove] <dir> ...
+  python pywns/ReferenceStore.py checkout <dir> ...
+"""
+
+import os
+import sys
+import stat
+import errno
+import shutil
+import fnmatch
+import threading
+
+try:
+    import hashlib
+    newDigest = hashlib.sha1
+except ImportError:
+    # python < 2.5
+    import sha
+    newDigest = sha.new
+
+manifestSuffix = ".manifest"
+
+storeDirname = ".referenceStore"
+
+defaultStorePath = os.path.join("~", ".openwns", "referenceStore")
+
+ignoredPatterns = [".probeIndex", "*.preview", "*.tmp"]
+""" caches (see Probe.ProbeIndex and Aggregation.PreviewPyramid) that
+are not stored """
+
+def getDigest(filename, blockSize = 1 << 20):
+    """ SHA-1 (hex) of the content of filename """
+    digest = newDigest()
+    f = file(filename, "rb")
+    try:
+        block = f.read(blockSize)
+        while block:
+            digest.update(block)
+            block = f.read(blockSize)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+def getManifestFilename(dirname):
+    return os.path.normpath(dirname) + manifestSuffix
+
+def hasManifest(dirname):
+    return os.path.isfile(getManifestFilename(dirname))
+
+
+class Manifest(object):
+    """ The files of a reference directory: path (relative, separated
+    by '/') -> (digest, size)
+    """
+
+    def __init__(self):
+        super(Manifest, self).__init__()
+        self.entries = {}
+
+    def add(self, path, digest, size):
+        self.entries[path] = (digest, size)
+
+    def getDigest(self, path):
+        """ The digest of path (None if there is no such file) """
+        entry = self.entries.get(path)
+        if entry == None:
+            return None
+        return entry[0]
+
+    def listDirectory(self, path):
+        """ Names of the files and directories in directory path """
+        directory = ""
+        if path != "":
+            directory = path.rstrip("/") + "/"
+        names = {}
+        for name in self.entries.keys():
+            if name.startswith(directory):
+                names[name[len(directory):].split("/", 1)[0]] = None
+        result = names.keys()
+        result.sort()
+        return result
+
+    def write(self, filename):
+        """ Write the manifest (replaces an existing one atomically) """
+        paths = self.entries.keys()
+        paths.sort()
+        tmpFilename = filename + ".tmp"
+        f = file(tmpFilename, "w")
+        try:
+            f.write("# sha1\tsize\tpath\n")
+            for path in paths:
+                digest, size = self.entries[path]
+                f.write("%s\t%d\t%s\n" % (digest, size, path))
+        finally:
+            f.close()
+        os.rename(tmpFilename, filename)
+
+    # @staticmethod (this syntax works only for python >= 2.4)
+    def read(filename):
+        manifest = Manifest()
+        for line in file(filename):
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t", 2)
+            if len(fields) == 3:
+                manifest.add(fields[2], fields[0], int(fields[1]))
+        return manifest
+    read = staticmethod(read)
+
+
+class ReferenceStore(object):
+    """ Blobs (files named by the digest of their content) below root
+    """
+
+    def __init__(self, root):
+        super(ReferenceStore, self).__init__()
+        self.root = os.path.abspath(os.path.expanduser(root))
+
+    def getBlobFilename(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def hasBlob(self, digest):
+        return os.path.isfile(self.getBlobFilename(digest))
+
+    def addFile(self, filename):
+        """ Store the content of filename (if not stored, yet) and
+        return its digest. The file is copied, not linked: it may still
+        be overwritten (e.g. by the next simulation).
+        """
+        digest = getDigest(filename)
+        blobFilename = self.getBlobFilename(digest)
+        if not os.path.isfile(blobFilename):
+            makeDirectories(os.path.dirname(blobFilename))
+            tmpFilename = "%s.%d.%d.tmp" % (blobFilename, os.getpid(), id(threading.currentThread()))
+            shutil.copyfile(filename, tmpFilename)
+            os.chmod(tmpFilename, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.rename(tmpFilename, blobFilename)
+        return digest
+
+    def checkIn(self, dirname, remove = False):
+        """ Add the files below dirname to the store and write the
+        manifest of dirname. If remove == True the directory is removed
+        afterwards (the readers of module DataFile follow the
+        manifest). Returns the Manifest.
+        """
+        manifest = Manifest()
+        for path in listFiles(dirname):
+            filename = os.path.join(dirname, *path.split("/"))
+            manifest.add(path, self.addFile(filename), os.path.getsize(filename))
+        manifest.write(getManifestFilename(dirname))
+        if remove:
+            shutil.rmtree(dirname)
+        return manifest
+
+    def materialize(self, manifest, dirname):
+        """ Create dirname with the files of manifest by hardlinking
+        (or copying) the blobs. dirname is only created (or replaced,
+        see swapDirectory) once all files are there.
+        """
+        missing = self.getMissingBlobs(manifest)
+        if len(missing) > 0:
+            raise IOError("Blobs missing in " + self.root + ": " + ", ".join(missing))
+        tmpDirname = os.path.normpath(dirname) + ".tmp"
+        if os.path.exists(tmpDirname):
+            shutil.rmtree(tmpDirname)
+        for path, (digest, size) in manifest.entries.items():
+            filename = os.path.join(tmpDirname, *path.split("/"))
+            makeDirectories(os.path.dirname(filename))
+            linkOrCopy(self.getBlobFilename(digest), filename)
+        makeDirectories(tmpDirname)
+        swapDirectory(tmpDirname, dirname)
+
+    def checkOut(self, dirname):
+        """ Materialize dirname from its manifest """
+        self.materialize(Manifest.read(getManifestFilename(dirname)), dirname)
+
+    def getMissingBlobs(self, manifest):
+        """ Paths of manifest whose blob is not in the store """
+        missing = [path for path, (digest, size) in manifest.entries.items() if not self.hasBlob(digest)]
+        missing.sort()
+        return missing
+
+
+def findStore(dirname):
+    """ The ReferenceStore for dirname (see module documentation) """
+    import pywns.MemCheck
+    parent = os.path.dirname(os.path.abspath(dirname))
+    while not os.path.isdir(parent):
+        parent = os.path.dirname(parent)
+    sdk = pywns.MemCheck.searchPathToSDK(parent)
+    if sdk != None:
+        return ReferenceStore(os.path.join(sdk, storeDirname))
+    return ReferenceStore(defaultStorePath)
+
+def copy(source, target, materialize = True):
+    """ Make target a reference copy of source: the files of source are
+    added to the store, the manifest of target is written and target is
+    materialized from it (if materialize == True)
+    """
+    store = findStore(target)
+    manifest = Manifest()
+    for path in listFiles(source):
+        filename = os.path.join(source, *path.split("/"))
+        manifest.add(path, store.addFile(filename), os.path.getsize(filename))
+    manifest.write(getManifestFilename(target))
+    if materialize:
+        store.materialize(manifest, target)
+    return manifest
+
+class Promotion(object):
+    """ Differences between a reference directory and the output
+    promoted to it (see promote)
+
+    files: number of files of the new reference
+    added, removed, changed: paths of the files
+    maxChange: (relative change, path, value name) of the statistic
+    (see Probe.valueNames) of the changed probes that changed most, or
+    None
+
+    error: None, or why the promotion failed (see promoteAll)
+    """
+
+    def __init__(self, source, target):
+        super(Promotion, self).__init__()
+        self.source = source
+        self.target = target
+        self.files = 0
+        self.added = []
+        self.removed = []
+        self.changed = []
+        self.maxChange = None
+        self.error = None
+
+    def isUnchanged(self):
+        return len(self.added) == 0 and len(self.removed) == 0 and len(self.changed) == 0
+
+    def getSummary(self):
+        """ One line describing the differences """
+        if self.error != None:
+            return "failed: " + self.error
+        if self.isUnchanged():
+            return "unchanged (%d files)" % self.files
+        summary = "%d files, %d changed, %d added, %d removed" % \
+                  (self.files, len(self.changed), len(self.added), len(self.removed))
+        if self.maxChange != None:
+            summary += ", max change %.1e (%s %s)" % self.maxChange
+        return summary
+
+
+def promote(source, target, dryRun = False):
+    """ Make the output directory source the new reference target and
+    return the Promotion describing the differences.
+
+    The files of source are added to the store. The manifest of target
+    is replaced atomically, a target directory is rematerialized and
+    swapped in (if target was a directory or did not exist). Only
+    files whose digest changed are parsed to compare the statistics of
+    the probes. If dryRun == True, only the differences are computed.
+    """
+    if not os.path.isdir(source):
+        raise IOError("No such directory: " + source)
+    store = findStore(target)
+    promotion = Promotion(source, target)
+    old = getCurrentManifest(target)
+    new = Manifest()
+    for path in listFiles(source):
+        filename = os.path.join(source, *path.split("/"))
+        if dryRun:
+            digest = getDigest(filename)
+        else:
+            digest = store.addFile(filename)
+        new.add(path, digest, os.path.getsize(filename))
+    promotion.files = len(new.entries)
+    for path in new.entries.keys():
+        if not old.entries.has_key(path):
+            promotion.added.append(path)
+        elif old.getDigest(path) != new.getDigest(path):
+            promotion.changed.append(path)
+    promotion.removed = [path for path in old.entries.keys() if not new.entries.has_key(path)]
+    for paths in [promotion.added, promotion.changed, promotion.removed]:
+        paths.sort()
+    promotion.maxChange = getMaxChange(target, source, promotion.changed)
+    if not dryRun and not promotion.isUnchanged():
+        materialize = os.path.isdir(target) or not hasManifest(target)
+        new.write(getManifestFilename(target))
+        if materialize:
+            store.materialize(new, target)
+    return promotion
+
+def promoteAll(pairs, threads = 4, dryRun = False):
+    """ Promote each (source, target) of pairs (see promote), threads
+    at the same time. Returns the Promotions in the order of pairs, a
+    failed promotion has its error set.
+    """
+    import pywns.Executor
+    def promoteOrFail(pair):
+        source, target = pair
+        try:
+            return promote(source, target, dryRun)
+        except Exception, e:
+            promotion = Promotion(source, target)
+            promotion.error = str(e)
+            return promotion
+    return pywns.Executor.runConcurrently(promoteOrFail, pairs, threads)
+
+def rebaseline(entries, threads = 4, dryRun = False, stream = sys.stdout):
+    """ Promote each (name, source, target) of entries (see promoteAll)
+    and write the summary of each promotion and the number of changed
+    references to stream. Returns the number of failed promotions.
+    """
+    promotions = promoteAll([(source, target) for name, source, target in entries], threads, dryRun)
+    failed = 0
+    changed = 0
+    for (name, source, target), promotion in zip(entries, promotions):
+        stream.write(name + ": " + promotion.getSummary() + "\n")
+        if promotion.error != None:
+            failed += 1
+        elif not promotion.isUnchanged():
+            changed += 1
+    if dryRun:
+        stream.write("%d of %d references would change\n" % (changed, len(promotions)))
+    else:
+        stream.write("%d of %d references changed\n" % (changed, len(promotions)))
+    return failed
+
+def getCurrentManifest(dirname):
+    """ The manifest of dirname: read if there is one and dirname is
+    not a directory, otherwise computed from the files of dirname
+    (empty if neither exists)
+    """
+    if not os.path.isdir(dirname):
+        if hasManifest(dirname):
+            return Manifest.read(getManifestFilename(dirname))
+        return Manifest()
+    manifest = Manifest()
+    for path in listFiles(dirname):
+        filename = os.path.join(dirname, *path.split("/"))
+        manifest.add(path, getDigest(filename), os.path.getsize(filename))
+    return manifest
+
+def getMaxChange(reference, actual, paths):
+    """ (relative change, path, value name) of the statistic that
+    changed most among the probes in paths (None if no probe changed)
+    """
+    import pywns.DataFile
+    import pywns.Probe
+    filenames = [pywns.DataFile.stripCompressionSuffix(path) for path in paths if "/" not in path]
+    if len(filenames) == 0:
+        return None
+    referenceIndex = pywns.Probe.ProbeIndex(reference, readNames = False)
+    actualIndex = pywns.Probe.ProbeIndex(actual, readNames = False)
+    filenames = [ii for ii in filenames if ii in referenceIndex and ii in actualIndex]
+    referenceProbes = referenceIndex.load(filenames)
+    actualProbes = actualIndex.load(filenames)
+    maxChange = None
+    for filename in filenames:
+        if not referenceProbes.has_key(filename) or not actualProbes.has_key(filename):
+            continue
+        referenceProbe = referenceProbes[filename]
+        actualProbe = actualProbes[filename]
+        for valueName in referenceProbe.valueNames:
+            change = getRelativeChange(getattr(referenceProbe, valueName, None),
+                                       getattr(actualProbe, valueName, None))
+            if change != None and (maxChange == None or change > maxChange[0]):
+                maxChange = (change, filename, valueName)
+    return maxChange
+
+def getRelativeChange(reference, actual):
+    """ |actual - reference| / |reference| for numbers (None otherwise)
+    """
+    if not isinstance(reference, (int, long, float)) or not isinstance(actual, (int, long, float)):
+        return None
+    if reference == actual or (reference != reference and actual != actual):
+        return 0.0
+    if reference == 0:
+        return float("inf")
+    return abs(actual - reference) / abs(float(reference))
+
+def swapDirectory(new, dirname):
+    """ Replace dirname by the directory new. Both are renames on the
+    same filesystem, so dirname is always either complete old or
+    complete new (it is only missing between the two renames).
+    """
+    if not os.path.exists(dirname):
+        os.rename(new, dirname)
+        return
+    old = os.path.normpath(dirname) + ".old"
+    if os.path.exists(old):
+        shutil.rmtree(old)
+    os.rename(dirname, old)
+    os.rename(new, dirname)
+    shutil.rmtree(old)
+
+def listFiles(dirname):
+    """ Paths (relative, separated by '/') of all files below dirname """
+    result = []
+    for root, dirs, files in os.walk(dirname):
+        relative = root[len(dirname):].strip(os.sep).replace(os.sep, "/")
+        for name in files:
+            if isIgnored(name):
+                continue
+            if relative == "":
+                result.append(name)
+            else:
+                result.append(relative + "/" + name)
+    result.sort()
+    return result
+
+def isIgnored(name):
+    for pattern in ignoredPatterns:
+        if fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+def makeDirectories(dirname):
+    try:
+        os.makedirs(dirname)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+def linkOrCopy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        # other filesystem (or no hardlinks supported)
+        shutil.copyfile(source, target)
+
+def main(args):
+    usage = "Usage: ReferenceStore.py checkin [--remove] <dir> ...\n" \
+            "       ReferenceStore.py checkout <dir> ...\n"
+    if len(args) >= 2 and args[0] == "checkin":
+        remove = False
+        dirnames = args[1:]
+        if dirnames[0] == "--remove":
+            remove = True
+            dirnames = dirnames[1:]
+        for dirname in dirnames:
+            store = findStore(dirname)
+            manifest = store.checkIn(dirname, remove)
+            print "%s: %d files stored in %s" % (dirname, len(manifest.entries), store.root)
+        return 0
+    if len(args) >= 2 and args[0] == "checkout":
+        for dirname in args[1:]:
+            if os.path.exists(dirname):
+                print "Error! " + dirname + " exists. Giving up"
+                return 1
+            findStore(dirname).checkOut(dirname)
+        return 0
+    sys.stderr.write(usage)
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,352 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Pool the statistics of replicated simulations
+
+Replications are runs of the same configuration with different seeds,
+each writing an output directory. Every probe file carries the number
+of trials and the sums of all values, their squares and their cubes in
+its header. These sums add up over the replications, so the exact
+mean, variance and skewness of all values of all replications follow
+from the headers alone (the values themselves, e.g. LogEval data, are
+not read). PDFs with identical binning are merged by PDFProbe.merge.
+
+The confidence intervals follow the method of independent
+replications: each replication contributes one observation of the
+statistic, the half width is the Student t quantile times the standard
+error of these observations. At least two replications are needed.
+
+Example:
+
+  import pywns.Replication
+
+  replications = pywns.Replication.load("seed=*/output", "*delay*_Moments.dat")
+  for filename in replications.getFilenames():
+      moments = replications.getMoments(filename)
+      print filename, moments.mean, moments.meanConfidenceInterval
+"""
+
+import math
+import array
+import glob
+
+import pywns.Probe
+import pywns.Executor
+
+defaultConfidence = 0.95
+
+def getMoments(trials, sumOfAllValues, sumOfAllValuesSquare, sumOfAllValuesCubic):
+    """ (mean, variance, skewness) from the sums of the values. The
+    variance is the unbiased estimate (divided by trials - 1), the
+    skewness the third central moment divided by the second to the
+    power of 1.5. Undefined values are None.
+    """
+    if trials == 0:
+        return (None, None, None)
+    mean = sumOfAllValues / float(trials)
+    # central moments
+    moment2 = max(0.0, sumOfAllValuesSquare / float(trials) - mean * mean)
+    moment3 = sumOfAllValuesCubic / float(trials) - 3.0 * mean * sumOfAllValuesSquare / float(trials) \
+              + 2.0 * mean * mean * mean
+    variance = None
+    if trials > 1:
+        variance = moment2 * trials / float(trials - 1)
+    skewness = None
+    if moment2 > 0.0:
+        skewness = moment3 / math.pow(moment2, 1.5)
+    return (mean, variance, skewness)
+
+def logGamma(x):
+    """ ln(Gamma(x)) for x > 0 (Lanczos approximation) """
+    coefficients = [76.18009172947146, -86.50532032941677, 24.01409824083091,
+                    -1.231739572450155, 0.1208650973866179e-2, -0.5395239384953e-5]
+    tmp = x + 5.5
+    tmp -= (x + 0.5) * math.log(tmp)
+    series = 1.000000000190015
+    y = x
+    for coefficient in coefficients:
+        y += 1.0
+        series += coefficient / y
+    return -tmp + math.log(2.5066282746310005 * series / x)
+
+def incompleteBeta(a, b, x):
+    """ The regularized incomplete beta function I_x(a, b) """
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(logGamma(a + b) - logGamma(a) - logGamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    # the continued fraction converges fast for x < (a + 1) / (a + b + 2)
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * betaContinuedFraction(a, b, x) / a
+    return 1.0 - front * betaContinuedFraction(b, a, 1.0 - x) / b
+
+def betaContinuedFraction(a, b, x, maxIterations = 200, epsilon = 3e-16):
+    # modified Lentz's method
+    tiny = 1e-300
+    c = 1.0
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    if abs(d) < tiny:
+        d = tiny
+    d = 1.0 / d
+    result = d
+    for m in xrange(1, maxIterations + 1):
+        m2 = 2 * m
+        for numerator in [m * (b - m) * x / ((a + m2 - 1.0) * (a + m2)),
+                          -(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1.0))]:
+            d = 1.0 + numerator * d
+            if abs(d) < tiny:
+                d = tiny
+            c = 1.0 + numerator / c
+            if abs(c) < tiny:
+                c = tiny
+            d = 1.0 / d
+            delta = d * c
+            result *= delta
+        if abs(delta - 1.0) < epsilon:
+            break
+    return result
+
+def studentTDistribution(t, degreesOfFreedom):
+    """ P(T <= t) of the Student t distribution (degreesOfFreedom need
+    not be an integer)
+    """
+    tail = 0.5 * incompleteBeta(0.5 * degreesOfFreedom, 0.5,
+                                degreesOfFreedom / (degreesOfFreedom + t * t))
+    if t > 0:
+        return 1.0 - tail
+    return tail
+
+def studentTQuantile(p, degreesOfFreedom):
+    """ t with P(T <= t) = p (0 < p < 1) """
+    if p == 0.5:
+        return 0.0
+    if p < 0.5:
+        return -studentTQuantile(1.0 - p, degreesOfFreedom)
+    lower = 0.0
+    upper = 1.0
+    while studentTDistribution(upper, degreesOfFreedom) < p:
+        lower = upper
+        upper *= 2.0
+    for ii in xrange(100):
+        middle = 0.5 * (lower + upper)
+        if studentTDistribution(middle, degreesOfFreedom) < p:
+            lower = middle
+        else:
+            upper = middle
+        if upper - lower < 1e-12 * upper:
+            break
+    return 0.5 * (lower + upper)
+
+def getConfidenceInterval(center, observations, confidence = defaultConfidence):
+    """ (lower, upper) around center with the half width given by the
+    standard error of observations (one per replication). None for
+    less than two observations.
+    """
+    observations = [ii for ii in observations if ii != None]
+    count = len(observations)
+    if center == None or count < 2:
+        return None
+    mean = sum(observations) / float(count)
+    variance = sum([(ii - mean) * (ii - mean) for ii in observations]) / float(count - 1)
+    halfWidth = studentTQuantile(0.5 + 0.5 * confidence, count - 1) * math.sqrt(variance / count)
+    return (center - halfWidth, center + halfWidth)
+
+
+def welchTest(reference, actual):
+    """ Welch's t test of equal means of two samples (e.g. the means of
+    the replications, see PooledMoments.replicationMeans) with unequal
+    variances. Returns (t, degrees of freedom, two sided p-value). Both
+    samples need at least two values. If both have no variance, p is 1
+    for equal means and 0 otherwise.
+    """
+    reference = [ii for ii in reference if ii == ii]
+    actual = [ii for ii in actual if ii == ii]
+    if len(reference) < 2 or len(actual) < 2:
+        raise ValueError("Welch test needs at least two values per sample")
+    means = []
+    errors = []
+    for sample in [reference, actual]:
+        mean = sum(sample) / float(len(sample))
+        variance = sum([(ii - mean) * (ii - mean) for ii in sample]) / float(len(sample) - 1)
+        means.append(mean)
+        # squared standard error
+        errors.append(variance / len(sample))
+    difference = means[1] - means[0]
+    if errors[0] + errors[1] == 0.0:
+        if difference == 0.0:
+            return (0.0, float(len(reference) + len(actual) - 2), 1.0)
+        return (difference * float("inf"), float(len(reference) + len(actual) - 2), 0.0)
+    t = difference / math.sqrt(errors[0] + errors[1])
+    degreesOfFreedom = (errors[0] + errors[1]) ** 2 / \
+                       (errors[0] ** 2 / (len(reference) - 1) + errors[1] ** 2 / (len(actual) - 1))
+    pValue = 2.0 * studentTDistribution(-abs(t), degreesOfFreedom)
+    return (t, degreesOfFreedom, pValue)
+
+
+class PooledMoments(object):
+    """ The statistics of the union of the values of the same probe in
+    several replications
+
+    trials, sumOfAllValues, sumOfAllValuesSquare, sumOfAllValuesCubic:
+    the pooled sums; mean, variance, standardDeviation, skewness,
+    minimum, maximum: exact statistics of all values
+
+    replicationMeans, replicationVariances, replicationSkewnesses: the
+    statistics of each replication (arrays, in the order of probes;
+    NaN if undefined)
+
+    meanConfidenceInterval, varianceConfidenceInterval,
+    skewnessConfidenceInterval: (lower, upper) at the given confidence
+    level or None (see getConfidenceInterval)
+    """
+
+    def __init__(self, probes, confidence = defaultConfidence):
+        super(PooledMoments, self).__init__()
+        if len(probes) == 0:
+            raise ValueError("No probes to pool")
+        self.replications = len(probes)
+        self.confidence = confidence
+        trials = array.array('d', [probe.trials for probe in probes])
+        sums = array.array('d', [probe.sumOfAllValues for probe in probes])
+        squares = array.array('d', [probe.sumOfAllValuesSquare for probe in probes])
+        cubes = array.array('d', [probe.sumOfAllValuesCubic for probe in probes])
+
+        self.trials = int(sum(trials))
+        self.sumOfAllValues = sum(sums)
+        self.sumOfAllValuesSquare = sum(squares)
+        self.sumOfAllValuesCubic = sum(cubes)
+        self.mean, self.variance, self.skewness = getMoments(self.trials, self.sumOfAllValues,
+                                                             self.sumOfAllValuesSquare,
+                                                             self.sumOfAllValuesCubic)
+        self.standardDeviation = None
+        if self.variance != None:
+            self.standardDeviation = math.sqrt(self.variance)
+        measured = [probe for probe in probes if probe.trials > 0]
+        self.minimum = None
+        self.maximum = None
+        if len(measured) > 0:
+            self.minimum = min([probe.minimum for probe in measured])
+            self.maximum = max([probe.maximum for probe in measured])
+
+        nan = float("nan")
+        self.replicationMeans = array.array('d')
+        self.replicationVariances = array.array('d')
+        self.replicationSkewnesses = array.array('d')
+        for ii in xrange(self.replications):
+            moments = getMoments(trials[ii], sums[ii], squares[ii], cubes[ii])
+            for values, value in zip([self.replicationMeans, self.replicationVariances,
+                                      self.replicationSkewnesses], moments):
+                if value == None:
+                    value = nan
+                values.append(value)
+
+        self.meanConfidenceInterval = self.__getInterval(self.mean, self.replicationMeans)
+        self.varianceConfidenceInterval = self.__getInterval(self.variance, self.replicationVariances)
+        self.skewnessConfidenceInterval = self.__getInterval(self.skewness, self.replicationSkewnesses)
+
+    # private stuff
+
+    def __getInterval(self, center, values):
+        # NaN != NaN
+        return getConfidenceInterval(center, [ii for ii in values if ii == ii], self.confidence)
+
+
+class ReplicationSet(object):
+    """ The same probes read from the output directories of several
+    replications
+
+    directories: list of directories or a glob (e.g. 'seed=*/output')
+
+    pattern, key, probeTypes: select the probes (see
+    Probe.ProbeIndex.select)
+
+    threads: number of directories read at the same time
+    """
+
+    def __init__(self, directories, pattern = "*", key = "filename", probeTypes = None,
+                 threads = 8, confidence = defaultConfidence):
+        super(ReplicationSet, self).__init__()
+        if isinstance(directories, str):
+            directories = glob.glob(directories)
+            directories.sort()
+        self.directories = directories
+        self.pattern = pattern
+        self.key = key
+        self.probeTypes = probeTypes
+        self.threads = threads
+        self.confidence = confidence
+        # filename -> list of probes (in the order of the directories)
+        self.probes = {}
+        self.errors = {}
+
+    def load(self):
+        """ Read the probes. Directories that could not be read are
+        skipped and listed in self.errors (directory -> exception).
+        """
+        self.errors = {}
+        results = pywns.Executor.runConcurrently(self.__readDirectory, self.directories, self.threads)
+
+        self.probes = {}
+        for result in results:
+            if result != None:
+                for filename, probe in result.items():
+                    self.probes.setdefault(filename, []).append(probe)
+        return self
+
+    def getFilenames(self):
+        filenames = self.probes.keys()
+        filenames.sort()
+        return filenames
+
+    def getMoments(self, filename):
+        """ The PooledMoments of probe filename """
+        return PooledMoments(self.probes[filename], self.confidence)
+
+    def getDistribution(self, filename):
+        """ The merged distribution (see PDFProbe.merge) of PDF probe
+        filename
+        """
+        return pywns.Probe.PDFProbe.merge(self.probes[filename])
+
+    # private stuff
+
+    def __readDirectory(self, dirname):
+        try:
+            probeIndex = pywns.Probe.ProbeIndex(dirname, readNames = (self.key == "name"))
+            return probeIndex.load(pattern = self.pattern, key = self.key,
+                                   probeTypes = self.probeTypes)
+        except Exception, e:
+            self.errors[dirname] = e
+            return None
+
+
+def load(directories, pattern = "*", **setArgs):
+    """ Read the probes matching pattern from the directories of the
+    replications (see ReplicationSet)
+    """
+    return ReplicationSet(directories, pattern, **setArgs).load()
@@ -25,6 +25,8 @@
 #
 ###############################################################################
 
+import pywns.DataFile
+
 class TableParser:
     fileName = None
     header = None
@@ -57,7 +59,7 @@ class TableParser:
             self.minimum = 0
             self.trials = 0
             firstLine = True
-            infile = file(self.fileName)
+            infile = pywns.DataFile.openDataFile(self.fileName)
             for line in infile:
                 if line.startswith("%"):
                     self.header += line
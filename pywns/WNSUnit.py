@@ -89,8 +89,20 @@ import time
 import datetime
 import shutil
 import subprocess
-import time
-import Probe
+import marshal
+import imp
+import fnmatch
+import cPickle
+import xml.sax.saxutils
+import signal
+import threading
+import collections
+import pywns.Probe
+import pywns.Launcher
+import pywns.JobServer
+import pywns.DataFile
+import pywns.ReferenceStore
+import pywns.Replication
 
 class Output(object):
     def __init__(self):
@@ -111,9 +123,114 @@ verbosity = 2
 output = Output()
 
 
+class RingBuffer(object):
+    """ Keeps only the last maxLines lines written to it
+    """
+
+    def __init__(self, maxLines = 200):
+        super(RingBuffer, self).__init__()
+        self.maxLines = maxLines
+        self.lines = collections.deque()
+        self.dropped = 0
+
+    def append(self, line):
+        self.lines.append(line)
+        if len(self.lines) > self.maxLines:
+            self.lines.popleft()
+            self.dropped += 1
+
+    def getvalue(self):
+        text = ""
+        if self.dropped > 0:
+            text += "[... " + str(self.dropped) + " lines dropped ...]\n"
+        return text + "".join(self.lines)
+
+
+class TextTestResult(unittest._TextTestResult):
+    """ Requests to stop the test run as soon as maxFailures tests
+    failed (or had errors). maxFailures == None means never stop.
+
+    The duration of each test is recorded in self.testTimings as a list
+    of (suite, description, seconds, outcome, message) tuples. suite is
+    the SystemTestSuite the test belongs to (or None), outcome is
+    'success', 'failure' or 'error' and message the traceback of a
+    failure or error.
+    """
+
+    maxFailures = None
+
+    def __init__(self, *args, **kwds):
+        unittest._TextTestResult.__init__(self, *args, **kwds)
+        self.testTimings = []
+        self.__start = None
+        self.__counts = (0, 0)
+
+    def startTest(self, test):
+        unittest._TextTestResult.startTest(self, test)
+        self.__counts = (len(self.errors), len(self.failures))
+        self.__start = time.time()
+
+    def stopTest(self, test):
+        seconds = time.time() - self.__start
+        unittest._TextTestResult.stopTest(self, test)
+        outcome = "success"
+        message = ""
+        if len(self.errors) > self.__counts[0]:
+            outcome = "error"
+            message = self.errors[-1][1]
+        elif len(self.failures) > self.__counts[1]:
+            outcome = "failure"
+            message = self.failures[-1][1]
+        description = test.shortDescription()
+        if description == None:
+            description = str(test)
+        self.testTimings.append((getattr(test, "systemTestSuite", None), description,
+                                 seconds, outcome, message))
+
+    def addError(self, *args, **kwds):
+        unittest._TextTestResult.addError(self, *args, **kwds)
+        self.__checkFailures()
+
+    def addFailure(self, *args, **kwds):
+        unittest._TextTestResult.addFailure(self, *args, **kwds)
+        self.__checkFailures()
+
+    # private stuff
+
+    def __checkFailures(self):
+        if self.maxFailures != None and len(self.errors) + len(self.failures) >= self.maxFailures:
+            self.shouldStop = True
+
+
+def raiseKeyboardInterrupt(signum, frame):
+    """ Signal handler to abort a test run (and the simulations
+    currently running) cleanly on SIGTERM
+    """
+    raise KeyboardInterrupt("Received signal " + str(signum))
+
+def isMainThread():
+    """ True in the main thread (the only one that may set signal
+    handlers)
+    """
+    return isinstance(threading.currentThread(), threading._MainThread)
+
+
 class TextTestRunner(unittest.TextTestRunner):
     """ Has a special variable disabledTests used to record disabled
     tests
+
+    Fail fast policy:
+
+    failFast: If True, a SystemTestSuite does not start its remaining
+    simulation after one simulation failed (unless the suite
+    overrides this).
+
+    maxFailures: If not None, no further tests (and suites) are
+    started after this number of tests failed.
+
+    launcher: The launcher (see module Launcher) used by
+    SystemTestSuites that don't specify their own. None means the
+    simulator is launched directly.
     """
 
     activeRunner = None
@@ -134,17 +251,37 @@ class TextTestRunner(unittest.TextTestRunner):
     def __init__(self, *args, **kwds):
         super(TextTestRunner, self).__init__(*args, **kwds)
         self.disabledSuites = []
+        self.failFast = False
+        self.maxFailures = None
+        self.launcher = None
 
 
     def addDisabledSuite(self, suite):
         self.disabledSuites.append(suite)
 
+    def _makeResult(self):
+        result = TextTestResult(self.stream, self.descriptions, self.verbosity)
+        result.maxFailures = self.maxFailures
+        return result
+
     def run(self, *args, **kwds):
         """ Run the test and provide disabled statistics
         """
         assert(TextTestRunner.activeRunner == None)
         TextTestRunner.activeRunner = self
-        result = unittest.TextTestRunner.run(self, *args, **kwds)
+        # in other threads SIGTERM is left to the main thread
+        installHandler = isMainThread()
+        if installHandler:
+            oldSigTermHandler = signal.signal(signal.SIGTERM, raiseKeyboardInterrupt)
+        try:
+            result = unittest.TextTestRunner.run(self, *args, **kwds)
+        finally:
+            if installHandler:
+                signal.signal(signal.SIGTERM, oldSigTermHandler)
+            TextTestRunner.activeRunner = None
+        if result.shouldStop:
+            output.stderr.write("Warning: Stopped after " + str(len(result.errors) + len(result.failures)))
+            output.stderr.write(" failed tests. The remaining tests were cancelled.\n")
         # statistic on disabled tests
         count = len(self.disabledSuites)
         if count > 0:
@@ -153,8 +290,6 @@ class TextTestRunner(unittest.TextTestRunner):
             for suite in self.disabledSuites:
                 output.stderr.write("\n         TestSuite: " + suite.getName() + "\n")
                 output.stderr.write("         Reason: " + suite.disabledReason + "\n")
-        assert(TextTestRunner.activeRunner == self)
-        TextTestRunner.activeRunner = None
         return result
 
 
@@ -199,7 +334,7 @@ class SystemTestSuite(TestSuite):
         def __init__(self, dirname):
             super(ProbesTestSuite.PDFProbes, self).__init__()
             self.dirname = dirname
-            self.probes = Probe.readAllProbes(dirname)
+            self.probes = pywns.Probe.readAllProbes(dirname)
 
     def __init__(
         self,
@@ -210,7 +345,10 @@ class SystemTestSuite(TestSuite):
         disabled = False,
         disabledReason = "You MUST provide a reason for disabled tests!!!",
         workingDir = None,
-        readProbes = False
+        readProbes = False,
+        failFast = None,
+        launcher = None,
+        simulationTimeout = None
         ):
         """
         Parameters:
@@ -225,6 +363,17 @@ class SystemTestSuite(TestSuite):
         have been performed (which is normally time consuming one
         might want to switch simulating of while writing new test
         cases based on the current output.
+
+        failFast: If True, the remaining simulation is not started if
+        one simulation failed. None means: use the policy of the
+        active TextTestRunner.
+
+        launcher: Run the simulations by this launcher (e.g. under
+        valgrind, see module Launcher). None means: use the launcher of
+        the active TextTestRunner (if any).
+
+        simulationTimeout: a simulation running longer than this (in
+        seconds) is terminated and fails. None means: no limit.
         """
 
         super(SystemTestSuite, self).__init__()
@@ -240,6 +389,11 @@ class SystemTestSuite(TestSuite):
         else:
             self.workingDir = os.path.join(os.getcwd(), workingDir )
         self.__readProbes = readProbes
+        self.failFast = failFast
+        self.launcher = launcher
+        self.simulationTimeout = simulationTimeout
+        # flavour -> summary of the launcher (e.g. valgrind findings)
+        self.launcherSummaries = {}
         # default name is the working dir
         self.name = self.workingDir
         self.dbgOutputDir = "output_dbg_" + self.configFile
@@ -250,6 +404,14 @@ class SystemTestSuite(TestSuite):
         self.referenceProbes = None
         # will be set to false if something went wrong ...
         self.simulationsWorkedOut = True
+        # flavour -> duration of the simulation in seconds
+        self.simulationDurations = {}
+        # seconds spent in running the tests (set by run)
+        self.testDuration = None
+        # seconds spent in reading probes and in preparing the suite
+        # (generating tests) apart from reading probes (set by run)
+        self.probeReadDuration = 0.0
+        self.testGenerationDuration = None
 
     def addTest(self, testCase):
         """ This injects the system test into the test case. Thus
@@ -267,32 +429,38 @@ class SystemTestSuite(TestSuite):
         """
         oldDir = os.getcwd()
         os.chdir(self.workingDir)
-        output.writeErr("\n**********************************************************************\n")
-        output.writeErr("SystemTestSuite: " + self.__getShortName(53) + "\n")
-        output.writeErr("Configuration: " + self.configFile + "\n")
-        output.writeErr("Description: " + self.__cutString(self.shortDescription, 57, False) + "\n")
-        output.writeErr("----------------------------------------------------------------------\n")
-
-        if self.disabled == False:
-            output.writeErr("Preparation phase:\n")
-
-            self.__runSims()
-
-            if self.simulationsWorkedOut == True:
-                self.__callPrepareTestSuite()
-
-            output.writeErr("Test phase:\n")
-            # finally, really run the tests
-            unittest.TestSuite.run(self, *args, **kwds)
-        else:
-            # add to to disabled suites in active runner
-            TextTestRunner.getActiveRunner().addDisabledSuite(self)
-            output.writeErr("Suite is disabled: " + self.disabledReason + "\n")
-            output.writeErr("Disabled.")
-
-        output.writeErr("\n**********************************************************************\n")
-
-        os.chdir(oldDir)
+        try:
+            output.writeErr("\n**********************************************************************\n")
+            output.writeErr("SystemTestSuite: " + self.__getShortName(53) + "\n")
+            output.writeErr("Configuration: " + self.configFile + "\n")
+            output.writeErr("Description: " + self.__cutString(self.shortDescription, 57, False) + "\n")
+            output.writeErr("----------------------------------------------------------------------\n")
+
+            if self.disabled == False:
+                output.writeErr("Preparation phase:\n")
+
+                if self.runSimulations:
+                    self.simulate()
+
+                if self.simulationsWorkedOut == True:
+                    start = time.time()
+                    self.__callPrepareTestSuite()
+                    self.testGenerationDuration = time.time() - start - self.probeReadDuration
+
+                output.writeErr("Test phase:\n")
+                # finally, really run the tests
+                start = time.time()
+                unittest.TestSuite.run(self, *args, **kwds)
+                self.testDuration = time.time() - start
+            else:
+                # add to to disabled suites in active runner
+                TextTestRunner.getActiveRunner().addDisabledSuite(self)
+                output.writeErr("Suite is disabled: " + self.disabledReason + "\n")
+                output.writeErr("Disabled.")
+
+            output.writeErr("\n**********************************************************************\n")
+        finally:
+            os.chdir(oldDir)
         # finally free the memory (When having a huge number of tests
         # (>5000) this became an issue since the python interpreter
         # consumed around 1 GB of memory
@@ -318,13 +486,39 @@ class SystemTestSuite(TestSuite):
         return self.name
 
 
+    def simulate(self):
+        """ Run the simulations preparing the output (dbg and opt).
+        Called by run if runSimulations == True. Derived suites running
+        other simulations override this and set simulationsWorkedOut.
+        """
+        self.__runSimulations()
+
+
+    def getLauncher(self):
+        """ The launcher of the simulations: the one of this suite or
+        the one of the active TextTestRunner
+        """
+        if self.launcher == None and TextTestRunner.activeRunner != None:
+            return TextTestRunner.activeRunner.launcher
+        return self.launcher
+
+
+    def getReferencePairs(self, flavour = "dbg"):
+        """ (output directory, reference directory) pairs (below the
+        working directory) to make the output of flavour the new
+        reference (see command 'rebaseline')
+        """
+        return [(os.path.join(self.workingDir, "output_" + flavour + "_" + self.configFile),
+                 os.path.join(self.workingDir, self.referenceOutputDir))]
+
+
     def readReferenceProbesIfAvailable(self):
         """ Read reference probes if directory exists, otherwise
         self.referenceProbes == None
         """
-        if os.path.exists(self.referenceOutputDir) and self.referenceProbes == None:
+        if pywns.DataFile.isDirectory(self.referenceOutputDir) and self.referenceProbes == None:
             output.writeErr("Reading reference probes (this may take a while) ... ")
-            self.referenceProbes = SystemTestSuite.PDFProbes(self.referenceOutputDir)
+            self.referenceProbes = self.__readProbeDirectory(self.referenceOutputDir)
             output.writeErr("Done.\n")
 
 
@@ -352,19 +546,22 @@ class SystemTestSuite(TestSuite):
         """ Read dbg and opt probes
         """
         output.writeErr("Reading dbg probes (this may take a while) ... ")
-        self.dbgProbes = SystemTestSuite.PDFProbes(self.dbgOutputDir)
+        self.dbgProbes = self.__readProbeDirectory(self.dbgOutputDir)
         output.writeErr("Done.\n")
 
         output.writeErr("Reading opt probes (this may take a while) ... ")
-        self.optProbes = SystemTestSuite.PDFProbes(self.optOutputDir)
+        self.optProbes = self.__readProbeDirectory(self.optOutputDir)
         output.writeErr("Done.\n")
 
+    def __readProbeDirectory(self, dirname):
+        """ Read the probes of dirname and add the time it took to
+        self.probeReadDuration
+        """
+        start = time.time()
+        probes = SystemTestSuite.PDFProbes(dirname)
+        self.probeReadDuration += time.time() - start
+        return probes
 
-    def __runSims(self):
-        # Returns True if simulation run was ok (or if no simulations
-        # needed to be performed.
-        if(self.runSimulations):
-            self.__runSimulations()
 
     def __runSimulations(self):
         """ Runs dbg and opt simulations to prepare the output dir
@@ -374,30 +571,51 @@ class SystemTestSuite(TestSuite):
         """
         output.writeErr("Running simulations (no test, just preparing output) in debugging and\noptimized mode (may take very long):\n")
         # two tests one for dbg
+        launcher = self.getLauncher()
+
         dbgSimulation = Simulation(wns = os.path.join(self.sandboxPath, "dbg", "bin", "openwns"),
                                    configFile = self.configFile,
-                                   outputDir = self.dbgOutputDir)
+                                   outputDir = self.dbgOutputDir,
+                                   launcher = launcher)
 
         # and one for opt
         optSimulation = Simulation(wns = os.path.join(self.sandboxPath, "opt", "bin", "openwns"),
                                    configFile = self.configFile,
-                                   outputDir = self.optOutputDir)
-
-        dbgResult = self.__runSimulation(dbgSimulation)
-        optResult = self.__runSimulation(optSimulation)
+                                   outputDir = self.optOutputDir,
+                                   launcher = launcher)
 
-        # Both results are fake tests ...
-        self.addTest(dbgResult)
-        self.addTest(optResult)
+        results = []
+        for flavour, simulation in [("dbg", dbgSimulation), ("opt", optSimulation)]:
+            if self.simulationsWorkedOut == False and self.__isFailFast():
+                output.writeErr("Skipping " + flavour + " simulation (fail fast)\n")
+                continue
+            results.append(self.__runSimulation(simulation))
+            if simulation.duration != None:
+                self.simulationDurations[flavour] = simulation.getDurationInSeconds()
+            if simulation.launcherSummary != "":
+                self.launcherSummaries[flavour] = simulation.launcherSummary
+                output.writeErr(simulation.launcher.name + " (" + flavour + "):\n")
+                output.writeErr(simulation.launcherSummary)
+
+        # The results are fake tests ...
+        for result in results:
+            self.addTest(result)
 
         if self.simulationsWorkedOut == True:
             dbgSeconds = dbgSimulation.getDurationInSeconds()
             optSeconds = optSimulation.getDurationInSeconds()
             output.writeErr("opt:dbg = 1:" + str(round((dbgSeconds/optSeconds), 3)) + "\n")
 
+    def __isFailFast(self):
+        if self.failFast != None:
+            return self.failFast
+        if TextTestRunner.activeRunner != None:
+            return TextTestRunner.activeRunner.failFast
+        return False
+
     def __runSimulation(self, sim):
         try:
-            sim.run()
+            sim.run(self.simulationTimeout)
             # queue test to show simulation worked out
             return FakeTest(success = True, shortDescription = "Simulation")
 
@@ -435,6 +653,12 @@ class SystemTestSuite(TestSuite):
                 classObject.prepareSystemTestSuite(self)
 
 
+machineDependentProbes = ['wns.Memory_TimeSeries.dat',
+                          'wns.Memory_Moments.dat',
+                          'wns.SimTimePerRealTime_TimeSeries.dat',
+                          'wns.SimTimePerRealTime_Moments.dat']
+""" probes that differ from machine to machine (not compared) """
+
 class ProbesTestSuite(SystemTestSuite):
     """ Test suite for system tests with automatic probe checking
 
@@ -458,7 +682,9 @@ class ProbesTestSuite(SystemTestSuite):
         requireReferenceOutput = True,
         workingDir = None,
         checkCPUCycles = False,
-        CPUCycleTolerance = 0.2
+        CPUCycleTolerance = 0.2,
+        failFast = None,
+        launcher = None
         ):
         """ Setup system test with automatic probe checking
 
@@ -473,12 +699,11 @@ class ProbesTestSuite(SystemTestSuite):
             disabled = disabled,
             disabledReason = disabledReason,
             workingDir = workingDir,
-            readProbes = True)
+            readProbes = True,
+            failFast = failFast,
+            launcher = launcher)
 
-        self.probesToBeExcluded = ['wns.Memory_TimeSeries.dat', 
-                                    'wns.Memory_Moments.dat',
-                                    'wns.SimTimePerRealTime_TimeSeries.dat',
-                                    'wns.SimTimePerRealTime_Moments.dat']
+        self.probesToBeExcluded = list(machineDependentProbes)
                                     
         # Check no code leeds to significant runtime changes etc.
         # but runtime on modern CPUs can vary
@@ -522,7 +747,7 @@ class ProbesTestSuite(SystemTestSuite):
         """ check if reference output exists. If not, offer to create
         from dbg output.
         """
-        if not os.path.exists(self.referenceOutputDir):
+        if not pywns.DataFile.isDirectory(self.referenceOutputDir):
             answer = ""
             output.writeOut("\n")
             output.writeOut("The directory " + self.referenceOutputDir + " dose not exists.\n")
@@ -533,7 +758,8 @@ class ProbesTestSuite(SystemTestSuite):
             while answer.lower() not in ["y", "n"]:
                 answer = raw_input("\nShould I copy " + self.dbgOutputDir + " to " + self.referenceOutputDir + "? (y/n) ")
             if answer.lower() == "y":
-                shutil.copytree(self.dbgOutputDir, self.referenceOutputDir)
+                # the files are deduplicated in the reference store
+                pywns.ReferenceStore.copy(self.dbgOutputDir, self.referenceOutputDir)
             else:
                 output.writeOut("I will not be able to run tests against reference output.\n")
                 output.writeOut("These test will be disabled. Also self.referenceProbes will not be available (None).\n")
@@ -621,9 +847,9 @@ class ProbesTestSuite(SystemTestSuite):
                 continue
             # TableProbes are currently not supported, TimeSeries not intended
             if not (isinstance(self.__dict__[referenceFlavour+"Probes"].probes[probeName],
-                Probe.TableProbe)) and (not 
+                pywns.Probe.TableProbe)) and (not 
             isinstance(self.__dict__[referenceFlavour+"Probes"].probes[probeName],
-                Probe.TimeSeriesProbe)):
+                pywns.Probe.TimeSeriesProbe)):
               
                 self.addTests(ProbesAreAlmostEqual.getAllTests(
                     probeName,
@@ -633,6 +859,166 @@ class ProbesTestSuite(SystemTestSuite):
                     maxRelativeError))
 
 
+class ReplicatedProbesTestSuite(SystemTestSuite):
+    """ Test suite judging the probes statistically against replicated
+    reference output
+
+    Instead of one dbg and one opt simulation, the simulator (of
+    flavour) runs once per seed. The replications run at the same time
+    (as many as the job server allows, see module JobServer). The seed
+    is set by the config patch seedPatch % seed. Replication of seed k
+    writes 'output_opt_<config>_seed<k>', its reference is
+    'referenceOutput_<config>_seed<k>' (create or update it by the
+    command 'rebaseline'; the suite fails while references are missing).
+
+    For each probe (with moments) found in both, the means of the
+    replications are compared by Welch's t test (see module
+    Replication). significanceLevel is the probability that any probe
+    test of the suite fails although nothing changed: each of the n
+    probes is tested at significanceLevel / n (Bonferroni). Short
+    simulations are fine as long as the mean of each replication is
+    roughly normally distributed.
+    """
+
+    probeTypes = ["Moments", "PDF", "LogEval", "BatchMeans", "LRE", "DLRE"]
+    """ probe types with moments """
+
+    def __init__(
+        self,
+        sandboxPath = "../../sandbox",
+        configFile = "config.py",
+        replications = 8,
+        seeds = None,
+        seedPatch = "WNS.rng.seed = %d",
+        significanceLevel = 0.01,
+        flavour = "opt",
+        runSimulations = True,
+        shortDescription = "Please provide a short description!!!",
+        disabled = False,
+        disabledReason = "You MUST provide a reason for disabled tests!!!",
+        workingDir = None,
+        launcher = None,
+        simulationTimeout = None
+        ):
+        """
+        replications: number of simulations (seeds 1 .. replications)
+
+        seeds: list of seeds (overrides replications)
+
+        seedPatch: config patch setting the seed ('%d' is the seed)
+
+        significanceLevel: probability of a false alarm of the suite
+        """
+        super(ReplicatedProbesTestSuite, self).__init__(
+            sandboxPath = sandboxPath,
+            configFile = configFile,
+            runSimulations = runSimulations,
+            shortDescription = shortDescription,
+            disabled = disabled,
+            disabledReason = disabledReason,
+            workingDir = workingDir,
+            readProbes = False,
+            launcher = launcher,
+            simulationTimeout = simulationTimeout)
+
+        if seeds == None:
+            seeds = range(1, replications + 1)
+        if len(seeds) < 2:
+            raise ValueError("At least two replications are needed")
+        self.seeds = seeds
+        self.seedPatch = seedPatch
+        self.significanceLevel = significanceLevel
+        self.flavour = flavour
+        self.probesToBeExcluded = list(machineDependentProbes)
+        self.outputDirs = ["output_%s_%s_seed%d" % (flavour, configFile, seed) for seed in seeds]
+        self.referenceOutputDirs = ["referenceOutput_%s_seed%d" % (configFile, seed) for seed in seeds]
+        # Replication.ReplicationSets (set by prepareSystemTestSuite)
+        self.replications = None
+        self.referenceReplications = None
+
+    def simulate(self):
+        """ Run the replications """
+        output.writeErr("Running " + str(len(self.seeds)) + " replications (" + self.flavour + "):\n")
+        simulations = []
+        for seed, outputDir in zip(self.seeds, self.outputDirs):
+            simulations.append(Simulation(wns = os.path.join(self.sandboxPath, self.flavour, "bin", "openwns"),
+                                          configFile = self.configFile,
+                                          configPatches = [self.seedPatch % seed],
+                                          outputDir = outputDir,
+                                          launcher = self.getLauncher(),
+                                          logSuffix = "_seed" + str(seed)))
+        start = time.time()
+        results = runSimulations(simulations, timeout = self.simulationTimeout)
+        self.simulationDurations[self.flavour] = time.time() - start
+
+        errorMsg = ""
+        for seed, result in zip(self.seeds, results):
+            if result != None:
+                errorMsg += "Seed " + str(seed) + ":\n" + str(result) + "\n"
+        if errorMsg != "":
+            # don't run the tests
+            self._tests = []
+            self.simulationsWorkedOut = False
+            self.addTest(FakeTest(success = False, shortDescription = "Simulations",
+                                  errorMsg = "Simulation failed. Reason:\n" + errorMsg))
+        else:
+            self.addTest(FakeTest(success = True, shortDescription = "Simulations"))
+
+    def prepareSystemTestSuite(self):
+        """ Read the replications and register a test per probe
+        """
+        missing = [ii for ii in self.referenceOutputDirs if not pywns.DataFile.isDirectory(ii)]
+        if len(missing) > 0:
+            self.addTest(FakeTest(success = False, shortDescription = "Reference replications",
+                                  errorMsg = "No reference replications (" + ", ".join(missing) + "). " +
+                                  "Create them by 'rebaseline'."))
+            return
+
+        start = time.time()
+        self.replications = pywns.Replication.load(self.outputDirs, probeTypes = self.probeTypes)
+        self.referenceReplications = pywns.Replication.load(self.referenceOutputDirs,
+                                                             probeTypes = self.probeTypes)
+        self.probeReadDuration += time.time() - start
+        errorMsg = ""
+        for replications in [self.replications, self.referenceReplications]:
+            for dirname, error in replications.errors.items():
+                errorMsg += "Reading " + dirname + " failed: " + str(error) + "\n"
+        if errorMsg != "":
+            self.addTest(FakeTest(success = False, shortDescription = "Reading replications",
+                                  errorMsg = errorMsg))
+            return
+
+        self.addTest(DirectoryContentsAreEqual(self.referenceOutputDirs[0], self.outputDirs[0],
+                                               self.probesToBeExcluded))
+
+        probeNames = []
+        for probeName in self.replications.getFilenames():
+            if probeName in self.probesToBeExcluded or not self.referenceReplications.probes.has_key(probeName):
+                continue
+            # the Welch test needs two replications with values on each side
+            if self.__countMeasured(self.replications, probeName) >= 2 and \
+                   self.__countMeasured(self.referenceReplications, probeName) >= 2:
+                probeNames.append(probeName)
+        for probeName in probeNames:
+            self.addTest(ReplicatedMeansAreEqual(probeName, self.significanceLevel / len(probeNames)))
+
+    def getReferencePairs(self, flavour = "dbg"):
+        """ The replications (always of the flavour simulated) """
+        return [(os.path.join(self.workingDir, outputDir), os.path.join(self.workingDir, referenceOutputDir))
+                for outputDir, referenceOutputDir in zip(self.outputDirs, self.referenceOutputDirs)]
+
+    def run(self, *args, **kwds):
+        SystemTestSuite.run(self, *args, **kwds)
+        # free the memory (see SystemTestSuite.run)
+        self.replications = None
+        self.referenceReplications = None
+
+    # private stuff
+
+    def __countMeasured(self, replications, probeName):
+        return len([probe for probe in replications.probes[probeName] if probe.trials > 0])
+
+
 class PedanticProbesTestSuite(ProbesTestSuite):
     """ Like SystemTestSuite but more restrictive
 
@@ -724,7 +1110,7 @@ class DirectoryContentsAreEqual(SystemTestCase):
 
     Checks if two directories have the same content. If not lists the
     difference between both. No recursion is done. Only toplevel files
-    are considered.
+    are considered, caches (see ReferenceStore.ignoredPatterns) are not.
     """
     def __init__(self, referenceDir, actualDir, filterItems):
         super(DirectoryContentsAreEqual, self).__init__("runTest")
@@ -737,8 +1123,8 @@ class DirectoryContentsAreEqual(SystemTestCase):
 
 
     def runTest(self):
-        ref = set([ii for ii  in os.listdir(self.referenceDir) if not ii in self.filterItems])
-        act = set([ii for ii  in os.listdir(self.actualDir) if not ii in self.filterItems])
+        ref = set([ii for ii  in pywns.DataFile.listDirectory(self.referenceDir) if not self.__isFiltered(ii)])
+        act = set([ii for ii  in pywns.DataFile.listDirectory(self.actualDir) if not self.__isFiltered(ii)])
 
         errorMsg = "\n  Files in " + self.referenceDir + " but not in " + self.actualDir + ": "
         errorMsg += ", ".join(ref.difference(act))
@@ -746,6 +1132,12 @@ class DirectoryContentsAreEqual(SystemTestCase):
         errorMsg += ", ".join(act.difference(ref))
         self.assertTrue(ref == act, errorMsg)
 
+    # private stuff
+
+    def __isFiltered(self, name):
+        # caches of the probe readers are not part of the output
+        return name in self.filterItems or pywns.ReferenceStore.isIgnored(name)
+
 
 class ProbeTest(SystemTestCase):
     """ Tests with one probe (use only to derive)
@@ -967,22 +1359,75 @@ class ProbeHasTrials(ProbeTest):
         return self.probe.filename + ": number of trials > 0"
 
 
+class ReplicatedMeansAreEqual(SystemTestCase):
+    """ Welch's t test of the means of a probe in the replications of
+    the output and the reference (see ReplicatedProbesTestSuite)
+    """
+
+    def __init__(self, probeName, significanceLevel):
+        super(ReplicatedMeansAreEqual, self).__init__("runTest")
+        self.probeName = probeName
+        self.significanceLevel = significanceLevel
+
+    def description(self):
+        return self.probeName + ": mean equals reference (replications)"
+
+    def runTest(self):
+        reference = self.systemTestSuite.referenceReplications.getMoments(self.probeName)
+        actual = self.systemTestSuite.replications.getMoments(self.probeName)
+        t, degreesOfFreedom, pValue = pywns.Replication.welchTest(reference.replicationMeans,
+                                                                  actual.replicationMeans)
+        errorMsg = "Mean %g %s differs from reference %g %s (Welch test: t = %.3g, df = %.1f, p = %.3g < %.3g)" % \
+                   (actual.mean, str(actual.meanConfidenceInterval), reference.mean,
+                    str(reference.meanConfidenceInterval), t, degreesOfFreedom, pValue, self.significanceLevel)
+        self.assertTrue(pValue >= self.significanceLevel, errorMsg)
+
+
 class SimulationException(Exception):
     pass
 
+class SimulationTimeout(SimulationException):
+    pass
+
 class Simulation(object):
     """ Ensures a simulation runs without config error and segfault
 
     This will run the simulation and prepare the output directory. If
     the simulation fails, an exception is raised.
+
+    If the run is interrupted (KeyboardInterrupt, see also
+    raiseKeyboardInterrupt) the simulator process is terminated before
+    the exception is passed on.
     """
+
+    running = []
+    """ all simulations currently running """
+
+    terminateTimeout = 10.0
+    """ seconds to wait after SIGTERM before the simulator gets SIGKILL """
     def __init__(
         self,
         wns = "../../sandbox/dbg/bin/openwns",
         configFile = "config.py",
         configPatches = [],
-        outputDir = ""
+        outputDir = "",
+        launcher = None,
+        memory = 0,
+        workingDir = None,
+        logSuffix = ""
         ):
+        """ launcher: launch the simulator by this launcher (see module
+        Launcher), None means the simulator is launched directly
+
+        memory: memory (in MB) the simulation needs (see module JobServer)
+
+        workingDir: where to run the simulator (and write stdout.log
+        and stderr.log), None means the current directory at start()
+
+        logSuffix: appended to the names of the logs (e.g. '_seed1'
+        for stdout_seed1.log), needed if several simulations run in
+        the same working directory at the same time
+        """
         self.wns = wns
         self.configFile = configFile
         self.configPatches = ["WNS.masterLogger.enabled=True", "WNS.masterLogger.backtrace.enabled=True"] + configPatches
@@ -991,31 +1436,206 @@ class Simulation(object):
             self.configPatches += ["WNS.outputDir = '" + self.outputDir + "'"]
         self.configPatch = '-y "' + '; '.join(self.configPatches) + '"'
         self.wnsParameters = self.configPatch
+        if launcher == None:
+            launcher = pywns.Launcher.Launcher()
+        self.launcher = launcher
+        self.memory = memory
+        self.workingDir = workingDir
+        self.logSuffix = logSuffix
+        # set by run()
+        self.duration = None
+        self.process = None
+        self.launcherSummary = ""
+        self.status = None
+        self.__job = None
+        # stdout and stderr log of the running simulator
+        self.__logs = []
+
+    def run(self, timeout = None):
+        """ Run simulation (start and wait)
+        """
+        self.start()
+        self.wait(timeout)
 
-    def run(self):
-        """ Run simulation
+    def start(self, block = True):
+        """ Start the simulator in the background. Waits for a free job
+        slot (see module JobServer) if block == True, otherwise returns
+        False if no slot is free.
         """
-        start = datetime.datetime.today()
+        self.__start = datetime.datetime.today()
+        self.__cwd = os.path.abspath(self.workingDir or os.getcwd())
         cmd = " ".join([self.wns, "-f", self.configFile, self.wnsParameters])
-        print "Running: " + cmd
-        stdout = "stdout.log"
-        stderr = "stderr.log"
-        process = subprocess.Popen(cmd, shell=True, stdout=open(stdout, "w"), stderr=open(stderr, "w"))
-        status = process.poll()
-        while(status == None):
-            output.writeErr(".")
-            time.sleep(1.0)
-            status = process.poll()
-
-        self.duration = datetime.datetime.today() - start
+        jobServer = pywns.JobServer.getJobServer()
+        self.__job = jobServer.acquire(self.memory, block)
+        if self.__job == None:
+            return False
+        self.__cmd = self.launcher.getCommand(cmd, self.__getTag(), self.__cwd)
+        print "Running: " + self.__cmd
+        try:
+            self.__logs = [open(self.__getLogFilename("stdout"), "w")]
+            self.__logs.append(open(self.__getLogFilename("stderr"), "w"))
+            # the simulator gets its own process group, so that terminate
+            # reaches the simulator and not only the shell
+            self.process = subprocess.Popen(self.__job.getCommandPrefix() + self.__cmd, shell=True,
+                                            cwd=self.__cwd,
+                                            stdout=self.__logs[0],
+                                            stderr=self.__logs[1],
+                                            preexec_fn=os.setsid)
+        except:
+            self.__closeLogs()
+            jobServer.release(self.__job)
+            self.__job = None
+            raise
+        self.status = None
+        Simulation.running.append(self)
+        return True
+
+    def poll(self):
+        """ None while the simulator runs, its exit status afterwards
+        """
+        if self.status == None and self.process.poll() != None:
+            self.__finish()
+        return self.status
+
+    def wait(self, timeout = None):
+        """ Wait for the simulator started by start() to finish. Raises
+        SimulationException if it failed and SimulationTimeout (after
+        terminating it) if it did not finish within timeout seconds.
+        """
+        deadline = None
+        if timeout != None:
+            deadline = time.time() + timeout
+        try:
+            while self.poll() == None:
+                if deadline != None and time.time() >= deadline:
+                    output.writeErr(" timeout, terminating simulation\n")
+                    self.cancel()
+                    raise SimulationTimeout(self.__cmd + " did not finish within " + str(timeout) + " s")
+                output.writeErr(".")
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            output.writeErr(" interrupted, terminating simulation\n")
+            self.cancel()
+            raise
         output.writeErr(" " + str(self.duration) + " h")
         output.writeErr("\n")
-        if status != 0:
-            raise SimulationException(cmd + " failed!!:\n" + file(stderr).read())
+        self.checkStatus()
+
+    def cancel(self):
+        """ Terminate the simulator (if running) and release its job slot
+        """
+        self.terminate()
+        if self.status == None and self.process != None:
+            self.__finish()
+
+    def checkStatus(self):
+        """ Raise SimulationException if the simulation has failed
+        """
+        if self.status != 0:
+            raise SimulationException(self.__cmd + " failed!!:\n" +
+                                      file(self.__getLogFilename("stderr")).read() +
+                                      self.launcherSummary)
 
     def getDurationInSeconds(self):
         return float(self.duration.seconds + 86400*self.duration.days + self.duration.microseconds*1E-6)
 
+    def terminate(self):
+        """ Terminate the simulator (SIGTERM, then SIGKILL if it does
+        not stop within terminateTimeout seconds)
+        """
+        if self.process == None or self.process.poll() != None:
+            return
+        self.__killProcessGroup(signal.SIGTERM)
+        deadline = time.time() + self.terminateTimeout
+        while self.process.poll() == None and time.time() < deadline:
+            time.sleep(0.1)
+        if self.process.poll() == None:
+            self.__killProcessGroup(signal.SIGKILL)
+            self.process.wait()
+
+    def terminateAll():
+        """ Terminate all simulations currently running
+        """
+        for simulation in Simulation.running[:]:
+            simulation.terminate()
+    terminateAll = staticmethod(terminateAll)
+
+    # private stuff
+
+    def __finish(self):
+        self.status = self.process.wait()
+        self.__closeLogs()
+        if self in Simulation.running:
+            Simulation.running.remove(self)
+        if self.__job != None:
+            pywns.JobServer.getJobServer().release(self.__job)
+            self.__job = None
+        self.duration = datetime.datetime.today() - self.__start
+        self.launcherSummary = self.launcher.getSummary(self.__getTag(), self.__cwd)
+
+    def __closeLogs(self):
+        for log in self.__logs:
+            log.close()
+        self.__logs = []
+
+    def __getTag(self):
+        if self.outputDir != "":
+            return self.outputDir
+        return "simulation"
+
+    def __getLogFilename(self, name):
+        return os.path.join(self.__cwd, name + self.logSuffix + ".log")
+
+    def __killProcessGroup(self, signum):
+        try:
+            os.killpg(self.process.pid, signum)
+        except OSError:
+            # already gone
+            pass
+
+
+def runSimulations(simulations, maxRunning = None, timeout = None):
+    """ Run simulations concurrently (as many as the job server allows
+    and at most maxRunning) from this thread. Each simulation has
+    'timeout' seconds. Returns one entry per simulation: None if it
+    succeeded, the SimulationException otherwise. On KeyboardInterrupt
+    all running simulations are cancelled.
+    """
+    results = [None] * len(simulations)
+    pending = range(len(simulations))
+    running = []
+    deadlines = {}
+    try:
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and (maxRunning == None or len(running) < maxRunning):
+                # the first simulation may wait, the others only take free slots
+                if not simulations[pending[0]].start(block = (len(running) == 0)):
+                    break
+                index = pending.pop(0)
+                running.append(index)
+                if timeout != None:
+                    deadlines[index] = time.time() + timeout
+            for index in running[:]:
+                simulation = simulations[index]
+                if simulation.poll() == None:
+                    if deadlines.has_key(index) and time.time() >= deadlines[index]:
+                        simulation.cancel()
+                        results[index] = SimulationTimeout(simulation.wns + " did not finish within " +
+                                                           str(timeout) + " s")
+                        running.remove(index)
+                    continue
+                running.remove(index)
+                try:
+                    simulation.checkStatus()
+                except SimulationException, e:
+                    results[index] = e
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        for index in running:
+            simulations[index].cancel()
+        raise
+    return results
+
 
 class FakeTest(SystemTestCase):
     """ Helper to inject tests that aren't really tests
@@ -1033,6 +1653,434 @@ class FakeTest(SystemTestCase):
         return self.__description
 
 
+class SuiteDefinitionLoader(object):
+    """ Loads suite definitions (e.g. 'systemTest.py') from directories
+
+    The compiled code of each suite definition is cached. The cache is
+    kept in memory and (if persistent == True) in a file in
+    the cache directory (see DataFile.getCacheFilename). A cached code
+    object is only reused as long as the modification time and the size
+    of the suite definition did not change.
+
+    The time needed to load each directory is recorded in
+    self.timings as a list of (directory, seconds) tuples.
+    """
+
+    codeCache = {}
+    """ in-memory cache shared by all loaders: path -> (mtime, size, code) """
+
+    def __init__(self, suiteConfig = "systemTest.py", suiteName = "testSuite", persistent = True):
+        super(SuiteDefinitionLoader, self).__init__()
+        self.suiteConfig = suiteConfig
+        self.suiteName = suiteName
+        self.persistent = persistent
+        self.timings = []
+
+    def hasSuiteConfig(self, dirname):
+        return os.path.isfile(os.path.join(dirname, self.suiteConfig))
+
+    def load(self, dirname):
+        """ Execute the suite definition in 'dirname' (with 'dirname'
+        as current working directory) and return the suite named
+        self.suiteName or None if the definition has no such suite.
+        """
+        start = time.time()
+        code = self.getCode(os.path.join(dirname, self.suiteConfig))
+        globalsDict = {"__name__": "systemTest"}
+        oldDir = os.getcwd()
+        os.chdir(dirname)
+        try:
+            exec code in globalsDict
+        finally:
+            os.chdir(oldDir)
+        self.timings.append((dirname, time.time() - start))
+        return globalsDict.get(self.suiteName, None)
+
+    def getCode(self, filename):
+        """ Return the (possibly cached) code object of filename
+        """
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        key = (stat.st_mtime, stat.st_size)
+
+        cached = SuiteDefinitionLoader.codeCache.get(filename)
+        if cached != None and cached[:2] == key:
+            return cached[2]
+
+        code = None
+        cacheFile = self.__getCacheFilename(filename)
+        if self.persistent:
+            code = self.__readCacheFile(cacheFile, key)
+
+        if code == None:
+            source = file(filename, "U").read()
+            code = compile(source + "\n", filename, "exec")
+            if self.persistent:
+                self.__writeCacheFile(cacheFile, key, code)
+
+        SuiteDefinitionLoader.codeCache[filename] = key + (code,)
+        return code
+
+    def writeTimings(self, stream, maxEntries = 10):
+        """ Print the slowest suite definitions to stream
+        """
+        if len(self.timings) == 0:
+            return
+        timings = self.timings[:]
+        timings.sort(lambda a, b: cmp(b[1], a[1]))
+        total = 0.0
+        for dirname, seconds in timings:
+            total += seconds
+        stream.write("\nDiscovered " + str(len(timings)) + " suite definitions in ")
+        stream.write("%.3f s. Slowest:\n" % total)
+        for dirname, seconds in timings[:maxEntries]:
+            stream.write("  %8.3f s  %s\n" % (seconds, dirname))
+
+    # private stuff
+
+    def __getCacheFilename(self, filename):
+        return pywns.DataFile.getCacheFilename(filename, ".cache")
+
+    def __readCacheFile(self, cacheFile, key):
+        try:
+            f = file(cacheFile, "rb")
+            try:
+                magic = f.read(len(imp.get_magic()))
+                if magic != imp.get_magic():
+                    return None
+                if marshal.load(f) != key:
+                    return None
+                return marshal.load(f)
+            finally:
+                f.close()
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+
+    def __writeCacheFile(self, cacheFile, key, code):
+        # the cache is an optimization only: never fail because of it
+        try:
+            pywns.ReferenceStore.makeDirectories(os.path.dirname(cacheFile))
+        except OSError:
+            return
+        try:
+            f = file(cacheFile, "wb")
+            try:
+                f.write(imp.get_magic())
+                marshal.dump(key, f)
+                marshal.dump(code, f)
+            finally:
+                f.close()
+        except IOError:
+            pass
+
+
+class SuiteTimings(object):
+    """ History of the durations measured for system test suites
+
+    The history is kept in a plain text file with one line per suite:
+    the suite key (its directory) followed by tab separated
+    'name=seconds' pairs. Recorded are the time spent in the
+    simulations ('simulation'), in reading probes ('probeRead'), in
+    generating tests ('testGeneration') and in running the tests
+    ('tests'). The file is only read and written if a filename is
+    given.
+    """
+
+    def __init__(self, filename = None):
+        super(SuiteTimings, self).__init__()
+        self.filename = filename
+        self.durations = {}
+        if self.filename != None and os.path.exists(self.filename):
+            self.read(self.filename)
+
+    def read(self, filename):
+        for line in file(filename):
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2 or line.startswith("#"):
+                continue
+            entry = self.durations.setdefault(fields[0], {})
+            for field in fields[1:]:
+                name, value = field.split("=", 1)
+                entry[name] = float(value)
+
+    def write(self, filename = None):
+        if filename == None:
+            filename = self.filename
+        pywns.ReferenceStore.makeDirectories(os.path.dirname(os.path.abspath(filename)))
+        keys = self.durations.keys()
+        keys.sort()
+        f = file(filename, "w")
+        f.write("# suite\tname=seconds ...\n")
+        for key in keys:
+            entry = self.durations[key]
+            names = entry.keys()
+            names.sort()
+            f.write("\t".join([key] + ["%s=%.3f" % (name, entry[name]) for name in names]) + "\n")
+        f.close()
+
+    def update(self, key, durations):
+        self.durations.setdefault(key, {}).update(durations)
+
+    def getDuration(self, key, default = None):
+        """ Return the total recorded duration of a suite or default
+        if nothing has been recorded, yet.
+        """
+        if not self.durations.has_key(key) or len(self.durations[key]) == 0:
+            return default
+        return sum(self.durations[key].values())
+
+    def getDurations(self, keys):
+        """ Return the durations for keys. Suites without history get
+        the mean duration of the known suites.
+        """
+        known = [self.getDuration(key) for key in keys if self.getDuration(key) != None]
+        if len(known) > 0:
+            default = sum(known) / len(known)
+        else:
+            default = 1.0
+        return [self.getDuration(key, default) for key in keys]
+
+
+class TestResults(object):
+    """ A mergeable summary of a unittest.TestResult
+
+    Only plain data (descriptions and tracebacks) is kept so that the
+    results of several shards can be written to files (see write) and
+    be combined afterwards (see merge).
+
+    timings: suite key -> durations of its phases (see
+    getSuiteDurations)
+
+    testTimings: list of (suite key, description, seconds, outcome,
+    message) of the tests (see TextTestResult). suites is a list of
+    (key, suite) giving the keys of the SystemTestSuites, other suites
+    are identified by their name.
+
+    launcherSummaries: suite key -> flavour -> what the launcher of the
+    simulations measured (see module Launcher)
+    """
+
+    def __init__(self, result = None, suites = []):
+        super(TestResults, self).__init__()
+        self.testsRun = 0
+        self.errors = []
+        self.failures = []
+        self.timings = {}
+        self.testTimings = []
+        self.launcherSummaries = {}
+        for key, suite in suites:
+            if len(getattr(suite, "launcherSummaries", {})) > 0:
+                self.launcherSummaries[key] = suite.launcherSummaries.copy()
+        if result != None:
+            self.testsRun = result.testsRun
+            self.errors = [(self.__describe(test), traceback) for test, traceback in result.errors]
+            self.failures = [(self.__describe(test), traceback) for test, traceback in result.failures]
+            keys = dict([(id(suite), key) for key, suite in suites])
+            for suite, description, seconds, outcome, message in getattr(result, "testTimings", []):
+                key = ""
+                if suite != None:
+                    key = keys.get(id(suite), suite.getName())
+                self.testTimings.append((key, description, seconds, outcome, message))
+
+    def wasSuccessful(self):
+        return len(self.errors) == 0 and len(self.failures) == 0
+
+    def write(self, filename):
+        f = file(filename, "wb")
+        cPickle.dump(self.__dict__, f, 2)
+        f.close()
+
+    def read(filename):
+        results = TestResults()
+        f = file(filename, "rb")
+        results.__dict__.update(cPickle.load(f))
+        f.close()
+        return results
+    read = staticmethod(read)
+
+    def merge(listOfResults):
+        merged = TestResults()
+        for results in listOfResults:
+            merged.testsRun += results.testsRun
+            merged.errors += results.errors
+            merged.failures += results.failures
+            merged.testTimings += getattr(results, "testTimings", [])
+            for key, durations in results.timings.items():
+                merged.timings.setdefault(key, {}).update(durations)
+            for key, summaries in getattr(results, "launcherSummaries", {}).items():
+                merged.launcherSummaries.setdefault(key, {}).update(summaries)
+        return merged
+    merge = staticmethod(merge)
+
+    def writeSummary(self, stream):
+        for kind, entries in [("ERROR", self.errors), ("FAIL", self.failures)]:
+            for description, traceback in entries:
+                stream.write("=" * 70 + "\n")
+                stream.write(kind + ": " + description + "\n")
+                stream.write("-" * 70 + "\n")
+                stream.write(traceback + "\n")
+        self.writeLauncherSummaries(stream)
+        stream.write("-" * 70 + "\n")
+        stream.write("Ran " + str(self.testsRun) + " tests\n\n")
+        if self.wasSuccessful():
+            stream.write("OK\n")
+        else:
+            stream.write("FAILED (failures=%d, errors=%d)\n" % (len(self.failures), len(self.errors)))
+
+    def writeLauncherSummaries(self, stream):
+        """ Write what the launchers measured, per suite and flavour """
+        keys = self.launcherSummaries.keys()
+        keys.sort()
+        for key in keys:
+            flavours = self.launcherSummaries[key].keys()
+            flavours.sort()
+            for flavour in flavours:
+                stream.write("=" * 70 + "\n")
+                stream.write("LAUNCHER: " + key + " (" + flavour + ")\n")
+                stream.write("-" * 70 + "\n")
+                stream.write(self.launcherSummaries[key][flavour] + "\n")
+
+    def getSlowestTests(self, number = 10):
+        """ (seconds, suite key, description) of the slowest tests """
+        slowest = [(seconds, key, description)
+                   for key, description, seconds, outcome, message in self.testTimings]
+        slowest.sort()
+        slowest.reverse()
+        return slowest[:number]
+
+    def getSlowestPhases(self, number = 10):
+        """ (seconds, suite key, phase) of the slowest suite phases """
+        slowest = []
+        for key, durations in self.timings.items():
+            for phase, seconds in durations.items():
+                slowest.append((seconds, key, phase))
+        slowest.sort()
+        slowest.reverse()
+        return slowest[:number]
+
+    def writeSlowest(self, stream, number = 10):
+        """ Write the slowest suite phases and tests """
+        stream.write("Slowest suite phases:\n")
+        for seconds, key, phase in self.getSlowestPhases(number):
+            stream.write("  %10.3f s  %-14s %s\n" % (seconds, phase, key))
+        stream.write("Slowest tests:\n")
+        for seconds, key, description in self.getSlowestTests(number):
+            stream.write("  %10.3f s  %s: %s\n" % (seconds, key, description))
+
+    def writeJUnitXML(self, filename):
+        """ Write the results as JUnit XML: one testsuite per suite key
+        with its tests and their durations. The durations of the suite
+        phases are written as properties of the testsuite, the launcher
+        summaries as its system-out.
+        """
+        tests = {}
+        for entry in self.testTimings:
+            tests.setdefault(entry[0], []).append(entry)
+        launcherSummaries = getattr(self, "launcherSummaries", {})
+        keys = dict([(key, None) for key in tests.keys() + self.timings.keys() +
+                     launcherSummaries.keys()]).keys()
+        keys.sort()
+        f = file(filename, "w")
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write('<testsuites tests="%d" failures="%d" errors="%d" time="%.3f">\n' %
+                (len(self.testTimings), len(self.failures), len(self.errors),
+                 sum([sum(durations.values()) for durations in self.timings.values()])))
+        for key in keys:
+            entries = tests.get(key, [])
+            durations = self.timings.get(key, {})
+            seconds = sum(durations.values())
+            if seconds == 0.0:
+                seconds = sum([entry[2] for entry in entries])
+            outcomes = [entry[3] for entry in entries]
+            name = key
+            if name == "":
+                name = "other"
+            f.write('  <testsuite name=%s tests="%d" failures="%d" errors="%d" time="%.3f">\n' %
+                    (xml.sax.saxutils.quoteattr(name), len(entries), outcomes.count("failure"),
+                     outcomes.count("error"), seconds))
+            if len(durations) > 0:
+                f.write('    <properties>\n')
+                phases = durations.keys()
+                phases.sort()
+                for phase in phases:
+                    f.write('      <property name="%s" value="%.3f"/>\n' % (phase, durations[phase]))
+                f.write('    </properties>\n')
+            for suiteKey, description, testSeconds, outcome, message in entries:
+                f.write('    <testcase classname=%s name=%s time="%.3f"' %
+                        (xml.sax.saxutils.quoteattr(name), xml.sax.saxutils.quoteattr(description), testSeconds))
+                if outcome == "success":
+                    f.write('/>\n')
+                else:
+                    f.write('>\n      <%s message=%s>%s</%s>\n    </testcase>\n' %
+                            (outcome, xml.sax.saxutils.quoteattr(message.strip().split("\n")[-1]),
+                             xml.sax.saxutils.escape(message), outcome))
+            summaries = launcherSummaries.get(key, {})
+            if len(summaries) > 0:
+                flavours = summaries.keys()
+                flavours.sort()
+                f.write('    <system-out>%s</system-out>\n' %
+                        xml.sax.saxutils.escape("".join([flavour + ":\n" + summaries[flavour]
+                                                         for flavour in flavours])))
+            f.write('  </testsuite>\n')
+        f.write('</testsuites>\n')
+        f.close()
+
+    # private stuff
+
+    def __describe(self, test):
+        description = test.shortDescription()
+        if description == None:
+            description = str(test)
+        return description
+
+
+def getSuiteDurations(suite):
+    """ Sum up the durations of the phases ('simulation', 'probeRead',
+    'testGeneration' and 'tests') of all SystemTestSuites contained in
+    suite
+    """
+    if isinstance(suite, SystemTestSuite):
+        durations = {}
+        if len(suite.simulationDurations) > 0:
+            durations["simulation"] = sum(suite.simulationDurations.values())
+        if suite.probeReadDuration > 0.0:
+            durations["probeRead"] = suite.probeReadDuration
+        if suite.testGenerationDuration != None:
+            durations["testGeneration"] = suite.testGenerationDuration
+        if suite.testDuration != None:
+            durations["tests"] = suite.testDuration
+        return durations
+    durations = {}
+    for test in getattr(suite, "_tests", []):
+        for name, seconds in getSuiteDurations(test).items():
+            durations[name] = durations.get(name, 0.0) + seconds
+    return durations
+
+def getSystemTestSuites(suite):
+    """ All SystemTestSuites contained in suite
+    """
+    if isinstance(suite, SystemTestSuite):
+        return [suite]
+    result = []
+    for test in getattr(suite, "_tests", []):
+        result += getSystemTestSuites(test)
+    return result
+
+def startExternalPrograms(suite):
+    """ Start all ExternalPrograms in suite in the background, if more
+    than one job may run at the same time (see module JobServer). They
+    run concurrently with the simulations and their tests wait for them
+    to finish.
+    """
+    if not pywns.JobServer.getJobServer().isParallel():
+        return
+    for test in getattr(suite, "_tests", []):
+        if isinstance(test, ExternalProgram):
+            test.start()
+        else:
+            startExternalPrograms(test)
+
+
 class TestCollector(object):
     """ This collector searches in dirname in all sub-dirs for a file
     suiteConfig and expects a variable 'testSuite' in this file. It
@@ -1054,38 +2102,39 @@ class TestCollector(object):
         self.__noConfigurationFound = []
         self.__noSuiteFound = []
         self.testRunner = TextTestRunner(verbosity=1)
+        self.loader = SuiteDefinitionLoader(suiteConfig, suiteName)
 
     def collect(self):
         items = os.listdir(self.dirname)
+        items.sort()
         for item in items:
-            if not item in self.filterDirs:
-                currentItem = os.path.join(self.dirname, item)
-                if os.path.isdir(currentItem):
-                    subDir = os.path.join(self.dirname, item)
-                    if os.path.exists(os.path.join(subDir, self.suiteConfig)):
-                        # found the right file
-                        globalsDict = {"__name__": "systemTest"}
-                        oldDir = os.getcwd()
-                        os.chdir(subDir)
-                        execfile(self.suiteConfig, globalsDict)
-                        os.chdir(oldDir)
-                        if globalsDict.has_key(self.suiteName):
-                            self.masterSuite.addTest(globalsDict[self.suiteName])
-                        else:
-                            output.writeErr("Warning: Didn't find " + self.suiteName + " in: ")
-                            output.writeErr(os.path.join(subDir, self.suiteConfig) + "\n")
-                            self.__noSuiteFound.append(subDir)
-                    else:
-                        output.writeErr("Warning: No configuration named ")
-                        output.writeErr(self.suiteConfig + " in: ")
-                        output.writeErr(os.path.join(subDir, self.suiteConfig) + "\n")
-                        self.__noConfigurationFound.append(subDir)
+            if item in self.filterDirs:
+                continue
+            subDir = os.path.join(self.dirname, item)
+            if not os.path.isdir(subDir):
+                output.stderr.write("Warning: " + item + " is not a directory.\n")
+                output.stderr.write("You should only have directories here.\n")
+            elif self.loader.hasSuiteConfig(subDir):
+                # found the right file
+                suite = self.loader.load(subDir)
+                if suite != None:
+                    self.masterSuite.addTest(suite)
                 else:
-                    output.stderr.write("Warning: " + item + " is not a directory.\n")
-                    output.stderr.write("You should only have directories here.\n")
+                    output.writeErr("Warning: Didn't find " + self.suiteName + " in: ")
+                    output.writeErr(os.path.join(subDir, self.suiteConfig) + "\n")
+                    self.__noSuiteFound.append(subDir)
+            else:
+                output.writeErr("Warning: No configuration named ")
+                output.writeErr(self.suiteConfig + " in: ")
+                output.writeErr(os.path.join(subDir, self.suiteConfig) + "\n")
+                self.__noConfigurationFound.append(subDir)
+
+        if verbosity > 1:
+            self.loader.writeTimings(output.stderr)
 
 
     def run(self):
+        startExternalPrograms(self.masterSuite)
         status = self.testRunner.run(self.masterSuite)
         if(len(self.__noSuiteFound) > 0):
             output.stderr.write("\nWarning: You had " + str(len(self.__noSuiteFound)) + " configurations")
@@ -1110,7 +2159,30 @@ class SystemTestCollector(object):
     """
     def __init__(self,
                  suiteConfig = "systemTest.py",
-                 suiteName = "testSuite"):
+                 suiteName = "testSuite",
+                 timingsFile = None,
+                 failFast = False,
+                 maxFailures = None,
+                 launcher = None,
+                 jobs = None,
+                 memory = None,
+                 pinCPUs = True):
+        """
+        failFast: stop the remaining simulation of a suite as soon as
+        one failed (may be overridden per suite)
+
+        maxFailures: cancel all suites not yet started after this
+        number of failed tests (None: run everything)
+
+        launcher: default launcher of the simulations (see module
+        Launcher, may be overridden per suite)
+
+        jobs, memory, pinCPUs: number of subprocesses (simulations
+        and external programs) that may run at the same time, their
+        memory budget in MB and whether to pin them to CPUs. If jobs is
+        None the job server of this process is left as it is (see
+        module JobServer).
+        """
         super(SystemTestCollector, self).__init__()
         self.suiteConfig = suiteConfig
         self.suiteName = suiteName
@@ -1118,17 +2190,76 @@ class SystemTestCollector(object):
         self.__noConfigurationFound = []
         self.__noSuiteFound = []
         self.testRunner = TextTestRunner(verbosity=1)
+        self.testRunner.failFast = failFast
+        self.testRunner.maxFailures = maxFailures
+        self.testRunner.launcher = launcher
+        if jobs != None:
+            pywns.JobServer.configure(jobs, memory, pinCPUs)
+        self.loader = SuiteDefinitionLoader(suiteConfig, suiteName)
+        self.timings = SuiteTimings(timingsFile)
+        # (key, suite) of all suites loaded by setTests
+        self.suites = []
+        self.__extraTests = []
+        # set by run()
+        self.results = None
+
+    def getKey(self, test):
+        """ The key identifies a system test in the timing history
+        """
+        return os.path.normpath(test.getDir())
+
+    def selectTests(self, tests, patterns):
+        """ Return the tests whose key matches any of the (shell
+        style) patterns. All tests are returned if patterns is empty.
+        """
+        if len(patterns) == 0:
+            return tests
+        selected = []
+        for test in tests:
+            for pattern in patterns:
+                if fnmatch.fnmatch(self.getKey(test), pattern):
+                    selected.append(test)
+                    break
+        return selected
+
+    def shardTests(self, tests, index, count):
+        """ Return the tests of shard 'index' (0 <= index < count)
+
+        The tests are distributed to the shards longest first, each
+        test going to the shard with the least total duration so far
+        (according to the timing history). The result does only depend
+        on the tests and the history, so each shard can be computed
+        independently on a different machine.
+        """
+        if not 0 <= index < count:
+            raise ValueError("Shard index " + str(index) + " not in [0, " + str(count) + ")")
+        keys = [self.getKey(test) for test in tests]
+        durations = self.timings.getDurations(keys)
+        load = [0.0] * count
+        shards = [[] for ii in range(count)]
+        for ii in self.__getLongestFirstOrder(keys, durations):
+            shard = load.index(min(load))
+            load[shard] += durations[ii]
+            shards[shard].append(ii)
+        return [tests[ii] for ii in shards[index]]
+
+    def orderTests(self, tests):
+        """ Return the tests ordered longest first according to the
+        timing history (tests without history are assumed to take the
+        mean duration). Starting the long suites first avoids a long
+        tail when the suites are run in parallel.
+        """
+        keys = [self.getKey(test) for test in tests]
+        durations = self.timings.getDurations(keys)
+        return [tests[ii] for ii in self.__getLongestFirstOrder(keys, durations)]
 
     def setTests(self, tests):
         for test in tests:
-            if os.path.exists(os.path.join(test.getDir(), self.suiteConfig)):
-                globalsDict =  {"__name__": "systemTest"}
-                oldDir = os.getcwd()
-                os.chdir(test.getDir())
-                execfile(self.suiteConfig, globalsDict)
-                os.chdir(oldDir)
-                if globalsDict.has_key(self.suiteName):
-                    self.masterSuite.addTest(globalsDict[self.suiteName])
+            if self.loader.hasSuiteConfig(test.getDir()):
+                suite = self.loader.load(test.getDir())
+                if suite != None:
+                    self.masterSuite.addTest(suite)
+                    self.suites.append((self.getKey(test), suite))
                 else:
                     output.writeErr("Warning: Didn't find " + self.suiteName + " in: ")
                     output.writeErr(os.path.join(test.getDir(), self.suiteConfig) + "\n")
@@ -1139,7 +2270,11 @@ class SystemTestCollector(object):
                 output.writeErr(os.path.join(test.getDir(), self.suiteConfig) + "\n")
                 self.__noConfigurationFound.append(test.getDir())
 
+        if verbosity > 1:
+            self.loader.writeTimings(output.stderr)
+
     def run(self):
+        startExternalPrograms(self.masterSuite)
         status = self.testRunner.run(self.masterSuite)
         if(len(self.__noSuiteFound) > 0):
             output.stderr.write("\nWarning: You had " + str(len(self.__noSuiteFound)) + " configurations")
@@ -1152,10 +2287,62 @@ class SystemTestCollector(object):
             output.stderr.write(" withtout a config file (" + self.suiteConfig +  "):\n")
             output.stderr.write("         (No tests will be run here)\n         ")
             output.stderr.write("         ".join([ii + "\n" for ii in self.__noConfigurationFound]))
+
+        self.results = TestResults(status, self.suites)
+        for key, suite in self.suites:
+            durations = getSuiteDurations(suite)
+            if len(durations) > 0:
+                self.results.timings[key] = durations
+                self.timings.update(key, durations)
+        if self.timings.filename != None:
+            self.timings.write()
         return status
 
+    def execute(self, executor):
+        """ Run the system tests by executor (see module Executor, e.g.
+        on worker hosts) instead of in this process. Tests added by
+        addTest are run here. Returns the merged TestResults.
+        """
+        import pywns.Executor
+        localResults = []
+        if len(self.__extraTests) > 0:
+            suite = TestSuite()
+            for test in self.__extraTests:
+                suite.addTest(test)
+            startExternalPrograms(suite)
+            localResults.append(TestResults(self.testRunner.run(suite)))
+        tasks = [pywns.Executor.Task(key, self.suiteConfig, self.suiteName) for key, suite in self.suites]
+        taskResults = executor.run(tasks)
+        for taskResult in taskResults:
+            output.writeErr(taskResult.task.dirname + " (" + taskResult.host + "): ")
+            if taskResult.wasSuccessful():
+                output.writeErr("OK\n")
+            else:
+                output.writeErr("FAILED\n")
+        self.results = TestResults.merge(localResults + [result.getTestResults() for result in taskResults])
+        for key, durations in self.results.timings.items():
+            self.timings.update(key, durations)
+        if self.timings.filename != None:
+            self.timings.write()
+        self.results.writeSummary(output.stderr)
+        return self.results
+
+    def writeResults(self, filename):
+        """ Write the results of the last run in a format that can be
+        merged with the results of other shards (see TestResults.merge)
+        """
+        self.results.write(filename)
+
+    # private stuff
+
+    def __getLongestFirstOrder(self, keys, durations):
+        order = range(len(keys))
+        order.sort(lambda a, b: cmp(durations[b], durations[a]) or cmp(keys[a], keys[b]))
+        return order
+
     def addTest(self, test):
         self.masterSuite.addTest(test)
+        self.__extraTests.append(test)
 
         
 
@@ -1165,45 +2352,156 @@ class ExternalProgram(TestCase):
     Parameters:
     dirname: where to execute the program
     command: the command to be executed
+    tailLines: number of lines of stdout/stderr kept in memory for the
+    error message (the complete output is written to stdout.log and
+    stderr.log in dirname)
+    streamOutput: if True, the output is also written to the console
+    (prefixed by the description)
+    timeout: the program is terminated (and the test fails) if it
+    runs longer than this (seconds, None: no limit)
 
     Test works as follows:
-    1) Change into the dir
-    2) Run the program
-    3) Change back to old dir
-    4) Check status code
+    1) Run the program in dirname (if not already started by start(),
+       waiting for a free job slot, see module JobServer)
+    2) Wait for the program to finish
+    3) Check status code
     """
 
-    def __init__(self, dirname, command, description, includeStdOut = False, *args, **kwds):
+    outputLock = threading.Lock()
+    """ serializes streaming to the console """
+
+    def __init__(self, dirname, command, description, includeStdOut = False,
+                 tailLines = 200, streamOutput = False, memory = 0, timeout = None, *args, **kwds):
         super(ExternalProgram, self).__init__(*args, **kwds)
         self.command = command
-        self.dirname = dirname
+        # absolute: the program is started in a thread of its own, while
+        # the current directory may be changed by system test suites
+        self.dirname = os.path.abspath(dirname)
+        self.__givenDirname = dirname
         self.description = description
         self.includeStdOut = includeStdOut
+        self.streamOutput = streamOutput
+        self.memory = memory
+        self.stdout = RingBuffer(tailLines)
+        self.stderr = RingBuffer(tailLines)
+        self.timeout = timeout
+        self.status = None
+        # the exception if the program could not be run
+        self.error = None
+        self.__thread = None
+        self.__process = None
+        self.__cancelled = False
 
 
     def shortDescription(self):
-        return self.dirname + ": " + self.description
+        return self.__givenDirname + ": " + self.description
+
+
+    def start(self):
+        """ Run the program in the background (does nothing if it has
+        already been started)
+        """
+        if self.__thread == None:
+            self.__thread = threading.Thread(target = self.__run)
+            self.__thread.setDaemon(True)
+            self.__thread.start()
+
+
+    def wait(self, timeout = None):
+        """ Wait until the program has finished and return its status.
+        Returns None if it is still running after timeout seconds.
+        """
+        self.start()
+        deadline = None
+        if timeout != None:
+            deadline = time.time() + timeout
+        # join with timeout, otherwise KeyboardInterrupt is not delivered
+        while self.__thread.isAlive():
+            if deadline != None and time.time() >= deadline:
+                return None
+            self.__thread.join(0.5)
+        return self.status
+
+
+    def cancel(self):
+        """ Terminate the program (or prevent it from being started)
+        """
+        self.__cancelled = True
+        process = self.__process
+        if process != None and process.poll() == None:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except OSError:
+                pass
 
 
     def runTest(self):
-        oldDir = os.getcwd()
-        os.chdir(self.dirname)
-        stdout = "stdout.log"
-        stderr = "stderr.log"
-        process = subprocess.Popen(self.command, shell=True, stdout=open(stdout, "w"), stderr=open(stderr, "w"))
-        status = process.wait()
-        os.chdir(oldDir)
+        try:
+            status = self.wait(self.timeout)
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        if self.error != None:
+            self.fail("'" + self.command + "' could not be run in " + self.dirname + ": " + str(self.error))
+        if status == None and self.__cancelled and self.__process == None:
+            self.fail("'" + self.command + "' was cancelled before it was started")
+        if status == None:
+            self.cancel()
+            self.wait()
+            self.fail("'" + self.command + "' did not finish within " + str(self.timeout) + " s")
 
         errorMessage  = "'" + self.command + "' failed.\n"
         if self.includeStdOut == True:
             errorMessage += "stdout\n"
             errorMessage += "----------------------------------------------------------------------\n"
-            errorMessage += file(os.path.join(self.dirname, stdout)).read()
+            errorMessage += self.stdout.getvalue()
             errorMessage += "\n"
 
         errorMessage += "stderr\n"
         errorMessage += "----------------------------------------------------------------------\n"
-        errorMessage += file(os.path.join(self.dirname, stderr)).read()
+        errorMessage += self.stderr.getvalue()
+
 
+        self.assertEqual(0, self.status, errorMessage)
 
-        self.assertEqual(0, status, errorMessage)
+    # private stuff
+
+    def __run(self):
+        jobServer = pywns.JobServer.getJobServer()
+        job = jobServer.acquire(self.memory)
+        try:
+            if self.__cancelled:
+                return
+            try:
+                # own process group, so that cancel reaches the whole command
+                process = subprocess.Popen(job.getCommandPrefix() + self.command, shell=True, cwd=self.dirname,
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                           preexec_fn=os.setsid)
+            except (OSError, ValueError), e:
+                # reported by runTest
+                self.error = e
+                return
+            self.__process = process
+            readers = [threading.Thread(target = self.__read, args = (process.stdout, self.stdout, "stdout.log")),
+                       threading.Thread(target = self.__read, args = (process.stderr, self.stderr, "stderr.log"))]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+            self.status = process.wait()
+        finally:
+            jobServer.release(job)
+
+    def __read(self, pipe, buffer, logName):
+        log = open(os.path.join(self.dirname, logName), "w")
+        for line in iter(pipe.readline, ""):
+            log.write(line)
+            buffer.append(line)
+            if self.streamOutput:
+                ExternalProgram.outputLock.acquire()
+                try:
+                    output.stdout.write("[" + self.description + "] " + line)
+                finally:
+                    ExternalProgram.outputLock.release()
+        log.close()
+        pipe.close()
@@ -26,13 +26,166 @@
 ##############################################################################
 
 import sys
+import os
 from wnsbase.playground.Tools import *
-import pywns.MemCheck
-import pywns.WNSUnit
+# pywns.WNSUnit, pywns.MemCheck etc. are imported by the commands when
+# they run, so other playground commands don't pay for loading them
 
 import wnsbase.playground.Core
 core = wnsbase.playground.Core.getCore()
 
+def addSystemTestOptions(command, suiteConfig):
+    """ Options shared by the commands running system test suites
+    """
+    command.addOption("", "--select",
+                      type="string", dest = "select", default = "",
+                      help = "A (comma separated) list of shell style patterns. Only system tests with a matching directory are run (e.g.: '*WiFi*')")
+
+    command.addOption("", "--shard",
+                      type="string", dest = "shard", default = "",
+                      help = "Run only shard i of N (e.g. '--shard 2/4'). Shards are balanced using the timing history")
+
+    command.addOption("", "--timings-file",
+                      type="string", dest = "timingsFile", default = "",
+                      help = "File with the timing history of the system tests (default : one per checkout in ~/.openwns/cache)")
+
+    command.addOption("", "--fail-fast",
+                      action="store_true", dest = "failFast", default = False,
+                      help = "Don't start the second simulation of a suite if the first failed and stop after the first failed test (unless --max-failures is given)")
+
+    command.addOption("", "--max-failures",
+                      type="int", dest = "maxFailures", default = None,
+                      help = "Cancel the remaining suites after this number of failed tests")
+
+    command.addOption("", "--launcher",
+                      type="string", dest = "launcher", default = "direct",
+                      help = "Launch the simulations by: direct, valgrind[:tool], perf[:event,...] or time (default : direct)")
+
+    command.addOption("", "--jobs",
+                      type="int", dest = "jobs", default = 1,
+                      help = "Number of programs (simulations and unit tests) to run at the same time (default : 1)")
+
+    command.addOption("", "--memory-budget",
+                      type="int", dest = "memoryBudget", default = None,
+                      help = "Memory budget in MB of all programs running at the same time (default : unlimited)")
+
+    command.addOption("", "--no-pin-cpus",
+                      action="store_false", dest = "pinCPUs", default = True,
+                      help = "Don't pin parallel programs to CPUs of their own")
+
+    command.addOption("", "--stream-output",
+                      action="store_true", dest = "streamOutput", default = False,
+                      help = "Write the output of the unit test programs to the console")
+
+    command.addOption("", "--workers",
+                      type="string", dest = "workers", default = "",
+                      help = "A (comma separated) list of workers (host:port, started by 'pywns/Executor.py worker') to run the system tests on")
+
+    command.addOption("", "--results-file",
+                      type="string", dest = "resultsFile", default = "",
+                      help = "Write the results to this file. Files of several shards can be combined by 'mergetestresults'")
+
+    addTimingOptions(command)
+
+def addTimingOptions(command):
+    """ Options to report the durations of the tests and suite phases
+    """
+    command.addOption("", "--junit-xml",
+                      type="string", dest = "junitXML", default = "",
+                      help = "Write the results with the durations of the tests and suite phases as JUnit XML to this file")
+
+    command.addOption("", "--slowest",
+                      type="int", dest = "slowest", default = 0,
+                      help = "Print the N slowest suite phases (simulation, probeRead, testGeneration, tests) and tests (default : 0)")
+
+def reportTimings(options, results):
+    if options.junitXML != "":
+        results.writeJUnitXML(options.junitXML)
+    if options.slowest > 0:
+        results.writeSlowest(sys.stdout, options.slowest)
+
+def parseShard(shard):
+    """ Parse 'i/N' and return (i-1, N)
+    """
+    if shard == "":
+        return (0, 1)
+    try:
+        index, count = [int(ii) for ii in shard.split("/")]
+    except ValueError:
+        print "Error! Expected '--shard i/N', got '" + shard + "'. Giving up"
+        sys.exit(1)
+    if not 1 <= index <= count:
+        print "Error! Shard " + shard + " does not exist. Giving up"
+        sys.exit(1)
+    return (index - 1, count)
+
+def createSystemTestCollector(options, suiteConfig):
+    import pywns.WNSUnit
+    import pywns.DataFile
+    import wnsbase.playground.Project
+
+    tests = []
+    for project in core.getProjects().all:
+        if isinstance(project, wnsbase.playground.Project.SystemTest):
+            tests.append(project)
+
+    maxFailures = options.maxFailures
+    if options.failFast and maxFailures == None:
+        maxFailures = 1
+
+    import pywns.Launcher
+    try:
+        launcher = pywns.Launcher.createLauncher(options.launcher)
+    except ValueError, e:
+        print "Error! " + str(e) + ". Giving up"
+        sys.exit(1)
+
+    timingsFile = options.timingsFile
+    if timingsFile == "":
+        # keep the history out of the source tree
+        timingsFile = pywns.DataFile.getCacheFilename(suiteConfig, ".timings")
+
+    testCollector = pywns.WNSUnit.SystemTestCollector(suiteConfig = suiteConfig,
+                                                      suiteName = "testSuite",
+                                                      timingsFile = timingsFile,
+                                                      failFast = options.failFast,
+                                                      maxFailures = maxFailures,
+                                                      launcher = launcher,
+                                                      jobs = options.jobs,
+                                                      memory = options.memoryBudget,
+                                                      pinCPUs = options.pinCPUs)
+    patterns = [ ii.strip() for ii in options.select.split(',') if ii.strip() != "" ]
+    index, count = parseShard(options.shard)
+    tests = testCollector.selectTests(tests, patterns)
+    tests = testCollector.shardTests(tests, index, count)
+    # run the long suites first
+    testCollector.setTests(testCollector.orderTests(tests))
+    return testCollector
+
+def runSystemTestCollector(options, testCollector):
+    import pywns.WNSUnit
+    pywns.WNSUnit.verbosity = 2
+
+    # you can get the beast even more verbose by enabling this:
+    # testCollector.testRunner.verbosity = 2
+
+    print "Starting test suites ..."
+    print "NOTE: you may see slow progress since the tests run simulations"
+
+    workers = [ ii.strip() for ii in options.workers.split(',') if ii.strip() != "" ]
+    if len(workers) > 0:
+        import pywns.Executor
+        result = testCollector.execute(pywns.Executor.RemoteExecutor(workers))
+    else:
+        result = testCollector.run()
+    if options.resultsFile != "":
+        testCollector.writeResults(options.resultsFile)
+    reportTimings(options, testCollector.results)
+    if (len(result.errors) == 0) and (len(result.failures) == 0):
+        sys.exit(0)
+    else:
+        sys.exit(1)
+
 class RunTestsCommand(wnsbase.playground.plugins.Command.Command):
 
     def __init__(self):
@@ -44,55 +197,43 @@ class RunTestsCommand(wnsbase.playground.plugins.Command.Command):
         usage += """
 Runs all the tests. This includes unittests for both Python and C++
 and the system tests.
+
+The system tests can be restricted by --select and split into shards
+(--shard i/N) in order to run them on several machines. The unittests
+are only run in the first shard and only if no --select is given.
 """
         wnsbase.playground.plugins.Command.Command.__init__(self, "runtests", rationale, usage)
 
         self.addOption("", "--executable",
                        type="string", dest = "executable", default = "./openwns",
                        help = "The executable that is to be called (default : \"./openwns\")")
+        addSystemTestOptions(self, "systemTest.py")
+
     def run(self):
-        # create test collector
         import pywns.WNSUnit
-        import wnsbase.playground.Project
-
-        tests = []
-        for project in core.getProjects().all:
-            if isinstance(project, wnsbase.playground.Project.SystemTest):
-                tests.append(project)
-
-        testCollector = pywns.WNSUnit.SystemTestCollector(suiteConfig = "systemTest.py",
-                                                          suiteName = "testSuite")
-        testCollector.setTests(tests)
-
-        # Add PyConfig unit tests
-        pyUnit = pywns.WNSUnit.ExternalProgram(dirname = "tests/unit/PythonUnitTests/",
-                                               command = "./runPythonUnitTests.py -v",
-                                               description = "PyConfig Unit Tests",
-                                               includeStdOut = True)
-        testCollector.addTest(pyUnit)
-
-
-        # Add C++ unit tests
+        # create test collector
+        testCollector = createSystemTestCollector(self.options, "systemTest.py")
 
-        cppUnit = pywns.WNSUnit.ExternalProgram(dirname = "tests/unit/unitTests/",
-                                                command = self.options.executable + " -f config.py -t -y'WNS.masterLogger.backtrace.enabled=True'",
-                                                description = "C++ unit tests",
-                                                includeStdOut = True)
-        testCollector.addTest(cppUnit)
+        if self.options.select == "" and parseShard(self.options.shard)[0] == 0:
+            # Add PyConfig unit tests
+            pyUnit = pywns.WNSUnit.ExternalProgram(dirname = "tests/unit/PythonUnitTests/",
+                                                   command = "./runPythonUnitTests.py -v",
+                                                   description = "PyConfig Unit Tests",
+                                                   includeStdOut = True,
+                                                   streamOutput = self.options.streamOutput)
+            testCollector.addTest(pyUnit)
 
-        pywns.WNSUnit.verbosity = 2
 
-        # you can get the beast even more verbose by enabling this:
-        # testCollector.testRunner.verbosity = 2
+            # Add C++ unit tests
 
-        print "Starting test suites ..."
-        print "NOTE: you may see slow progress since the tests run simulations"
+            cppUnit = pywns.WNSUnit.ExternalProgram(dirname = "tests/unit/unitTests/",
+                                                    command = self.options.executable + " -f config.py -t -y'WNS.masterLogger.backtrace.enabled=True'",
+                                                    description = "C++ unit tests",
+                                                    includeStdOut = True,
+                                                    streamOutput = self.options.streamOutput)
+            testCollector.addTest(cppUnit)
 
-        result = testCollector.run()
-        if (len(result.errors) == 0) and (len(result.failures) == 0):
-            sys.exit(0)
-        else:
-            sys.exit(1)
+        runSystemTestCollector(self.options, testCollector)
 
 class RunLongTestsCommand(wnsbase.playground.plugins.Command.Command):
 
@@ -104,38 +245,144 @@ class RunLongTestsCommand(wnsbase.playground.plugins.Command.Command):
 
         usage += """
 Runs all the tests in the long test suite.
+
+The tests can be restricted by --select and split into shards
+(--shard i/N) in order to run them on several machines.
 """
         wnsbase.playground.plugins.Command.Command.__init__(self, "runlongtests", rationale, usage)
 
         self.addOption("", "--executable",
                        type="string", dest = "executable", default = "./openwns",
                        help = "The executable that is to be called (default : \"./openwns\")")
+        addSystemTestOptions(self, "systemLongTest.py")
+
     def run(self):
         # create test collector
+        testCollector = createSystemTestCollector(self.options, "systemLongTest.py")
+        runSystemTestCollector(self.options, testCollector)
+
+class MergeTestResultsCommand(wnsbase.playground.plugins.Command.Command):
+
+    def __init__(self):
+        usage = "\n%prog mergetestresults --results-files FILE1,FILE2,...\n\n"
+        rationale = "Combine the results of sharded test runs."
+
+        usage += rationale
+
+        usage += """
+Reads the files written by 'runtests --results-file' or 'runlongtests
+--results-file' (e.g. of several shards), prints a summary of all
+errors and failures and updates the timing history.
+"""
+        wnsbase.playground.plugins.Command.Command.__init__(self, "mergetestresults", rationale, usage)
+
+        self.addOption("", "--results-files",
+                       type="string", dest = "resultsFiles", default = "",
+                       help = "A (comma separated) list of results files")
+
+        self.addOption("", "--timings-file",
+                       type="string", dest = "timingsFile", default = "",
+                       help = "Update this timing history with the durations found in the results")
+
+        addTimingOptions(self)
+
+    def run(self):
+        import pywns.WNSUnit
+        resultsFiles = [ ii.strip() for ii in self.options.resultsFiles.split(',') if ii.strip() != "" ]
+        if len(resultsFiles) == 0:
+            print "Error! No results files given. Giving up"
+            sys.exit(1)
+
+        results = pywns.WNSUnit.TestResults.merge(
+            [pywns.WNSUnit.TestResults.read(ii) for ii in resultsFiles])
+
+        if self.options.timingsFile != "":
+            timings = pywns.WNSUnit.SuiteTimings(self.options.timingsFile)
+            for key, durations in results.timings.items():
+                timings.update(key, durations)
+            timings.write()
+
+        results.writeSummary(sys.stdout)
+        reportTimings(self.options, results)
+        if results.wasSuccessful():
+            sys.exit(0)
+        else:
+            sys.exit(1)
+
+class RebaselineCommand(wnsbase.playground.plugins.Command.Command):
+
+    def __init__(self):
+        usage = "\n%prog rebaseline [--select PATTERNS]\n\n"
+        rationale = "Promote the output of the system tests to their reference output."
+
+        usage += rationale
+
+        usage += """
+Makes output_dbg_<config> (or output_opt_<config>) the new
+referenceOutput_<config> of all system test suites (or those selected
+by --select). The files are deduplicated in the reference store and the
+reference directories are replaced atomically by hardlinks to the
+store. Several suites are promoted at the same time.
+
+For each suite a summary is printed: the number of changed, added and
+removed files and the statistic of the probes that changed most.
+"""
+        wnsbase.playground.plugins.Command.Command.__init__(self, "rebaseline", rationale, usage)
+
+        self.addOption("", "--select",
+                       type="string", dest = "select", default = "",
+                       help = "A (comma separated) list of shell style patterns. Only system tests with a matching directory are rebaselined (e.g.: '*WiFi*')")
+
+        self.addOption("", "--flavour",
+                       type="choice", choices = ["dbg", "opt"], dest = "flavour", default = "dbg",
+                       help = "Promote the output of this flavour: dbg or opt (default : dbg)")
+
+        self.addOption("", "--long",
+                       action="store_true", dest = "long", default = False,
+                       help = "Rebaseline the 'long' test suites (systemLongTest.py)")
+
+        self.addOption("", "--jobs",
+                       type="int", dest = "jobs", default = 4,
+                       help = "Number of suites to promote at the same time (default : 4)")
+
+        self.addOption("", "--dry-run",
+                       action="store_true", dest = "dryRun", default = False,
+                       help = "Only print the differences, don't change the reference output")
+
+    def run(self):
         import pywns.WNSUnit
+        import pywns.ReferenceStore
         import wnsbase.playground.Project
 
+        suiteConfig = "systemTest.py"
+        if self.options.long:
+            suiteConfig = "systemLongTest.py"
+
         tests = []
         for project in core.getProjects().all:
             if isinstance(project, wnsbase.playground.Project.SystemTest):
                 tests.append(project)
 
-        testCollector = pywns.WNSUnit.SystemTestCollector(suiteConfig = "systemLongTest.py",
-                                                          suiteName = "testSuite")
-        testCollector.setTests(tests)
-
-        pywns.WNSUnit.verbosity = 2
-
-        # you can get the beast even more verbose by enabling this:
-        # testCollector.testRunner.verbosity = 2
-
-        print "Starting test suites ..."
-        print "NOTE: you may see slow progress since the tests run simulations"
+        collector = pywns.WNSUnit.SystemTestCollector(suiteConfig = suiteConfig, suiteName = "testSuite")
+        patterns = [ ii.strip() for ii in self.options.select.split(',') if ii.strip() != "" ]
+        collector.setTests(collector.selectTests(tests, patterns))
+
+        entries = []
+        for key, suite in collector.suites:
+            for systemTestSuite in pywns.WNSUnit.getSystemTestSuites(suite):
+                for source, target in systemTestSuite.getReferencePairs(self.options.flavour):
+                    if not os.path.isdir(source):
+                        print "Warning: " + key + " has no " + os.path.basename(source) + ", skipped"
+                        continue
+                    entries.append((key + " (" + os.path.basename(target) + ")", source, target))
+
+        if len(entries) == 0:
+            print "Error! No output to promote. Giving up"
+            sys.exit(1)
 
-        result = testCollector.run()
-        if (len(result.errors) == 0) and (len(result.failures) == 0):
-            sys.exit(0)
-        else:
+        failed = pywns.ReferenceStore.rebaseline(entries, self.options.jobs, self.options.dryRun)
+        if failed > 0:
+            print "Error! %d promotions failed" % failed
             sys.exit(1)
 
 class MemcheckCommand(wnsbase.playground.plugins.Command.Command):
@@ -152,6 +399,15 @@ memory leaks or memory access errors. Upstream patches must be free of any
 memory errors.
 Note that with this command certain errors from third party libraries are
 suppressed since these are out our of control.
+
+With --jobs N (N > 1) each unit test suite is run in a valgrind process
+of its own, N of them at the same time. The logs are written to
+tests/unit/unitTests/memcheck and summarized at the end.
+
+With --xml the findings are read from valgrind's XML output,
+deduplicated by their stack and summarized by bytes lost per call site.
+Use --write-baseline to record the current findings and --baseline to
+fail only for findings not in that baseline.
 """
         wnsbase.playground.plugins.Command.Command.__init__(self, "memcheck", rationale, usage)
 
@@ -163,12 +419,243 @@ suppressed since these are out our of control.
                        type="string", dest = "suppressions", default = "",
                        help = "A (comma separated) list of valgrind suppression files (e.g.: /usr/lib/valgrind/python.supp)")
 
+        self.addOption("", "--jobs",
+                       type="int", dest = "jobs", default = 1,
+                       help = "Number of valgrind processes to run in parallel, one per unit test suite (default : 1, all suites in one process)")
+
+        self.addOption("", "--timeout",
+                       type="float", dest = "timeout", default = None,
+                       help = "Kill a valgrind process after this number of seconds (only with --jobs > 1)")
+
+        self.addOption("", "--suites",
+                       type="string", dest = "suites", default = "",
+                       help = "A (comma separated) list of unit test suites (default: all suites, listed by the executable)")
+
+        self.addOption("", "--xml",
+                       action="store_true", dest = "xml", default = False,
+                       help = "Read the findings from valgrind's XML output and summarize them")
+
+        self.addOption("", "--baseline",
+                       type="string", dest = "baseline", default = "",
+                       help = "Only findings not in this baseline file are errors (implies --xml)")
+
+        self.addOption("", "--write-baseline",
+                       type="string", dest = "writeBaseline", default = "",
+                       help = "Write the findings of this run to a baseline file (implies --xml)")
+
     def run(self):
+        import pywns.MemCheck
+        import pywns.JobServer
         suppressionsFileList = []
         if not self.options.suppressions == "":
             suppressionsFileList = [ ii.strip() for ii in self.options.suppressions.split(',') ]
-        r = pywns.MemCheck.Runner(args=[self.options.executable, "-tv"],
-                                  cwd="tests/unit/unitTests",
-                                  suppressions=suppressionsFileList)
-        returncode = r.run()
+
+        baseline = None
+        if self.options.baseline != "":
+            baseline = pywns.MemCheck.XMLReport.readBaseline(self.options.baseline)
+        xml = self.options.xml or baseline != None or self.options.writeBaseline != ""
+
+        if self.options.jobs > 1 or self.options.suites != "":
+            suites = None
+            if self.options.suites != "":
+                suites = [ ii.strip() for ii in self.options.suites.split(',') ]
+            # below a make the make hands out the job slots
+            if self.options.jobs > 1 and not pywns.JobServer.getJobServer().isParallel():
+                pywns.JobServer.configure(self.options.jobs)
+            r = pywns.MemCheck.ParallelRunner(executable=self.options.executable,
+                                              cwd="tests/unit/unitTests",
+                                              suites=suites,
+                                              jobs=self.options.jobs,
+                                              timeout=self.options.timeout,
+                                              xml=xml,
+                                              baseline=baseline,
+                                              suppressions=suppressionsFileList)
+            returncode = r.run()
+            report = r.report
+        else:
+            xmlFile = None
+            if xml:
+                xmlFile = os.path.abspath("tests/unit/unitTests/memcheck.xml")
+            r = pywns.MemCheck.Runner(args=[self.options.executable, "-tv"],
+                                      cwd="tests/unit/unitTests",
+                                      suppressions=suppressionsFileList,
+                                      xmlFile=xmlFile)
+            returncode = r.run()
+            report = pywns.MemCheck.XMLReport()
+            if xml:
+                report.parse(xmlFile)
+                report.writeSummary(sys.stdout, baseline)
+            if baseline != None:
+                if len(report.getNewFindings(baseline)) > 0:
+                    returncode = r.errorExitCode
+                elif returncode == r.errorExitCode:
+                    # known findings only
+                    returncode = 0
+
+        if self.options.writeBaseline != "":
+            report.writeBaseline(self.options.writeBaseline)
         sys.exit(returncode)
+
+class ValgrindProfileCommand(wnsbase.playground.plugins.Command.Command):
+    """ Common part of the commands profiling with valgrind
+    """
+
+    def __init__(self, name, rationale, usage, defaultOutFile):
+        wnsbase.playground.plugins.Command.Command.__init__(self, name, rationale, usage)
+
+        self.addOption("", "--executable",
+                       type="string", dest = "executable", default = "./openwns",
+                       help = "The executable that is to be called (default : \"./openwns\")")
+
+        self.addOption("", "--dir",
+                       type="string", dest = "dir", default = "tests/unit/unitTests",
+                       help = "The directory to run the executable in (default : \"tests/unit/unitTests\")")
+
+        self.addOption("", "--config",
+                       type="string", dest = "config", default = "",
+                       help = "Run a simulation with this configuration file instead of the unit tests")
+
+        self.addOption("", "--out-file",
+                       type="string", dest = "outFile", default = defaultOutFile,
+                       help = "The file the profile is written to (relative to --dir, default : \"" + defaultOutFile + "\")")
+
+        self.addOption("", "--baseline",
+                       type="string", dest = "baseline", default = "",
+                       help = "Compare the profile to this (earlier) profile")
+
+        self.addOption("", "--tolerance",
+                       type="float", dest = "tolerance", default = 0.05,
+                       help = "Fail if the profile exceeds the baseline by more than this fraction (default : 0.05)")
+
+    def runProfiler(self, tool):
+        import pywns.MemCheck
+        if self.options.config != "":
+            args = [self.options.executable, "-f", self.options.config]
+        else:
+            args = [self.options.executable, "-tv"]
+        outFile = os.path.abspath(os.path.join(self.options.dir, self.options.outFile))
+        r = pywns.MemCheck.Runner(args=args,
+                                  cwd=self.options.dir,
+                                  tool=tool,
+                                  outFile=outFile)
+        returncode = r.run()
+        if returncode != 0:
+            print "Error! " + " ".join(args) + " failed under " + tool
+            sys.exit(returncode)
+        return outFile
+
+    def checkTolerance(self, change):
+        print "Change with respect to baseline: %+.2f%%" % (100.0 * change)
+        if change > self.options.tolerance:
+            print "Error! Tolerance of %.2f%% exceeded" % (100.0 * self.options.tolerance)
+            sys.exit(1)
+
+class MassifCommand(ValgrindProfileCommand):
+
+    def __init__(self):
+        usage = "\n%prog massif\n\n"
+        rationale = "Profile the heap usage of the unit tests (or a simulation) with massif."
+
+        usage += rationale
+
+        usage += """
+Runs the unittests (or with --config a simulation) under valgrind's heap
+profiler massif and prints the peak heap size and the allocation sites
+contributing to the peak. With --baseline the peak heap is compared to
+an earlier massif profile.
+"""
+        ValgrindProfileCommand.__init__(self, "massif", rationale, usage, "massif.out")
+
+    def run(self):
+        import pywns.MemCheck
+        profile = pywns.MemCheck.MassifProfile(self.runProfiler("massif"))
+        profile.writeSummary(sys.stdout)
+        if self.options.baseline != "":
+            self.checkTolerance(profile.compare(pywns.MemCheck.MassifProfile(self.options.baseline)))
+        sys.exit(0)
+
+class CallgrindCommand(ValgrindProfileCommand):
+
+    def __init__(self):
+        usage = "\n%prog callgrind\n\n"
+        rationale = "Profile the unit tests (or a simulation) with callgrind or cachegrind."
+
+        usage += rationale
+
+        usage += """
+Runs the unittests (or with --config a simulation) under valgrind's
+callgrind (or with --tool cachegrind under cachegrind) and prints the
+functions with the highest exclusive cost. With --baseline the total
+cost and the cost of the hot functions are compared to an earlier
+profile.
+"""
+        ValgrindProfileCommand.__init__(self, "callgrind", rationale, usage, "callgrind.out")
+
+        self.addOption("", "--tool",
+                       type="choice", choices = ["callgrind", "cachegrind"], dest = "tool", default = "callgrind",
+                       help = "callgrind or cachegrind (default : callgrind)")
+
+        self.addOption("", "--top",
+                       type="int", dest = "top", default = 20,
+                       help = "Number of functions to show (default : 20)")
+
+        self.addOption("", "--event",
+                       type="string", dest = "event", default = "Ir",
+                       help = "The event to sort by (default : Ir, instructions read)")
+
+    def run(self):
+        import pywns.MemCheck
+        profile = pywns.MemCheck.CallgrindProfile(self.runProfiler(self.options.tool))
+        profile.writeSummary(sys.stdout, self.options.top, self.options.event)
+        if self.options.baseline != "":
+            baseline = pywns.MemCheck.CallgrindProfile(self.options.baseline)
+            total, changes = profile.compare(baseline, self.options.top, self.options.event)
+            print "\nChange of the hot functions with respect to baseline:"
+            for change, cost, baselineCost, function in changes:
+                print "  %+9.2f%%  %14d  %14d  %s" % (100.0 * change, cost, baselineCost, function)
+            self.checkTolerance(total)
+        sys.exit(0)
+
+class ImportTimeCommand(wnsbase.playground.plugins.Command.Command):
+
+    lazyModules = ["pywns.WNSUnit", "pywns.MemCheck", "pywns.Probe", "pywns.Executor"]
+    """ must not be loaded when the plugin is imported """
+
+    def __init__(self):
+        usage = "\n%prog importtime\n\n"
+        rationale = "Check the time it takes to import the Testing plugin."
+
+        usage += rationale
+
+        usage += """
+Imports the Testing plugin in a fresh python several times and reports
+the fastest import and its slowest parts. Fails if the import takes
+longer than the budget or loads modules the commands import lazily
+(""" + ", ".join(self.lazyModules) + """).
+"""
+        wnsbase.playground.plugins.Command.Command.__init__(self, "importtime", rationale, usage)
+
+        self.addOption("", "--budget",
+                       type="float", dest = "budget", default = 0.1,
+                       help = "Import time budget in seconds (default : 0.1)")
+
+        self.addOption("", "--repeat",
+                       type="int", dest = "repeat", default = 5,
+                       help = "Number of imports to measure (default : 5)")
+
+    def run(self):
+        import pywns.ImportTime
+        pluginsDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path = [pluginsDir] + [os.path.abspath(ii) for ii in sys.path if ii != ""]
+        try:
+            importTime = pywns.ImportTime.measure("Testing", self.options.repeat, path = path)
+        except ImportError, e:
+            print "Error! " + str(e) + ". Giving up"
+            sys.exit(1)
+        importTime.writeSummary(sys.stdout)
+        violations = pywns.ImportTime.check(importTime, self.options.budget, self.lazyModules)
+        for violation in violations:
+            print "Error! " + violation
+        if len(violations) > 0:
+            sys.exit(1)
+        sys.exit(0)
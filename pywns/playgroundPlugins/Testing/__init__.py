@@ -39,9 +39,29 @@ if not core.hasPlugin("Testing"):
 
     memcheckCommand = Testing.MemcheckCommand()
 
+    mergetestresultsCommand = Testing.MergeTestResultsCommand()
+
+    massifCommand = Testing.MassifCommand()
+
+    callgrindCommand = Testing.CallgrindCommand()
+
+    importtimeCommand = Testing.ImportTimeCommand()
+
+    rebaselineCommand = Testing.RebaselineCommand()
+
     core.registerCommand(runtestsCommand)
 
     core.registerCommand(runlongtestsCommand)
 
     core.registerCommand(memcheckCommand)
 
+    core.registerCommand(mergetestresultsCommand)
+
+    core.registerCommand(massifCommand)
+
+    core.registerCommand(callgrindCommand)
+
+    core.registerCommand(importtimeCommand)
+
+    core.registerCommand(rebaselineCommand)
+
@@ -0,0 +1,146 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.Aggregation
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.Aggregation
+import pywns.DataFile
+
+def writeSeries(filename, samples):
+    f = file(filename, "w")
+    f.write("# x y\n")
+    for ii in xrange(samples):
+        f.write("%d %d\n" % (ii, ii))
+    f.close()
+
+class ReadColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, "series.dat")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def testCommentsWithinAChunk(self):
+        # neither the first nor the last line of a chunk is a comment
+        f = file(self.filename, "w")
+        for ii in xrange(100):
+            f.write("%d %d\n" % (ii, 2 * ii))
+            if ii % 10 == 5:
+                f.write("# restarted\n")
+        f.close()
+        xs = []
+        ys = []
+        for x, y in pywns.Aggregation.readColumns(self.filename, chunkSize = 64):
+            xs += list(x)
+            ys += list(y)
+        self.assertEqual(xs, [float(ii) for ii in xrange(100)])
+        self.assertEqual(ys, [2.0 * ii for ii in xrange(100)])
+
+    def testReaderClosedBeforeTheEnd(self):
+        f = file(self.filename, "w")
+        for ii in xrange(100):
+            f.write("%d %d\n" % (ii, ii))
+        f.close()
+        reader = pywns.Aggregation.readColumns(self.filename, chunkSize = 64)
+        dataFile = reader.file
+        x, y = reader.next()
+        reader.close()
+        self.assert_(dataFile.closed)
+        self.assertEqual(list(reader), [])
+
+
+class PreviewPyramidTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, "series.dat")
+        self.cacheDirectory = pywns.DataFile.cacheDirectory
+        pywns.DataFile.cacheDirectory = os.path.join(self.dirname, "cache")
+
+    def tearDown(self):
+        pywns.DataFile.cacheDirectory = self.cacheDirectory
+        shutil.rmtree(self.dirname)
+
+    def testShortSeries(self):
+        writeSeries(self.filename, 300)
+        pyramid = pywns.Aggregation.PreviewPyramid(self.filename, bucketSize = 64)
+        for resolution in [10, 100]:
+            level = pyramid.preview(resolution)
+            self.assertEqual(len(level), resolution)
+            self.assertEqual(sum(level.count), 300)
+        level = pyramid.preview(1000)
+        self.assertEqual(len(level), 300)
+        self.assertEqual(list(level.mean[:3]), [0.0, 1.0, 2.0])
+
+    def testLongSeries(self):
+        writeSeries(self.filename, 64 * 40)
+        pyramid = pywns.Aggregation.PreviewPyramid(self.filename, bucketSize = 64, fanout = 4)
+        self.assertEqual([len(level) for level in pyramid.levels], [40, 10, 3, 1])
+        self.assertEqual(len(pyramid.preview(10)), 10)
+        self.assertEqual(len(pyramid.preview(5)), 3)
+        self.assertEqual(pyramid.preview(1).maximum[0], 64 * 40 - 1)
+
+    def testPersistence(self):
+        writeSeries(self.filename, 64 * 40)
+        pywns.Aggregation.PreviewPyramid(self.filename, persistent = False)
+        self.failIf(os.path.exists(pywns.DataFile.cacheDirectory))
+        pyramid = pywns.Aggregation.PreviewPyramid(self.filename)
+        self.assertEqual(os.path.dirname(pyramid.previewFilename), pywns.DataFile.cacheDirectory)
+        self.failUnless(os.path.exists(pyramid.previewFilename))
+        self.assertEqual(os.listdir(self.dirname).count("series.dat.preview"), 0)
+        # now read from the cache, the data file is not read
+        readColumns = pywns.Aggregation.readColumns
+        def fail(*args):
+            self.fail("data file read")
+        pywns.Aggregation.readColumns = fail
+        try:
+            pyramid = pywns.Aggregation.PreviewPyramid(self.filename)
+        finally:
+            pywns.Aggregation.readColumns = readColumns
+        self.assertEqual(pyramid.samples, 64 * 40)
+        self.failUnless(pyramid.isUpToDate())
+        writeSeries(self.filename, 64 * 41)
+        self.failIf(pyramid.isUpToDate())
+        self.assertEqual(pywns.Aggregation.PreviewPyramid(self.filename).samples, 64 * 41)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.Campaign
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.Campaign
+from testProbe import writeProbe
+
+class LoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        for load in [0.5, 0.7]:
+            output = os.path.join(self.dirname, "load=%r" % load, "output")
+            os.makedirs(output)
+            writeProbe(os.path.join(output, "delay_Moments.dat"), "delay", Mean = 10 * load)
+            writeProbe(os.path.join(output, "delay_PDF.dat"), "delay")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def testLoad(self):
+        table, errors = pywns.Campaign.load(os.path.join(self.dirname, "*", "output"),
+                                            "*_Moments.dat")
+        self.assertEqual(errors, {})
+        self.assertEqual(table.getColumn("load"), [0.5, 0.7])
+        self.assertEqual(table.getColumn("mean"), [5.0, 7.0])
+        self.assertEqual([row["probe"] for row in table.where(load = 0.7).rows()], ["delay_Moments.dat"])
+
+    def testUnreadableDirectory(self):
+        missing = os.path.join(self.dirname, "load=0.9", "output")
+        table, errors = pywns.Campaign.load([os.path.join(self.dirname, "load=0.5", "output"),
+                                             missing], "*_Moments.dat")
+        self.assertEqual(len(table), 1)
+        self.assertEqual(errors.keys(), [missing])
+
+
+if __name__ == "__main__":
+    unittest.main()
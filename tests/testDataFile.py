@@ -0,0 +1,81 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.DataFile
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.DataFile
+import pywns.Probe
+import pywns.ReferenceStore
+
+from testProbe import writeProbe
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        # the reference store is kept in the root of the SDK
+        file(os.path.join(self.root, ".thisIsTheRootOfWNS"), "w").close()
+        self.output = os.path.join(self.root, "output")
+        self.reference = os.path.join(self.root, "reference")
+        os.mkdir(self.output)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def promote(self, mean):
+        """ Promote an output with one probe, keep only the manifest """
+        writeProbe(os.path.join(self.output, "delay_Moments.dat"), "delay", Mean = mean)
+        pywns.ReferenceStore.promote(self.output, self.reference)
+        if os.path.isdir(self.reference):
+            shutil.rmtree(self.reference)
+
+    def testRebaselineWithinASecond(self):
+        self.promote(2.5)
+        probes = pywns.Probe.readAllProbes(self.reference)
+        self.assertEqual(probes["delay_Moments.dat"].mean, 2.5)
+        stamp = pywns.DataFile.getStamp(os.path.join(self.reference, "delay_Moments.dat"))
+        self.promote(3.0)
+        probes = pywns.Probe.readAllProbes(self.reference)
+        self.assertEqual(probes["delay_Moments.dat"].mean, 3.0)
+        self.assertNotEqual(pywns.DataFile.getStamp(os.path.join(self.reference, "delay_Moments.dat")),
+                            stamp)
+
+
+if __name__ == "__main__":
+    unittest.main()
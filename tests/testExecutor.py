@@ -0,0 +1,192 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.Executor: a RemoteExecutor against a worker on this host
+
+The system tests run a stand-in simulator (a shell script) instead of
+openwns.
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.Executor
+
+simulator = """#!/bin/sh
+case "$*" in *fail*) echo "simulation failed" >&2; exit 3;; esac
+echo "simulation done"
+"""
+
+suiteConfig = """import pywns.WNSUnit
+testSuite = pywns.WNSUnit.SystemTestSuite(sandboxPath = %r, configFile = %r, shortDescription = %r)
+"""
+
+class NotifyingWorker(pywns.Executor.Worker):
+    """ Sets 'done' after running a task """
+
+    def __init__(self, *args, **kwargs):
+        super(NotifyingWorker, self).__init__(*args, **kwargs)
+        self.done = threading.Event()
+        runTask = self.executor.runTask
+        def notify(task):
+            try:
+                return runTask(task)
+            finally:
+                self.done.set()
+        self.executor.runTask = notify
+
+class DroppingWorker(pywns.Executor.Worker):
+    """ Answers pings, drops run requests once 'event' is set """
+
+    def __init__(self, event):
+        super(DroppingWorker, self).__init__(0)
+        self.event = event
+
+    def handle(self, connection):
+        try:
+            message = pywns.Executor.receiveMessage(connection)
+            if message.get("command") == "ping":
+                pywns.Executor.sendMessage(connection, {"status": "ok", "jobs": 1})
+            else:
+                # give the executor time to collect the other result
+                self.event.wait(60.0)
+                time.sleep(1.0)
+        finally:
+            connection.close()
+
+class WorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        sandbox = os.path.join(self.root, "sandbox")
+        for flavour in ["dbg", "opt"]:
+            os.makedirs(os.path.join(sandbox, flavour, "bin"))
+            filename = os.path.join(sandbox, flavour, "bin", "openwns")
+            f = file(filename, "w")
+            f.write(simulator)
+            f.close()
+            os.chmod(filename, 0755)
+        for name, configFile in [("okTest", "ok.py"), ("failTest", "fail.py")]:
+            os.makedirs(os.path.join(self.root, "tests", name))
+            f = file(os.path.join(self.root, "tests", name, "systemTest.py"), "w")
+            f.write(suiteConfig % (sandbox, configFile, name))
+            f.close()
+        self.worker = pywns.Executor.Worker(0, jobs = 2, root = self.root)
+        self.address = ("127.0.0.1", self.worker.port)
+        thread = threading.Thread(target = self.worker.serveForever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def tearDown(self):
+        self.worker.close()
+        shutil.rmtree(self.root)
+
+    def run_(self, *dirnames):
+        executor = pywns.Executor.RemoteExecutor(["127.0.0.1:%d" % self.worker.port], 60.0)
+        return executor.run([pywns.Executor.Task(dirname) for dirname in dirnames])
+
+    def testListensOnLoopback(self):
+        self.assertEqual(self.worker.socket.getsockname()[0], "127.0.0.1")
+
+    def testPing(self):
+        reply = pywns.Executor.request(self.address, {"command": "ping"}, 10.0)
+        self.assertEqual(reply, {"status": "ok", "jobs": 2})
+
+    def testUnknownCommand(self):
+        reply = pywns.Executor.request(self.address, {"command": "shutdown"}, 10.0)
+        self.assertEqual(reply["status"], "error")
+
+    def testSuccessfulRun(self):
+        result, = self.run_(os.path.join("tests", "okTest"))
+        self.assertEqual(result.error, None)
+        self.failUnless(result.wasSuccessful())
+        self.assertEqual(result.task.dirname, os.path.join("tests", "okTest"))
+        self.failUnless(result.results.testsRun > 0)
+        self.assertEqual(result.results.timings.keys(), [os.path.join("tests", "okTest")])
+
+    def testFailingSuite(self):
+        ok, fail = self.run_(os.path.join("tests", "okTest"), os.path.join("tests", "failTest"))
+        self.failUnless(ok.wasSuccessful())
+        self.assertEqual(fail.error, None)
+        self.failIf(fail.wasSuccessful())
+        self.failUnless(len(fail.results.failures) + len(fail.results.errors) > 0)
+
+    def testMissingDirectory(self):
+        result, = self.run_(os.path.join("tests", "noSuchTest"))
+        self.failIf(result.wasSuccessful())
+        self.failUnless("No systemTest.py in" in result.error)
+        self.assertEqual(len(result.getTestResults().errors), 1)
+
+    def testDirectoryOutsideRoot(self):
+        for dirname in [os.path.join("..", "tests", "okTest"), tempfile.gettempdir()]:
+            result, = self.run_(dirname)
+            self.failIf(result.wasSuccessful())
+            self.failUnless("is not inside" in result.error)
+
+    def testNoWorker(self):
+        # a port nobody listens on (the worker of setUp may still
+        # accept a connection after being closed)
+        worker = pywns.Executor.Worker(0)
+        worker.close()
+        executor = pywns.Executor.RemoteExecutor(["127.0.0.1:%d" % worker.port], 10.0)
+        result, = executor.run([pywns.Executor.Task(os.path.join("tests", "okTest"))])
+        self.assertEqual(result.error, "No worker available")
+
+    def testFailover(self):
+        # the dropped task is run by the healthy worker after it has
+        # finished its own task
+        good = NotifyingWorker(0, jobs = 1, root = self.root)
+        bad = DroppingWorker(good.done)
+        for worker in [good, bad]:
+            thread = threading.Thread(target = worker.serveForever)
+            thread.setDaemon(True)
+            thread.start()
+        try:
+            executor = pywns.Executor.RemoteExecutor(["127.0.0.1:%d" % bad.port,
+                                                      "127.0.0.1:%d" % good.port], 60.0)
+            results = executor.run([pywns.Executor.Task(os.path.join("tests", "okTest")),
+                                    pywns.Executor.Task(os.path.join("tests", "failTest"))])
+        finally:
+            good.close()
+            bad.close()
+        self.assertEqual([result.error for result in results], [None, None])
+        self.failUnless(results[0].wasSuccessful())
+        self.failIf(results[1].wasSuccessful())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.ImportTime
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.ImportTime
+
+class MeasureTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def writeModule(self, name, source):
+        f = file(os.path.join(self.dirname, name + ".py"), "w")
+        f.write(source)
+        f.close()
+
+    def testModulePrinting(self):
+        self.writeModule("noisy", "print 'loading (1, 2)'\nimport noisyHelper\n")
+        self.writeModule("noisyHelper", "import sys\nsys.stdout.write('[]')\n")
+        importTime = pywns.ImportTime.measure("noisy", repeat = 2, path = [self.dirname])
+        self.failUnless(importTime.total > 0.0)
+        self.failUnless("noisyHelper" in importTime.modules)
+        self.assertEqual([name for depth, name, seconds in importTime.imports], ["noisyHelper", "noisy"])
+        self.assertEqual(pywns.ImportTime.check(importTime, 60.0, ["noisyHelper"]),
+                         ["import noisy loads noisyHelper"])
+
+    def testFailingImport(self):
+        self.writeModule("broken", "raise RuntimeError('broken')\n")
+        self.assertRaises(ImportError, pywns.ImportTime.measure, "broken", 1, path = [self.dirname])
+
+
+if __name__ == "__main__":
+    unittest.main()
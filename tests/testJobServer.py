@@ -0,0 +1,99 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.JobServer
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import fcntl
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.JobServer
+
+def isBlocking(fd):
+    return not fcntl.fcntl(fd, fcntl.F_GETFL) & os.O_NONBLOCK
+
+class JobServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.makeflags = os.environ.get("MAKEFLAGS")
+        if self.makeflags != None:
+            del os.environ["MAKEFLAGS"]
+
+    def tearDown(self):
+        if self.makeflags == None:
+            os.environ.pop("MAKEFLAGS", None)
+        else:
+            os.environ["MAKEFLAGS"] = self.makeflags
+
+    def acquireAll(self, server):
+        jobs = []
+        while True:
+            job = server.acquire(block = False)
+            if job == None:
+                return jobs
+            jobs.append(job)
+
+    def testOwnPipe(self):
+        server = pywns.JobServer.JobServer(3, pinCPUs = False)
+        fds = [int(ii) for ii in os.environ["MAKEFLAGS"].split("=")[-1].split(",")]
+        jobs = self.acquireAll(server)
+        self.assertEqual(len(jobs), 3)
+        server.release(jobs.pop())
+        self.assertEqual(len(self.acquireAll(server)), 1)
+        # nested tools read the pipe blocking
+        self.failUnless(isBlocking(fds[0]))
+        server.close()
+        self.failIf(os.environ.has_key("MAKEFLAGS"))
+
+    def testInheritedPipe(self):
+        readFd, writeFd = os.pipe()
+        try:
+            os.write(writeFd, "++")
+            os.environ["MAKEFLAGS"] = "-j --jobserver-fds=%d,%d" % (readFd, writeFd)
+            server = pywns.JobServer.JobServer(1, pinCPUs = False)
+            jobs = self.acquireAll(server)
+            self.assertEqual(len(jobs), 3)
+            for job in jobs:
+                server.release(job)
+            server.close()
+            # all tokens are given back, the pipe of make is left as it was
+            self.assertEqual(os.read(readFd, 2), "++")
+            self.failUnless(isBlocking(readFd))
+        finally:
+            os.close(readFd)
+            os.close(writeFd)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.Launcher
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.Launcher
+
+# as written by GNU time -v
+timeOutput = """\tCommand being timed: "openwns -f config.py"
+\tUser time (seconds): 1.50
+\tSystem time (seconds): 0.25
+\tPercent of CPU this job got: 99%
+\tElapsed (wall clock) time (h:mm:ss or m:ss): 0:01.76
+\tMaximum resident set size (kbytes): 51200
+\tMajor (requiring I/O) page faults: 0
+\tVoluntary context switches: 10
+\tInvoluntary context switches: 5
+\tExit status: 0
+"""
+
+class TimeLauncherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workingDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workingDir)
+
+    def testCommandUsesWorkingDir(self):
+        command = pywns.Launcher.TimeLauncher().getCommand("openwns", "output", self.workingDir)
+        self.failUnless(os.path.join(self.workingDir, "output.time.txt") in command)
+
+    def testSummary(self):
+        f = file(os.path.join(self.workingDir, "output.time.txt"), "w")
+        f.write(timeOutput)
+        f.close()
+        summary = pywns.Launcher.TimeLauncher().getSummary("output", self.workingDir)
+        self.assertEqual(len(summary.splitlines()), len(pywns.Launcher.TimeLauncher.summaryKeys))
+        self.failUnless("Elapsed (wall clock) time (h:mm:ss or m:ss): 0:01.76" in summary)
+        self.failIf("Percent of CPU" in summary)
+
+    def testNoSummaryWithoutOutput(self):
+        self.assertEqual(pywns.Launcher.TimeLauncher().getSummary("output", self.workingDir), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
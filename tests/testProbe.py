@@ -0,0 +1,166 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Tests of pywns.Probe
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.Probe
+import pywns.Aggregation
+import pywns.DataFile
+
+headerKeys = ["Description", "Minimum", "Maximum", "Trials", "Mean", "Variance",
+              "Relative variance", "Standard deviation", "Relative standard deviation",
+              "Skewness", "2nd moment", "3rd moment", "Sum of all values",
+              "(Sum of all values)^2", "(Sum of all values)^3"]
+
+def writeProbe(filename, name, values = [], **header):
+    """ Write a probe file with a header (all keys read by Probe, 1 if
+    not given in header) and the (x, y) values
+    """
+    f = file(filename, "w")
+    f.write("# Name: %s\n" % name)
+    for key in headerKeys:
+        f.write("# %s: %s\n" % (key, header.get(key, 1)))
+    for x, y in values:
+        f.write("%r %r\n" % (x, y))
+    f.close()
+
+
+class ProbeTypeTest(unittest.TestCase):
+
+    def testSuffixes(self):
+        self.assertEqual(pywns.Probe.getProbeType("delay_Moments.dat"), pywns.Probe.MomentsProbe)
+        self.assertEqual(pywns.Probe.getProbeType("out/delay_PDF.dat.gz"), pywns.Probe.PDFProbe)
+        self.assertEqual(pywns.Probe.getProbeType("x_LREF_pf.dat"), pywns.Probe.LreProbe)
+        self.assertEqual(pywns.Probe.getProbeType("x_DLREF.dat"), pywns.Probe.DlreProbe)
+        self.assertEqual(pywns.Probe.getProbeType("a_b_LREG_pf.dat.bz2"), pywns.Probe.LreProbe)
+        self.assertEqual(pywns.Probe.getProbeType("x_mean.dat"), pywns.Probe.TableProbe)
+
+    def testCachesAreNoProbes(self):
+        for filename in ["delay_Log.dat.preview", "delay_PDF.dat.gz.preview", ".probeIndex",
+                         "delay_Moments.dat.old", "Moments.dat", "_pf.dat", "x_pf.dat"]:
+            self.assertRaises(TypeError, pywns.Probe.getProbeType, filename)
+
+
+class ReadAllProbesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        writeProbe(os.path.join(self.dirname, "delay_Moments.dat"), "delay", Mean = 2.5)
+        writeProbe(os.path.join(self.dirname, "delay_Log.dat"), "delay",
+                   [(float(ii), float(ii % 7)) for ii in xrange(1000)])
+        self.cacheDirectory = pywns.DataFile.cacheDirectory
+        pywns.DataFile.cacheDirectory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(pywns.DataFile.cacheDirectory)
+        pywns.DataFile.cacheDirectory = self.cacheDirectory
+        shutil.rmtree(self.dirname)
+
+    def testDirectoryWithCaches(self):
+        # a preview left beside the data file by older versions
+        f = file(os.path.join(self.dirname, "delay_Log.dat.preview"), "wb")
+        f.close()
+        pywns.Probe.ProbeIndex(self.dirname, persistent = True)
+        names = os.listdir(self.dirname)
+        self.failUnless("delay_Log.dat.preview" in names)
+        self.failUnless(pywns.Probe.ProbeIndex.indexFilename in names)
+
+        probes = pywns.Probe.readAllProbes(self.dirname)
+        keys = probes.keys()
+        keys.sort()
+        self.assertEqual(keys, ["delay_Log.dat", "delay_Moments.dat"])
+        self.assertEqual(probes["delay_Moments.dat"].mean, 2.5)
+        # read again, now from the stored index
+        self.assertEqual(len(pywns.Probe.ProbeIndex(self.dirname, persistent = True)), 2)
+
+    def testPreviewIsKept(self):
+        filename = os.path.join(self.dirname, "delay_Log.dat")
+        probe = pywns.Probe.LogEvalProbe(filename)
+        level = probe.preview(10)
+        self.assertEqual(sum(level.count), 1000)
+        self.failUnless(probe.preview(10) is level)
+        self.failIf(os.path.exists(filename + ".preview"))
+        self.assertEqual(len(os.listdir(pywns.DataFile.cacheDirectory)), 1)
+        writeProbe(filename, "delay", [(float(ii), 1.0) for ii in xrange(2000)])
+        self.assertEqual(sum(probe.preview(10).count), 2000)
+
+
+class DlreProbeTest(unittest.TestCase):
+
+    header = ["Evaluation: DLRE G", "lower border: 0", "upper border: 1", "number of intervals: 3",
+              "interval size: 0.5", "maximum number of samples: 100",
+              "maximum relative error [%]: 5", "evaluated levels: 3", "Underflows: 0",
+              "Overflows: 0"]
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, "delay_DLREG.dat")
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def writeProbe(self, rows):
+        writeProbe(self.filename, "delay")
+        f = file(self.filename, "a")
+        for line in self.header:
+            f.write("# " + line + "\n")
+        for row in rows:
+            f.write(" ".join(row) + "\n")
+        f.close()
+        return pywns.Probe.DlreProbe(self.filename)
+
+    def testHistogram(self):
+        probe = self.writeProbe([["0.9", "0.0", "0.01", "0.1", "0.0", "50", "10", "yes"],
+                                 ["0.5", "0.5", "0.2", "0.1", "0.0", "30", "5", "no"],
+                                 ["0.1", "1.0", "not_available", "0.1", "0.0", "20", "3", "yes"]])
+        self.assertEqual(len(probe.histogram), 3)
+        self.failUnless(isinstance(probe.histogram[0], pywns.Probe.DlreHistogramEntry))
+        self.assertEqual(probe.getLevelsNotWithinLimit(), [1])
+        self.assertEqual(probe.getLevelsExceedingRelativeError(0.1), [1, 2])
+
+    def testWithoutFlagColumn(self):
+        probe = self.writeProbe([["0.9", "0.0", "0.01", "0.1", "0.0", "50", "10"],
+                                 ["0.5", "0.5", "0.2", "0.1", "0.0", "30", "5"]])
+        self.assertEqual(probe.histogramColumns.relativeErrorWithinLimit,
+                         ["not_available", "not_available"])
+        self.assertEqual(probe.getLevelsNotWithinLimit(), [0, 1])
+        self.assertEqual(probe.getLevelsExceedingRelativeError(0.1), [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Tests of pywns.ReferenceStore
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.DataFile
+import pywns.ReferenceStore
+
+from testProbe import writeProbe
+
+def writeFile(filename, content):
+    f = file(filename, "w")
+    f.write(content)
+    f.close()
+
+class ManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def testWriteAndRead(self):
+        manifest = pywns.ReferenceStore.Manifest()
+        manifest.add("delay_PDF.dat", "ab" * 20, 120)
+        manifest.add("sub/dir/x y.dat", "cd" * 20, 0)
+        filename = os.path.join(self.dirname, "reference.manifest")
+        manifest.write(filename)
+        self.assertEqual(os.listdir(self.dirname), ["reference.manifest"])
+        read = pywns.ReferenceStore.Manifest.read(filename)
+        self.assertEqual(read.entries, manifest.entries)
+        self.assertEqual(read.getDigest("sub/dir/x y.dat"), "cd" * 20)
+        self.assertEqual(read.getDigest("missing.dat"), None)
+        self.assertEqual(read.listDirectory(""), ["delay_PDF.dat", "sub"])
+        self.assertEqual(read.listDirectory("sub/dir"), ["x y.dat"])
+
+
+class ReferenceStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        # the reference store is kept in the root of the SDK
+        file(os.path.join(self.root, ".thisIsTheRootOfWNS"), "w").close()
+        self.output = os.path.join(self.root, "test", "output")
+        self.reference = os.path.join(self.root, "test", "reference")
+        os.makedirs(os.path.join(self.output, "sub"))
+        writeProbe(os.path.join(self.output, "delay_Moments.dat"), "delay", Mean = 2.5)
+        writeFile(os.path.join(self.output, "sub", "log.txt"), "done\n")
+        # caches are not stored
+        writeFile(os.path.join(self.output, "delay_Moments.dat.preview"), "cache")
+        self.store = pywns.ReferenceStore.findStore(self.reference)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def getBlobs(self):
+        blobs = [path.replace("/", "") for path in
+                 pywns.ReferenceStore.listFiles(os.path.join(self.store.root, "objects"))]
+        blobs.sort()
+        return blobs
+
+    def getDigests(self, manifest):
+        digests = [digest for digest, size in manifest.entries.values()]
+        digests.sort()
+        return digests
+
+    def testStoreInSDK(self):
+        self.assertEqual(self.store.root, os.path.join(self.root, ".referenceStore"))
+
+    def testCheckInAndOut(self):
+        manifest = self.store.checkIn(self.output, remove = True)
+        self.failIf(os.path.exists(self.output))
+        self.assertEqual(manifest.listDirectory(""), ["delay_Moments.dat", "sub"])
+        self.assertEqual(self.getBlobs(), self.getDigests(manifest))
+        # read through the manifest
+        f = pywns.DataFile.openDataFile(os.path.join(self.output, "sub", "log.txt"))
+        self.assertEqual(f.read(), "done\n")
+        f.close()
+        self.store.checkOut(self.output)
+        self.assertEqual(file(os.path.join(self.output, "sub", "log.txt")).read(), "done\n")
+
+    def testMissingBlob(self):
+        manifest = pywns.ReferenceStore.Manifest()
+        manifest.add("x.dat", "00" * 20, 1)
+        self.assertEqual(self.store.getMissingBlobs(manifest), ["x.dat"])
+        self.assertRaises(IOError, self.store.materialize, manifest, self.reference)
+        self.failIf(os.path.exists(self.reference))
+
+    def testPromoteTwice(self):
+        promotion = pywns.ReferenceStore.promote(self.output, self.reference)
+        self.assertEqual(promotion.files, 2)
+        self.assertEqual(promotion.added, ["delay_Moments.dat", "sub/log.txt"])
+        manifest = pywns.ReferenceStore.Manifest.read(pywns.ReferenceStore.getManifestFilename(self.reference))
+        self.assertEqual(self.getBlobs(), self.getDigests(manifest))
+
+        # the same content from another output: same digests, no new blobs
+        other = os.path.join(self.root, "test", "otherOutput")
+        shutil.copytree(self.output, other)
+        promotion = pywns.ReferenceStore.promote(other, self.reference)
+        self.failUnless(promotion.isUnchanged())
+        self.assertEqual(promotion.getSummary(), "unchanged (2 files)")
+        self.assertEqual(self.getBlobs(), self.getDigests(manifest))
+
+        # the reference files are hardlinks to the blobs
+        for path, (digest, size) in manifest.entries.items():
+            filename = os.path.join(self.reference, *path.split("/"))
+            self.assertEqual(os.stat(filename).st_ino,
+                             os.stat(self.store.getBlobFilename(digest)).st_ino)
+            self.assertEqual(os.path.getsize(filename), size)
+
+    def testPromoteChange(self):
+        pywns.ReferenceStore.promote(self.output, self.reference)
+        writeProbe(os.path.join(self.output, "delay_Moments.dat"), "delay", Mean = 5.0)
+        os.remove(os.path.join(self.output, "sub", "log.txt"))
+
+        promotion = pywns.ReferenceStore.promote(self.output, self.reference, dryRun = True)
+        self.assertEqual(promotion.changed, ["delay_Moments.dat"])
+        self.assertEqual(promotion.removed, ["sub/log.txt"])
+        self.assertEqual(promotion.maxChange, (1.0, "delay_Moments.dat", "mean"))
+        self.failUnless(os.path.exists(os.path.join(self.reference, "sub", "log.txt")))
+
+        pywns.ReferenceStore.promote(self.output, self.reference)
+        self.failIf(os.path.exists(os.path.join(self.reference, "sub", "log.txt")))
+        names = os.listdir(os.path.dirname(self.reference))
+        names.sort()
+        self.assertEqual(names, ["output", "reference", "reference.manifest"])
+        # both versions of the probe are kept in the store
+        self.assertEqual(len(self.getBlobs()), 3)
+
+    def testReadFromManifest(self):
+        pywns.ReferenceStore.promote(self.output, self.reference)
+        shutil.rmtree(self.reference)
+        filename = os.path.join(self.reference, "delay_Moments.dat")
+        f = pywns.DataFile.openDataFile(filename)
+        self.assertEqual(f.read(), file(os.path.join(self.output, "delay_Moments.dat")).read())
+        f.close()
+        self.assertEqual(pywns.DataFile.listDirectory(self.reference), ["delay_Moments.dat", "sub"])
+
+        # a promotion keeps a reference that is only a manifest
+        writeProbe(os.path.join(self.output, "delay_Moments.dat"), "delay", Mean = 5.0)
+        promotion = pywns.ReferenceStore.promote(self.output, self.reference)
+        self.assertEqual(promotion.changed, ["delay_Moments.dat"])
+        self.failIf(os.path.exists(self.reference))
+        self.failUnless("# Mean: 5.0\n" in pywns.DataFile.openDataFile(filename).readlines())
+
+    def testPromoteAll(self):
+        missing = os.path.join(self.root, "test", "missing")
+        promotions = pywns.ReferenceStore.promoteAll([(self.output, self.reference),
+                                                      (missing, self.reference + "2")])
+        self.assertEqual(promotions[0].error, None)
+        self.assertEqual(promotions[1].error, "No such directory: " + missing)
+        self.assertEqual(promotions[1].getSummary(), "failed: No such directory: " + missing)
+
+    def testRebaseline(self):
+        stream = StringIO.StringIO()
+        failed = pywns.ReferenceStore.rebaseline([("test", self.output, self.reference)],
+                                                 dryRun = True, stream = stream)
+        self.assertEqual(failed, 0)
+        self.assertEqual(stream.getvalue(), "test: 2 files, 0 changed, 2 added, 0 removed\n"
+                         "1 of 1 references would change\n")
+        self.failIf(os.path.exists(self.reference))
+
+        stream = StringIO.StringIO()
+        missing = os.path.join(self.root, "test", "missing")
+        failed = pywns.ReferenceStore.rebaseline([("test", self.output, self.reference),
+                                                  ("missing", missing, self.reference + "2")],
+                                                 stream = stream)
+        self.assertEqual(failed, 1)
+        self.assertEqual(stream.getvalue().splitlines()[-1], "1 of 2 references changed")
+        self.failUnless(os.path.isdir(self.reference))
+
+
+class SwapDirectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def testSwap(self):
+        target = os.path.join(self.dirname, "reference")
+        for content in ["old", "new"]:
+            new = os.path.join(self.dirname, "reference.tmp")
+            os.mkdir(new)
+            writeFile(os.path.join(new, "x.dat"), content)
+            pywns.ReferenceStore.swapDirectory(new, target)
+            self.assertEqual(os.listdir(self.dirname), ["reference"])
+            self.assertEqual(file(os.path.join(target, "x.dat")).read(), content)
+
+
+if __name__ == "__main__":
+    unittest.main()
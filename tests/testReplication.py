@@ -0,0 +1,237 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+
+""" Tests of pywns.Replication and of WNSUnit.ReplicatedProbesTestSuite
+
+The suites run a stand-in simulator (a python script writing Moments
+probes of normally distributed values) instead of openwns.
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import math
+import random
+import shutil
+import tempfile
+import unittest
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.Replication
+import pywns.WNSUnit
+from testProbe import headerKeys
+
+# the mean of the values is 10 plus the number in the file 'shift'
+simulator = """#!%s
+import os, re, sys, random
+patches = " ".join(sys.argv[1:])
+seed = int(re.search(r"WNS.rng.seed = (\\d+)", patches).group(1))
+outputDir = re.search(r"WNS.outputDir = '([^']*)'", patches).group(1)
+shift = float(open("shift").read())
+generator = random.Random(seed)
+values = [generator.gauss(10.0 + shift, 2.0) for ii in range(200)]
+header = {"Trials": len(values), "Mean": sum(values) / len(values),
+          "Minimum": min(values), "Maximum": max(values),
+          "Sum of all values": sum(values),
+          "(Sum of all values)^2": sum([x * x for x in values]),
+          "(Sum of all values)^3": sum([x * x * x for x in values])}
+os.makedirs(outputDir)
+f = open(os.path.join(outputDir, "delay_Moments.dat"), "w")
+f.write("# Name: delay\\n")
+for key in %r:
+    f.write("# %%s: %%r\\n" %% (key, header.get(key, 1)))
+f.close()
+"""
+
+class MomentsProbe(object):
+    """ The sums of a probe (as read from the header) of values """
+
+    def __init__(self, values):
+        self.trials = len(values)
+        self.sumOfAllValues = sum(values)
+        self.sumOfAllValuesSquare = sum([x * x for x in values])
+        self.sumOfAllValuesCubic = sum([x * x * x for x in values])
+        self.minimum = min(values)
+        self.maximum = max(values)
+
+
+class DistributionTest(unittest.TestCase):
+
+    def testLogGamma(self):
+        self.assertAlmostEqual(pywns.Replication.logGamma(1.0), 0.0, 9)
+        self.assertAlmostEqual(pywns.Replication.logGamma(0.5), math.log(math.sqrt(math.pi)), 9)
+        self.assertAlmostEqual(pywns.Replication.logGamma(10.0), math.log(362880.0), 9)
+
+    def testIncompleteBeta(self):
+        self.assertEqual(pywns.Replication.incompleteBeta(2.0, 3.0, 0.0), 0.0)
+        self.assertEqual(pywns.Replication.incompleteBeta(2.0, 3.0, 1.0), 1.0)
+        # I_x(a, 1) = x^a, I_x(1, b) = 1 - (1 - x)^b, I_0.5(a, a) = 0.5
+        self.assertAlmostEqual(pywns.Replication.incompleteBeta(2.0, 1.0, 0.3), 0.09, 9)
+        self.assertAlmostEqual(pywns.Replication.incompleteBeta(1.0, 3.0, 0.4), 0.784, 9)
+        self.assertAlmostEqual(pywns.Replication.incompleteBeta(4.5, 4.5, 0.5), 0.5, 9)
+
+    def testStudentTQuantile(self):
+        for p, degreesOfFreedom, t in [(0.975, 1, 12.7062), (0.975, 9, 2.2622),
+                                       (0.995, 4, 4.6041), (0.95, 30, 1.6973),
+                                       (0.975, 1e6, 1.9600)]:
+            self.assertAlmostEqual(pywns.Replication.studentTQuantile(p, degreesOfFreedom), t, 4)
+        self.assertAlmostEqual(pywns.Replication.studentTQuantile(0.025, 9), -2.2622, 4)
+        self.assertEqual(pywns.Replication.studentTQuantile(0.5, 9), 0.0)
+        self.assertAlmostEqual(pywns.Replication.studentTDistribution(2.2622, 9), 0.975, 4)
+
+
+class WelchTestTest(unittest.TestCase):
+
+    def testAccept(self):
+        t, degreesOfFreedom, pValue = pywns.Replication.welchTest([1.0, 2.0, 3.0, 4.0, 5.0],
+                                                                  [1.5, 2.5, 3.5, 4.5, 5.5])
+        self.assertAlmostEqual(t, 0.5, 9)
+        self.assertAlmostEqual(degreesOfFreedom, 8.0, 9)
+        self.assertAlmostEqual(pValue, 0.6305, 4)
+
+    def testReject(self):
+        t, degreesOfFreedom, pValue = pywns.Replication.welchTest([10.0, 11.0, 12.0, 9.0, 10.0],
+                                                                  [20.0, 21.0, 19.0, 20.0, 22.0, 21.0])
+        self.failUnless(t > 0)
+        self.failUnless(pValue < 1e-6)
+
+    def testNoVariance(self):
+        self.assertEqual(pywns.Replication.welchTest([1.0, 1.0], [1.0, 1.0])[2], 1.0)
+        self.assertEqual(pywns.Replication.welchTest([1.0, 1.0], [2.0, 2.0])[2], 0.0)
+        self.assertRaises(ValueError, pywns.Replication.welchTest, [1.0], [1.0, 2.0])
+
+
+class PooledMomentsTest(unittest.TestCase):
+
+    def testPooled(self):
+        generator = random.Random(1)
+        samples = [[generator.expovariate(1.0) for ii in xrange(size)] for size in [50, 80, 120]]
+        moments = pywns.Replication.PooledMoments([MomentsProbe(sample) for sample in samples])
+
+        values = samples[0] + samples[1] + samples[2]
+        count = len(values)
+        mean = sum(values) / count
+        moment2 = sum([(x - mean) ** 2 for x in values]) / count
+        moment3 = sum([(x - mean) ** 3 for x in values]) / count
+        self.assertEqual(moments.trials, count)
+        self.assertAlmostEqual(moments.mean, mean, 9)
+        self.assertAlmostEqual(moments.variance, moment2 * count / (count - 1), 9)
+        self.assertAlmostEqual(moments.standardDeviation, math.sqrt(moment2 * count / (count - 1)), 9)
+        self.assertAlmostEqual(moments.skewness, moment3 / moment2 ** 1.5, 9)
+        self.assertEqual(moments.minimum, min(values))
+        self.assertEqual(moments.maximum, max(values))
+
+        means = [sum(sample) / len(sample) for sample in samples]
+        for actual, expected in zip(moments.replicationMeans, means):
+            self.assertAlmostEqual(actual, expected, 9)
+        meanOfMeans = sum(means) / 3
+        halfWidth = 4.3027 * math.sqrt(sum([(x - meanOfMeans) ** 2 for x in means]) / 2 / 3)
+        lower, upper = moments.meanConfidenceInterval
+        self.assertAlmostEqual(lower, mean - halfWidth, 3)
+        self.assertAlmostEqual(upper, mean + halfWidth, 3)
+
+    def testEmptyReplication(self):
+        empty = MomentsProbe([0.0])
+        empty.trials = 0
+        moments = pywns.Replication.PooledMoments([MomentsProbe([1.0, 3.0]), empty])
+        self.assertEqual(moments.mean, 2.0)
+        self.assertEqual(moments.minimum, 1.0)
+        self.failIf(moments.replicationMeans[1] == moments.replicationMeans[1])
+        self.assertEqual(moments.meanConfidenceInterval, None)
+
+
+class ReplicatedProbesTestSuiteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.sandbox = os.path.join(self.root, "sandbox")
+        os.makedirs(os.path.join(self.sandbox, "opt", "bin"))
+        filename = os.path.join(self.sandbox, "opt", "bin", "openwns")
+        f = file(filename, "w")
+        f.write(simulator % (sys.executable, headerKeys))
+        f.close()
+        os.chmod(filename, 0755)
+        self.workingDir = os.path.join(self.root, "test")
+        os.makedirs(self.workingDir)
+        file(os.path.join(self.workingDir, "config.py"), "w").close()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def run_(self, shift):
+        f = file(os.path.join(self.workingDir, "shift"), "w")
+        f.write(repr(shift))
+        f.close()
+        suite = pywns.WNSUnit.ReplicatedProbesTestSuite(sandboxPath = self.sandbox, replications = 4,
+                                                        workingDir = self.workingDir)
+        result = unittest.TestResult()
+        verbosity = pywns.WNSUnit.verbosity
+        stdout = sys.stdout
+        pywns.WNSUnit.verbosity = 1
+        sys.stdout = StringIO.StringIO()
+        try:
+            suite.run(result)
+        finally:
+            pywns.WNSUnit.verbosity = verbosity
+            sys.stdout = stdout
+        return suite, result
+
+    def getFailures(self, result):
+        # without the "(<working dir>) " prefix
+        return [test.shortDescription().split(") ", 1)[1]
+                for test, traceback in result.failures + result.errors]
+
+    def rebaseline(self, suite):
+        for source, target in suite.getReferencePairs():
+            shutil.copytree(source, target)
+            shutil.rmtree(source)
+
+    def testMissingReference(self):
+        suite, result = self.run_(0.0)
+        self.assertEqual(self.getFailures(result), ["Reference replications"])
+
+    def testSameMeans(self):
+        suite, result = self.run_(0.0)
+        self.rebaseline(suite)
+        suite, result = self.run_(0.0)
+        self.assertEqual(self.getFailures(result), [])
+        self.failUnless(result.testsRun > 2)
+
+    def testShiftedMeans(self):
+        suite, result = self.run_(0.0)
+        self.rebaseline(suite)
+        suite, result = self.run_(2.0)
+        self.assertEqual(self.getFailures(result),
+                         ["delay_Moments.dat: mean equals reference (replications)"])
+
+
+if __name__ == "__main__":
+    unittest.main()
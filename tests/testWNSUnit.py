@@ -0,0 +1,126 @@
+###############################################################################
+# This file is part of openWNS (open Wireless Network Simulator)
+# _____________________________________________________________________________
+#
+# Copyright (C) 2004-2007
+# Chair of Communication Networks (ComNets)
+# Kopernikusstr. 16, D-52074 Aachen, Germany
+# phone: ++49-241-80-27910,
+# fax: ++49-241-80-22242
+# email: info@openwns.org
+# www: http://www.openwns.org
+# _____________________________________________________________________________
+#
+# openWNS is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License version 2 as published by the
+# Free Software Foundation;
+#
+# openWNS is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+###############################################################################
+
+""" Tests of pywns.WNSUnit: simulations and external programs
+
+The simulations run a stand-in simulator (a shell script) instead of
+openwns.
+
+Run from the top directory by: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pywns.WNSUnit
+
+simulator = """#!/bin/sh
+case "$*" in *sleep*) sleep 30;; esac
+echo "simulation done"
+"""
+
+def countOpenFiles():
+    return len(os.listdir("/proc/self/fd"))
+
+class RingBufferTest(unittest.TestCase):
+
+    def testKeepsTheLastLines(self):
+        buffer = pywns.WNSUnit.RingBuffer(3)
+        for ii in xrange(10):
+            buffer.append("%d\n" % ii)
+        self.assertEqual(buffer.getvalue(), "[... 7 lines dropped ...]\n7\n8\n9\n")
+
+
+class SimulationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.wns = os.path.join(self.dirname, "openwns")
+        f = file(self.wns, "w")
+        f.write(simulator)
+        f.close()
+        os.chmod(self.wns, 0755)
+        self.stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.dirname)
+
+    def testLogsAreClosed(self):
+        openFiles = countOpenFiles()
+        simulation = pywns.WNSUnit.Simulation(wns = self.wns, workingDir = self.dirname)
+        simulation.run(30.0)
+        self.assertEqual(countOpenFiles(), openFiles)
+        self.assertEqual(file(os.path.join(self.dirname, "stdout.log")).read(), "simulation done\n")
+
+    def testLogsAreClosedOnCancel(self):
+        openFiles = countOpenFiles()
+        simulation = pywns.WNSUnit.Simulation(wns = self.wns, configFile = "sleep.py",
+                                              workingDir = self.dirname)
+        simulation.start()
+        self.assertEqual(countOpenFiles(), openFiles + 2)
+        simulation.cancel()
+        self.assertEqual(countOpenFiles(), openFiles)
+
+
+
+class ExternalProgramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def run_(self, test):
+        result = unittest.TestResult()
+        test.run(result)
+        return [traceback for test, traceback in result.failures + result.errors]
+
+    def testSuccess(self):
+        test = pywns.WNSUnit.ExternalProgram(self.dirname, "echo hello", "echo")
+        self.assertEqual(self.run_(test), [])
+        self.assertEqual(test.stdout.getvalue(), "hello\n")
+
+    def testMissingDirectory(self):
+        dirname = os.path.join(self.dirname, "missing")
+        test = pywns.WNSUnit.ExternalProgram(dirname, "true", "true")
+        failures = self.run_(test)
+        self.assertEqual(len(failures), 1)
+        self.failUnless("'true' could not be run in " + dirname in failures[0])
+        self.failUnless(isinstance(test.error, OSError))
+
+
+if __name__ == "__main__":
+    unittest.main()